@@ -5,6 +5,7 @@ import seaborn as sns
 import sys
 
 from example import *
+from recorder import TrajectoryReader
 
 from matplotlib import pyplot as plt
 
@@ -64,7 +65,8 @@ def plot(mean_matrix, standard_deviation_matrix):
 if mod == "-one":
     dirs_csv = []
     for _ in dirs:
-        if ('csv' in _) and ('data' in _):
+        # 采样数据为data_*.csv文件或data_*列式目录
+        if _[:5] == 'data_' and (_[-4:] == '.csv' or os.path.exists(path + _ + '/header.json')):
             dirs_csv.append(_)
             pass
         pass
@@ -94,12 +96,7 @@ if mod == "-one":
         count += 1
         print("(" + str(count) + "/" + str(max_count) + ")  " + "wait..." + time.strftime("%Y-%m-%d %H:%M:%S",
                                                                                           time.localtime()))
-        data = pd.read_csv(path + k,
-                           sep=',',
-                           header=0,
-                           index_col=0,
-                           dtype=np.float64)
-        data = np.array(data['v'][data['time'] > SAMPLING_TIME]) * 3.6
+        data = np.array(TrajectoryReader(path + k).select('v', start=SAMPLING_TIME)).reshape(-1) * 3.6
 
         mean = np.mean(data)
         standard_deviation = 2 * ((np.sum(
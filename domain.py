@@ -0,0 +1,349 @@
+import multiprocessing
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+
+from engine import *
+from scheduler import NEVER
+
+# 相邻区域每步交换的halo车辆状态，halo车辆的差值由所属区域计算后一并交换
+LIST_HALO_STATE = ['real_location', 'real_speed', 'real_acceleration', 'real_spacing', 'real_speed_difference',
+                   'real_acceleration_difference', 'real_headway']
+
+HALO_END_GAP = 1e4  # halo最前方车辆的虚拟间隔，单位m，其加速度不使用
+
+
+class SubdomainFleet(ArrayFleet):
+    """
+    区域车队
+    区域分解中一个进程负责的连续车辆，下标[0, num_own)为本区域车辆，其后为前方区域最后方的halo车辆。
+    halo车辆不参与决策，每步推进前由set_halo写入所属区域的状态，本区域车辆的推进与ArrayFleet完全相同
+    """
+
+    ring_name = 'domain'
+
+    def __init__(self,
+                 state: dict,
+                 num_own: int,
+                 proportion: Dict,
+                 road_length: float,
+                 engine: str = "python",
+                 seed: int = None,
+                 integrator="ballistic",
+                 dtype=np.float64):
+        """
+        构造函数
+        :param state: 本区域与halo车辆的车队状态，格式与ArrayFleet._get_state一致，不含噪声状态，
+                      位置修正与环形车队一致，前车关系由本类生成；rear_prototype为后方区域最前方车辆的类型下标
+        :param num_own: 本区域车辆数，int类型
+        :param proportion: 车辆比例，dict类型，与整个环形车队一致，车辆类型表的顺序由此确定
+        :param road_length: 道路长度，float类型，单位m
+        :param engine: 计算引擎，str类型，见SET_ENGINE_TYPE
+        :param seed: 本区域观测误差与操作误差的随机数种子，int类型
+        :param integrator: 积分器，str类型，见integrator.DICT_INTEGRATOR，或Integrator实例
+        :param dtype: 速度、加速度等状态数组的数据类型，见ArrayFleet
+        """
+        num = len(state['prototype_index'])
+        self._arrangement = state['prototype_index']
+        super().__init__(num, "R", proportion, road_length, "L", engine=engine, seed=seed, integrator=integrator,
+                         dtype=dtype)
+        self.num_own = num_own
+        self._rear_prototype = int(state['rear_prototype'])
+        # 区域内第i辆车的前车为第i+1辆车，halo最前方的车辆没有前车
+        state = dict(state)
+        state['leader'] = np.append(np.arange(1, num), num - 1)
+        state['follower'] = np.append(0, np.arange(num - 1))
+        state['location_correction'] = state['location_correction'].copy()
+        state['location_correction'][-1] = HALO_END_GAP
+        for k, v in self.noise.get_state().items():
+            state['noise_' + k] = v
+            pass
+        self._set_state(state)
+        pass
+
+    def _init_cars(self) -> List[Car]:
+        # 车辆排列由整个环形车队给出
+        self.types = VehicleTypeTable(self.proportion.keys())
+        self.prototypes = self.types.prototypes
+        self.prototype_index = self._arrangement.copy()
+        return self._make_cars(self.prototype_index)
+
+    def get_platoon_index(self, model_type: type, max_search_index: int) -> PlatoonIndex:
+        # 区域内按环形回绕建立索引，区域首车的后车为halo最前方的车辆，其标记改为后方区域最前方车辆的标记
+        key = (model_type, max_search_index)
+        if key not in self._platoon_index:
+            flag = self.get_model_mask(model_type).copy()
+            flag[-1] = type(self.types.following_model[self._rear_prototype]) is model_type
+            self._platoon_index[key] = PlatoonIndex(flag, max_search_index)
+            pass
+        return self._platoon_index[key]
+
+    def _get_scheduler(self, step: float) -> ReactionScheduler:
+        if self.scheduler is not None and self.scheduler.tick != step:
+            # 改变步长时按倒计时换算，halo车辆不参与换算
+            self.scheduler.next_tick[self.num_own:] = self.scheduler.now
+            pass
+        if self.scheduler is None or self.scheduler.tick != step:
+            super()._get_scheduler(step)
+            self.scheduler.next_tick[self.num_own:] = NEVER
+            self.scheduler.rebuild()
+            pass
+        return self.scheduler
+
+    def get_halo(self) -> np.ndarray:
+        """
+        本区域最后方的车辆，即后方区域的halo车辆的状态
+        :return: 形状为[halo车辆数, len(LIST_HALO_STATE)]的数组
+        """
+        h = len(self.cars) - self.num_own
+        return np.stack([getattr(self, name)[:h] for name in LIST_HALO_STATE], axis=1)
+
+    def set_halo(self, values: np.ndarray) -> None:
+        """
+        写入halo车辆的状态，并重新计算本区域最前方车辆与halo的差值
+        :param values: 前方区域get_halo的返回值
+        """
+        h = slice(self.num_own, None)
+        for k, name in enumerate(LIST_HALO_STATE):
+            getattr(self, name)[h] = values[:, k]
+            pass
+        i, p = self.num_own - 1, self.num_own
+        dx = self.real_location[p] - self.car_size[p, 0] - self.real_location[i] + self.location_correction[i]
+        dv = self.real_speed[p] - self.real_speed[i]
+        self.real_spacing[i] = dx
+        self.real_speed_difference[i] = dv
+        self.real_acceleration_difference[i] = self.real_acceleration[p] - self.real_acceleration[i]
+        # 与_count_difference一致
+        if dx < 0:
+            self.real_headway[i] = -float("inf")
+        elif dv == 0:
+            self.real_headway[i] = float("inf") * dx
+        else:
+            self.real_headway[i] = -dx / dv if -dx / dv >= 0 else float("inf")
+        pass
+
+    pass
+
+
+def _run_subdomain(k: int, conn, barrier, config: dict, state: dict) -> None:
+    """
+    子进程中推进一个区域，按主进程的命令推进并把采样写入共享内存
+    每步开始时读取前方区域上一步交换的halo，推进一步后交换本区域的halo，所有区域到达屏障后进入下一步。
+    halo数组按步的奇偶双缓冲，每步只需要一次屏障
+    """
+    workers, num, h = config['workers'], config['num'], config['halo']
+    a, b = config['block'][k], config['block'][k + 1]
+    shm = [SharedMemory(name=config['halo_name']), SharedMemory(name=config['table_name'])]
+    halo = np.ndarray((2, workers, h, len(LIST_HALO_STATE)), dtype=np.float64, buffer=shm[0].buf)
+    table = np.ndarray((num, 11), dtype=np.float64, buffer=shm[1].buf)
+    try:
+        fleet = SubdomainFleet(state, b - a, config['proportion'], config['road_length'], engine=config['engine'],
+                               seed=config['seed'][k], integrator=config['integrator'], dtype=config['dtype'])
+        own = np.arange(b - a)
+        parity = 0
+        conn.send(None)
+        while True:
+            command = conn.recv()
+            if command is None:
+                break
+            n_steps, step, record_every, out_name, num_sample = command
+            out_shm = SharedMemory(name=out_name) if num_sample else None
+            out = np.ndarray((num_sample, num, 11), dtype=np.float64, buffer=out_shm.buf) if num_sample else None
+            halo[parity, k] = fleet.get_halo()
+            barrier.wait()
+            for done in range(1, n_steps + 1):
+                fleet.set_halo(halo[parity, (k + 1) % workers])
+                fleet._advance(1, step)
+                halo[1 - parity, k] = fleet.get_halo()
+                barrier.wait()
+                parity = 1 - parity
+                if record_every and done % record_every == 0:
+                    # 采样前写入本步的halo，本区域最前方车辆的差值与单进程一致
+                    fleet.set_halo(halo[parity, (k + 1) % workers])
+                    fleet._write_sample(out[done // record_every - 1, a:b], own)
+                    pass
+                pass
+            fleet._write_sample(table[a:b], own)
+            del out
+            if out_shm is not None:
+                out_shm.close()
+                pass
+            conn.send(fleet.time)
+            pass
+    except Exception:
+        barrier.abort()
+        conn.send(traceback.format_exc())
+    finally:
+        del halo, table
+        for m in shm:
+            m.close()
+            pass
+    pass
+
+
+class DomainRingFleet:
+    """
+    区域分解的并行环形车队
+    超长环形道路上的单一场景由多个进程共同推进。单车道上车辆顺序不变，按环形顺序把车辆划分为连续的区域，
+    每个区域在任意时刻都是道路上连续的一段，由一个进程推进；车辆不会越过区域边界，不需要在进程间迁移，各进程的负载始终相同。
+    跟驰只与前方少数车辆有关（IntelligentDrivingCarModel至多max_search_index辆），
+    每步各区域通过共享内存交换最后方的halo车辆状态，进程间的同步为每步一次屏障。
+    初始状态与同参数的ArrayFleet一致；各区域使用独立的噪声流，观测误差与操作误差为0时结果与ArrayFleet逐位相同。
+    每步的halo交换与屏障同步开销与区域车辆数无关，区域车辆数较多时可以忽略
+    """
+
+    def __init__(self,
+                 car_num: int,
+                 init_type_car: str,
+                 proportion: Dict,
+                 road_length: float,
+                 init_type_loc: str,
+                 workers: int = None,
+                 engine: str = "numba",
+                 seed: int = None,
+                 integrator="ballistic",
+                 dtype=np.float64):
+        """
+        构造函数
+        :param car_num: 车辆数，int类型
+        :param init_type_car: 车辆排列方式，str类型，见SET_INIT_CARS_TYPE
+        :param proportion: 车辆比例，dict类型，例如{HDC: 0.6, IDC_CACC: 0.4}
+        :param road_length: 道路长度，float类型，单位m
+        :param init_type_loc: 初始位置方式，str类型，见SET_INIT_LOC_TYPE
+        :param workers: 进程数，int类型，默认为CPU核数
+        :param engine: 各区域的计算引擎，str类型，见SET_ENGINE_TYPE
+        :param seed: 随机数种子，int类型，由numpy.random.SeedSequence为各区域派生独立的种子，为None时由np.random的全局状态生成
+        :param integrator: 积分器，str类型，见integrator.DICT_INTEGRATOR
+        :param dtype: 速度、加速度等状态数组的数据类型，见ArrayFleet
+        """
+        workers = os.cpu_count() if workers is None else workers
+        fleet = ArrayFleet(car_num, init_type_car, proportion, road_length, init_type_loc, integrator=integrator,
+                           dtype=dtype)
+        num = len(fleet.cars)
+        # IntelligentDrivingCarModel沿前车链至多搜索max_search_index辆车，其后再留一辆车
+        halo = max([getattr(m, 'max_search_index', -1) + 2 for m in fleet.models])
+        block = np.linspace(0, num, workers + 1).round().astype(np.int64)
+        if np.diff(block).min() < halo:
+            raise ValueError("each of the %d domains needs at least %d vehicles" % (workers, halo))
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+            pass
+        self.car_num = num
+        self.road_length = road_length
+        self.workers = workers
+        self.halo = halo
+        self.block = block
+        self.time = 0.0
+
+        self._shm_halo = SharedMemory(create=True, size=2 * workers * halo * len(LIST_HALO_STATE) * 8)
+        self._shm_table = SharedMemory(create=True, size=num * 11 * 8)
+        self._table = np.ndarray((num, 11), dtype=np.float64, buffer=self._shm_table.buf)
+        fleet._write_sample(self._table)
+        config = {'workers': workers, 'num': num, 'halo': halo, 'block': block,
+                  'halo_name': self._shm_halo.name, 'table_name': self._shm_table.name,
+                  'proportion': proportion, 'road_length': road_length, 'engine': engine,
+                  'seed': [s.generate_state(1)[0] for s in np.random.SeedSequence(seed).spawn(workers)],
+                  'integrator': integrator, 'dtype': dtype}
+        full = fleet._get_state()
+        context = multiprocessing.get_context()
+        self._barrier = context.Barrier(workers)
+        self._conn = []
+        self._process = []
+        for k in range(workers):
+            index = np.arange(block[k], block[k + 1] + halo) % num
+            state = {name: full[name] for name in ['time', '_time']}
+            state['rear_prototype'] = full['prototype_index'][block[k] - 1]
+            for name in ['prototype_index', 'car_id', '_index', '_init_delay'] + LIST_ARRAY_STATE:
+                state[name] = full[name][index]
+                pass
+            parent, child = context.Pipe()
+            process = context.Process(target=_run_subdomain, args=(k, child, self._barrier, config, state),
+                                      daemon=True)
+            process.start()
+            self._conn.append(parent)
+            self._process.append(process)
+            pass
+        self._collect()
+        pass
+
+    def _collect(self) -> List:
+        # 等待全部区域的回复，子进程出错时回复错误信息
+        re = [conn.recv() for conn in self._conn]
+        errors = [r for r in re if isinstance(r, str)]
+        if errors:
+            self.close()
+            raise RuntimeError("domain worker failed:\n" + errors[0])
+        return re
+
+    def advance(self, n_steps: int, step: float, record_every: int = 1, out: np.ndarray = None) -> np.ndarray:
+        """
+        连续推进多步，每record_every步采样一次，与ArrayFleet.advance一致
+        各区域把采样直接写入共享内存中的采样缓冲，推进结束后复制到out
+        :param n_steps: 推进步数，int类型
+        :param step: 步长，float类型
+        :param record_every: 采样间隔步数，int类型，0表示不采样
+        :param out: 采样缓冲，numpy数组，形状为[采样数, 车辆数, 11]，为None时自动分配
+        :return: 采样缓冲
+        """
+        num_sample = n_steps // record_every if record_every else 0
+        if out is None:
+            out = np.empty((num_sample, self.car_num, 11))
+        elif len(out) < num_sample:
+            raise ValueError("out holds %d samples, %d required" % (len(out), num_sample))
+        shm = SharedMemory(create=True, size=max(num_sample * self.car_num * 11 * 8, 1))
+        try:
+            for conn in self._conn:
+                conn.send((n_steps, step, record_every, shm.name, num_sample))
+                pass
+            self.time = self._collect()[0]
+            out[:num_sample] = np.ndarray((num_sample, self.car_num, 11), dtype=np.float64, buffer=shm.buf)
+        finally:
+            shm.close()
+            shm.unlink()
+        return out
+
+    def get_data_by_list(self) -> np.ndarray:
+        """
+        当前状态，列与ArrayFleet.get_data_by_list一致
+        """
+        return self._table.copy()
+
+    def close(self) -> None:
+        """
+        结束子进程并释放共享内存
+        """
+        if not self._process:
+            return
+        for conn, process in zip(self._conn, self._process):
+            if process.is_alive():
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+                pass
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+                pass
+            pass
+        self._process = []
+        del self._table
+        for shm in [self._shm_halo, self._shm_table]:
+            shm.close()
+            shm.unlink()
+            pass
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        pass
+
+    def __del__(self):
+        if getattr(self, '_process', None):
+            self.close()
+            pass
+        pass
+
+    pass
@@ -0,0 +1,672 @@
+from moos import *
+from integrator import AdaptiveIntegrator, get_integrator
+from noise import NoiseProvider
+from platoon import PlatoonIndex
+from scheduler import ReactionScheduler
+
+
+SET_ENGINE_TYPE = {"python", "numba"}
+
+# 快照中保存的车队数组：动态数据、双缓冲与前车关系
+LIST_ARRAY_STATE = ['real_location', 'real_position', 'real_mileage', 'real_speed', 'real_acceleration',
+                    'real_spacing', 'real_speed_difference', 'real_acceleration_difference', 'real_headway',
+                    '_real_location', '_real_position', '_real_mileage', '_real_speed', '_real_acceleration',
+                    'leader', 'follower', 'location_correction', '_road_length']
+
+
+class ArrayFleet(Fleet):
+    """
+    数组化车队
+    车队动态数据以结构数组（SoA）形式保存在连续的numpy数组中，接口与Fleet一致。
+    前车关系由环形滚动索引给出，update/apply的双缓冲通过交换数组实现。
+    cars中的车辆为CarView，变量直接读写车队数组，供以Car为输入的跟驰模型使用，视图在首次访问时建立。
+    单核实测（HDC与SDC_CACC各半，一百万辆车）：每辆车内存约300字节（dtype=np.float32时约270字节），
+    numba引擎另需约70字节内核数组；推进速度python引擎约1e7车辆步/秒，numba引擎约1.6e7车辆步/秒
+    """
+
+    ring_name = 'ring'  # 采样数据与统计结果中环形车队编号的名称
+
+    def __init__(self,
+                 car_num: int,
+                 init_type_car: str,
+                 proportion: Dict,
+                 road_length: float,
+                 init_type_loc: str,
+                 engine: str = "python",
+                 parallel: bool = False,
+                 seed: int = None,
+                 integrator="ballistic",
+                 dtype=np.float64):
+        """
+        构造函数
+        车辆原型与Fleet相同，由proportion中的Car实例给出
+        :param car_num: 车辆数，int类型
+        :param init_type_car: 车辆排列方式，str类型，见SET_INIT_CARS_TYPE
+        :param proportion: 车辆比例，dict类型，例如{HDC: 0.6, IDC_CACC: 0.4}
+        :param road_length: 道路长度，float类型，单位m
+        :param init_type_loc: 初始位置方式，str类型，见SET_INIT_LOC_TYPE
+        :param engine: 计算引擎，str类型，见SET_ENGINE_TYPE，"numba"为编译内核
+        :param parallel: 编译内核是否按车辆并行(prange)，适用于大规模车队
+        :param seed: 观测误差与操作误差的随机数种子，int类型，为None时由np.random的全局状态生成
+        :param integrator: 积分器，str类型，见integrator.DICT_INTEGRATOR，或Integrator实例，
+                           编译内核仅支持"ballistic"
+        :param dtype: 速度、加速度、差值与车头时距数组的数据类型，np.float64或np.float32，
+                      float32每辆车节省约30字节；位置与里程始终为float64，长道路上float32的分辨率不足一步的位移
+        """
+        if engine not in SET_ENGINE_TYPE:
+            raise ValueError("engine must be one of %s" % sorted(SET_ENGINE_TYPE))
+        integrator = get_integrator(integrator)
+        if engine == "numba" and integrator.name != "ballistic":
+            raise ValueError("numba engine only supports the ballistic integrator")
+        super().__init__(car_num, init_type_car, proportion, road_length, init_type_loc)
+        self.dtype = np.dtype(dtype)
+        self.engine = engine
+        self.parallel = parallel
+        self.integrator = integrator
+        self._init_noise(seed)
+        self._init_arrays()
+        if self.engine == "numba":
+            self._init_kernel()
+
+    def _init_arrays(self) -> None:
+        num = len(self.cars)
+        types = self.types
+        index = self.prototype_index
+
+        # 静态数据，由车辆类型表按类型下标取出
+        self.car_type = types.car_type[index]
+        self.car_size = types.car_size[index]
+        self.expecting_headway = types.expecting_headway[index]
+        self.limiting_acceleration = types.limiting_acceleration[index]
+        self.limiting_speed = types.limiting_speed[index]
+        self.stopping_distance = types.stopping_distance[index]
+        self.observation_error = types.observation_error[index]
+        self.operation_error = types.operation_error[index]
+        self.response_time_delay = types.response_time_delay[index]
+
+        self._init_ring(num)
+
+        # 按跟驰模型实例分组，同组车辆一次批量计算，组的顺序为模型在车队中首次出现的顺序
+        self.models = []
+        group = np.zeros(len(types), dtype=np.int64)
+        kind, first = np.unique(index, return_index=True)
+        for p in kind[np.argsort(first)].tolist():
+            for g, m in enumerate(self.models):
+                if m is types.following_model[p]:
+                    break
+                pass
+            else:
+                g = len(self.models)
+                self.models.append(types.following_model[p])
+            group[p] = g
+            pass
+        self.model_index = group[index]
+        self._model_mask = {}
+        self._platoon_index = {}
+
+        # 每辆车每次决策占用的噪声个数：1个操作误差与模型的观测误差
+        self.noise_count = np.array([1 + m.noise_size for m in self.models] + [1], dtype=np.int64)[self.model_index]
+
+        # 按比例取整后车辆数可能少于car_num，序号按实际车辆数生成
+        self._index = np.linspace(1, num, num)
+
+        # 动态数据
+        self.time = 0.0
+        self.real_location = self._init_location()
+        self.real_position = self.real_location.copy()
+        self.real_mileage = np.zeros(num)
+        self.real_speed = np.zeros(num, dtype=self.dtype)
+        self.real_acceleration = np.zeros(num, dtype=self.dtype)
+
+        self.real_spacing = np.empty(num, dtype=self.dtype)
+        self.real_speed_difference = np.empty(num, dtype=self.dtype)
+        self.real_acceleration_difference = np.empty(num, dtype=self.dtype)
+        self.real_headway = np.empty(num, dtype=self.dtype)
+        self._count_difference()
+
+        # 反应延迟倒计时，首次更新时按步长建立反应时刻调度器
+        self._init_delay = types.init_delay[index]
+        self.scheduler = None
+
+        # 双缓冲：update写入下划线数组，apply时与当前数组交换
+        self._time = self.time
+        self._real_location = self.real_location.copy()
+        self._real_position = self.real_position.copy()
+        self._real_mileage = self.real_mileage.copy()
+        self._real_speed = self.real_speed.copy()
+        self._real_acceleration = self.real_acceleration.copy()
+        pass
+
+    def _make_cars(self, prototype_index: np.ndarray) -> CarViewList:
+        # 车辆为车队数组的视图，前车关系由leader给出，不再逐车复制原型与链接，视图在首次访问时建立
+        self.car_id = new_car_ids(len(prototype_index))
+        return CarViewList(self, len(prototype_index))
+
+    def _make_cars_link(self) -> None:
+        pass
+
+    def _restore_cars(self, state: dict) -> None:
+        # 车辆ID直接写入数组，不逐车建立视图
+        self.prototype_index = state['prototype_index'].copy()
+        self.cars = self._make_cars(self.prototype_index)
+        self.car_id = state['car_id'].copy()
+        pass
+
+    def _init_loc(self) -> None:
+        # 初始位置在建立环形车队后由_init_location一次生成，不再逐车初始化
+        pass
+
+    def _init_location(self) -> np.ndarray:
+        """
+        初始位置，与Fleet._init_loc一致，多个环形车队分别排列
+        "L"为首车位于0处依次向前紧密排列，"U"为在道路上均匀分布，"R"为随机分布，见random_locations
+        :return: 位置数组，单位m
+        """
+        re = np.zeros(len(self.cars))
+        for start, size in zip(np.cumsum(np.atleast_1d(self.ring_size)) - self.ring_size,
+                               np.atleast_1d(self.ring_size).tolist()):
+            if not size:
+                continue
+            if self.init_type_loc == "L":
+                # 依次加上前车的停车间距与本车车长，累加顺序与逐车计算相同
+                gap = np.empty(2 * size - 2)
+                gap[0::2] = self.stopping_distance[start:start + size - 1]
+                gap[1::2] = self.car_size[start + 1:start + size, 0]
+                re[start + 1:start + size] = np.cumsum(gap)[1::2]
+            elif self.init_type_loc == "U":
+                re[start:start + size] = np.linspace(0, self._road_length[start], size)
+            elif self.init_type_loc == "R":
+                re[start:start + size] = random_locations(self.car_size[start:start + size, 0],
+                                                          self.stopping_distance[start:start + size],
+                                                          self._road_length[start])
+                pass
+            pass
+        return re
+
+    def _init_noise(self, seed) -> None:
+        self.noise = NoiseProvider(seed)
+        pass
+
+    def _init_ring(self, num: int) -> None:
+        # 环形道路：第i辆车的前车为第i+1辆车，末车的前车为首车，并修正一个道路长度
+        self.leader = np.roll(np.arange(num), -1)
+        self.location_correction = np.zeros(num)
+        self.location_correction[-1] = self.road_length
+        self.follower = np.roll(np.arange(num), 1)
+        self._road_length = np.full(num, self.road_length, dtype=np.float64)  # 每辆车所在道路的长度
+        # 车辆所属的重复样本编号，单一车队均为0
+        self.ring_size = num
+        self.num_replica = 1
+        self.replica = np.zeros(num, dtype=np.int64)
+        pass
+
+    def _init_kernel(self) -> None:
+        import kernel
+
+        num = len(self.cars)
+        self._kernel = kernel.advance_parallel if self.parallel else kernel.advance_serial
+        # 每组一行编号与参数，按组下标一次取出
+        codes = [kernel.model_code(m) for m in self.models]
+        model_id = np.array([c[0] for c in codes], dtype=np.int64)
+        model_parameter = np.array([c[1] for c in codes], dtype=np.float64).reshape(-1, kernel.MODEL_PARAMETER_NUM)
+        self._model_id = model_id[self.model_index]
+        self._model_parameter = model_parameter[self.model_index]
+        self._external_index = np.flatnonzero(self._model_id == kernel.MODEL_EXTERNAL)
+        self._external_acceleration = np.zeros(num)
+        self._noise_offset = np.zeros(num, dtype=np.int64)
+        self._car_length = np.ascontiguousarray(self.car_size[:, 0])
+        pass
+
+    def _get_state(self) -> dict:
+        state = {'prototype_index': self.prototype_index,
+                 'car_id': self.car_id,
+                 '_index': self._index,
+                 'ring_size': np.atleast_1d(self.ring_size),
+                 'time': np.array(self.time),
+                 '_time': np.array(self._time),
+                 '_init_delay': self._init_delay}
+        for name in LIST_ARRAY_STATE:
+            state[name] = getattr(self, name)
+            pass
+        if self.scheduler is not None:
+            state['scheduler_tick'] = np.array(self.scheduler.tick)
+            state['scheduler_now'] = np.array(self.scheduler.now)
+            state['scheduler_next_tick'] = self.scheduler.next_tick
+            pass
+        for k, v in self.noise.get_state().items():
+            state['noise_' + k] = v
+            pass
+        return state
+
+    def _set_state(self, state: dict) -> None:
+        # 重建车辆排列后重新生成静态数组与模型分组，再覆盖动态数据
+        self._restore_cars(state)
+        self._init_arrays()
+        self._index = state['_index'].copy()
+        self.time = state['time'].item()
+        self._time = state['_time'].item()
+        self._init_delay = state['_init_delay'].copy()
+        for name in LIST_ARRAY_STATE:
+            setattr(self, name, state[name].astype(getattr(self, name).dtype))
+            pass
+        if 'scheduler_next_tick' in state:
+            self.scheduler = ReactionScheduler(self.response_time_delay, self._init_delay,
+                                               state['scheduler_tick'].item(), state['scheduler_now'].item())
+            self.scheduler.next_tick = state['scheduler_next_tick'].copy()
+            self.scheduler.rebuild()
+            pass
+        self.noise.set_state({k[6:]: v for k, v in state.items() if k.startswith('noise_')})
+        if self.engine == "numba":
+            self._init_kernel()
+            pass
+        pass
+
+    def _get_scheduler(self, step: float) -> ReactionScheduler:
+        if self.scheduler is None:
+            self.scheduler = ReactionScheduler(self.response_time_delay, self._init_delay, step)
+        elif self.scheduler.tick != step:
+            self.scheduler.rescale(step)
+            pass
+        return self.scheduler
+
+    def update(self, step):
+        if self.engine == "numba":
+            self._advance_compiled(1, step)
+        else:
+            self._update(step)
+            self._apply()
+            self._count_difference()
+        pass
+
+    def _advance(self, n_steps: int, step: float) -> None:
+        if self.engine == "numba":
+            self._advance_compiled(n_steps, step)
+        elif isinstance(self.integrator, AdaptiveIntegrator):
+            self._advance_adaptive(n_steps, step)
+        else:
+            super()._advance(n_steps, step)
+        pass
+
+    def advance_statistics(self, n_steps: int, step: float, record_every: int = 1, start_time: float = 0,
+                           out: np.ndarray = None, index: np.ndarray = None) -> pd.DataFrame:
+        """
+        连续推进多步，每record_every步按环形车队累计一次速度统计量，内存占用与采样数无关
+        与analysis.py一致，仅统计time > start_time的采样
+        :param n_steps: 推进步数，int类型
+        :param step: 步长，float类型
+        :param record_every: 采样间隔步数，int类型
+        :param start_time: 开始统计的时间，float类型，单位s
+        :param out: 采样缓冲，可选，同时记录index中车辆的采样，见advance
+        :param index: 记录的车辆下标数组，可选，见advance，为None且out为None时不保存逐车记录
+        :return: DataFrame，每行为一个环形车队，列为采样车辆数count、平均速度mean、速度标准差std，速度单位m/s
+        """
+        size = np.atleast_1d(self.ring_size)
+        start = np.cumsum(size) - size
+        count = np.zeros(len(size))
+        mean = np.zeros(len(size))
+        m2 = np.zeros(len(size))
+
+        def accumulate(fleet, k):
+            nonlocal count
+            if fleet.time > start_time:
+                # 按环形车队合并本次采样的均值与离差平方和
+                v = fleet.real_speed
+                v_mean = np.add.reduceat(v, start, dtype=np.float64) / size
+                delta = v_mean - mean
+                total = count + size
+                mean[:] += delta * size / total
+                m2[:] += (np.add.reduceat((v - v_mean[fleet.replica]) ** 2, start, dtype=np.float64)
+                          + delta ** 2 * count * size / total)
+                count = total
+                pass
+            pass
+
+        if out is None and index is None:
+            index = np.empty(0, dtype=np.int64)
+            out = np.empty((n_steps // record_every, 0, 11))
+            pass
+        self.advance(n_steps, step, record_every, out=out, hook=accumulate, index=index)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = (m2 / count) ** 0.5
+        re = pd.DataFrame({'count': count, 'mean': mean, 'std': std})
+        re.index.name = self.ring_name
+        return re
+
+    def _advance_adaptive(self, n_steps: int, step: float) -> None:
+        """
+        自适应步长推进，每次推进基本步长的整数倍，不越过下一个反应时刻
+        :param n_steps: 推进的基本步数，int类型
+        :param step: 基本步长，float类型
+        :return: 无
+        """
+        scheduler = self._get_scheduler(step)
+        done = 0
+        while done < n_steps:
+            _a = self._decide(scheduler)
+            limit = min(n_steps - done, scheduler.ticks_to_next())
+            k = self.integrator.choose_ticks(step, limit, self.real_speed, _a, self.limiting_speed)
+            self._integrate(_a, k * step)
+            scheduler.advance(k)
+            self._apply()
+            if k > 1:
+                # 步内达到限制速度的车辆，逐步计算时其后各步的加速度为0
+                self.real_acceleration[:] = self._check_acceleration(self.real_acceleration)
+                pass
+            self._count_difference()
+            done += k
+            pass
+        pass
+
+    def _advance_compiled(self, n_steps: int, step: float) -> None:
+        """
+        编译内核多步推进，差值计算在内核中完成
+        无法编译的跟驰模型在到达反应时刻时回到Python，由批量接口计算
+        :param n_steps: 推进步数，int类型
+        :param step: 步长，float类型
+        :return: 无
+        """
+        scheduler = self._get_scheduler(step)
+        done = 0
+        if self.num_replica == 1:
+            # 单一环形车队直接求和，逐步调用（如区域分解）时比按样本计数快一个数量级
+            size = np.array([self.noise_count.sum()], dtype=np.int64)
+        else:
+            size = np.bincount(self.replica, weights=self.noise_count, minlength=self.num_replica).astype(np.int64)
+        while done < n_steps:
+            noise, cursor = self._peek_noise(size)
+            external = self._external_index[scheduler.next_tick[self._external_index] == scheduler.now]
+            if len(external):
+                # 外部模型使用的噪声位置与内核本步分配的一致
+                due = np.flatnonzero(scheduler.next_tick == scheduler.now)
+                offset, _ = self._get_noise_offset(due)
+                offset = offset[np.searchsorted(due, external)]
+                replica = self.replica[external]
+                offset += replica * noise.shape[1] + cursor[replica]
+                self._external_acceleration[external] = self._run_models(external, noise.reshape(-1), offset)
+                pass
+            k, self._time, used = self._kernel(n_steps - done, step, self.time, self._road_length, self.leader,
+                                         self.location_correction, self._car_length,
+                                         self.expecting_headway, self.limiting_acceleration, self.limiting_speed,
+                                         self.stopping_distance, self.observation_error, self.operation_error,
+                                         self.response_time_delay, self._model_id, self._model_parameter,
+                                         self._external_index, self._external_acceleration,
+                                         scheduler.now, scheduler.next_tick, scheduler.interval,
+                                         self.replica, noise, cursor, self.noise_count, self._noise_offset,
+                                         self.real_location, self.real_position, self.real_mileage,
+                                         self.real_speed, self.real_acceleration, self.real_spacing,
+                                         self.real_speed_difference, self.real_acceleration_difference,
+                                         self.real_headway,
+                                         self._real_location, self._real_position, self._real_mileage,
+                                         self._real_speed, self._real_acceleration)
+            self._consume_noise(used)
+            scheduler.now += k
+            scheduler.invalidate()
+            if k % 2:
+                self._apply()
+            else:
+                self.time = self._time
+            done += k
+            pass
+        pass
+
+    def _update(self, step: float) -> None:
+        """
+        更新准备，与Car.update等价，结果写入双缓冲数组
+        :param step: 步长，float类型
+        :return: 无
+        """
+        scheduler = self._get_scheduler(step)
+        self._integrate(self._decide(scheduler), step)
+        scheduler.advance(1)
+        pass
+
+    def _decide(self, scheduler: ReactionScheduler) -> np.ndarray:
+        """
+        到达反应时刻的车辆调用跟驰模型，其余车辆沿用上次的加速度
+        :param scheduler: 反应时刻调度器
+        :return: 加速度数组，即双缓冲中的加速度数组
+        """
+        _a = self._real_acceleration
+        _a[:] = self.real_acceleration
+        due = scheduler.pop()
+        if len(due):
+            noise, offset = self._take_noise(due)
+            _a[due] = (self._check_acceleration(self._run_models(due, noise, offset), due)
+                       * (1 + self.operation_error[due] * noise[offset]))
+            pass
+        return _a
+
+    def _integrate(self, acceleration: np.ndarray, step: float) -> None:
+        """
+        按积分器推进速度与位置，结果写入双缓冲数组
+        :param acceleration: 加速度数组，经加速度限制后写回
+        :param step: 步长，float类型
+        :return: 无
+        """
+        acceleration[:] = self._check_acceleration(acceleration)
+        self._real_speed[:], dloc = self.integrator.integrate(step, self.real_speed, acceleration,
+                                                              self.limiting_speed)
+        np.add(self.real_location, dloc, out=self._real_location)
+        np.add(self.real_mileage, dloc, out=self._real_mileage)
+        np.mod(self._real_location, self._road_length, out=self._real_position)
+        self._time = self.time + step
+        pass
+
+    def _get_noise_offset(self, index: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        按车辆顺序为到达反应时刻的车辆分配噪声，每个重复样本使用各自的噪声流
+        :param index: 车辆下标数组，升序
+        :return: (每辆车在所属样本噪声流中的起始位置, 每个样本的噪声总数)
+        """
+        count = self.noise_count[index]
+        replica = self.replica[index]
+        size = np.bincount(replica, weights=count, minlength=self.num_replica).astype(np.int64)
+        return np.cumsum(count) - count - (np.cumsum(size) - size)[replica], size
+
+    def _take_noise(self, index: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        为到达反应时刻的车辆取出噪声
+        :param index: 车辆下标数组，升序
+        :return: (噪声数组, 每辆车在噪声数组中的起始位置)
+        """
+        offset, size = self._get_noise_offset(index)
+        noise, cursor = self._peek_noise(size)
+        self._consume_noise(size)
+        replica = self.replica[index]
+        return noise.reshape(-1), offset + replica * noise.shape[1] + cursor[replica]
+
+    def _peek_noise(self, size: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        查看尚未使用的噪声
+        :param size: 每个重复样本至少需要的噪声个数
+        :return: (噪声数组，第r行为第r个样本的噪声流, 每个样本的起始位置)
+        """
+        return self.noise.peek(int(size[0]))[None, :], np.zeros(1, dtype=np.int64)
+
+    def _consume_noise(self, size: np.ndarray) -> None:
+        self.noise.consume(int(size[0]))
+        pass
+
+    def _run_models(self, index: np.ndarray, noise: np.ndarray = None, offset: np.ndarray = None) -> np.ndarray:
+        """
+        对到达反应时刻的车辆按模型分组批量调用跟驰模型
+        :param index: 车辆下标数组
+        :param noise: 预先生成的标准正态分布随机数，可选
+        :param offset: 每辆车在noise中的起始位置，第0个为操作误差，模型从第1个开始使用
+        :return: 加速度数组
+        """
+        groups = self.model_index[index]
+        used = np.unique(groups)
+        with_cars = not all(self.models[g].has_batch for g in used)
+
+        re = np.empty(len(index))
+        for g in used:
+            mask = groups == g
+            batch = self.get_batch(index[mask], with_cars)
+            if noise is not None:
+                batch.noise = noise
+                batch.noise_offset = offset[mask]
+                batch.noise_size = self.models[g].noise_size
+                pass
+            re[mask] = self.models[g].batch(batch)
+            pass
+        return re
+
+    def get_batch(self, index: np.ndarray, with_cars: bool = False) -> CarBatch:
+        """
+        生成批量跟驰模型的输入
+        :param index: 车辆下标数组
+        :param with_cars: 是否附带Car实例，供只实现_run的模型回退使用
+        :return: CarBatch
+        """
+        re = CarBatch()
+        re.index = index
+        re.fleet = self
+        if with_cars:
+            re.cars = [self.cars[i] for i in index]
+            pass
+
+        re.expecting_headway = self.expecting_headway[index]
+        re.car_size = self.car_size[index]
+        re.limiting_acceleration = self.limiting_acceleration[index]
+        re.limiting_speed = self.limiting_speed[index]
+        re.stopping_distance = self.stopping_distance[index]
+        re.observation_error = self.observation_error[index]
+        re.operation_error = self.operation_error[index]
+        re.response_time_delay = self.response_time_delay[index]
+
+        re.real_location = self.real_location[index]
+        re.real_speed = self.real_speed[index]
+        re.real_acceleration = self.real_acceleration[index]
+
+        re.real_headway = self.real_headway[index]
+        re.real_spacing = self.real_spacing[index]
+        re.real_speed_difference = self.real_speed_difference[index]
+        re.real_acceleration_difference = self.real_acceleration_difference[index]
+
+        leader = self.leader[index]
+        re.preceding_speed = self.real_speed[leader]
+        re.preceding_acceleration = self.real_acceleration[leader]
+        re.preceding_limiting_acceleration = self.limiting_acceleration[leader]
+
+        re.time = self.time
+        return re
+
+    def get_model_mask(self, model_type: type) -> np.ndarray:
+        """
+        查询跟驰模型类型为model_type的车辆
+        :param model_type: 跟驰模型类
+        :return: 布尔数组
+        """
+        if model_type not in self._model_mask:
+            is_type = np.array([type(m) is model_type for m in self.models], dtype=bool)
+            self._model_mask[model_type] = is_type[self.model_index]
+            pass
+        return self._model_mask[model_type]
+
+    def get_platoon_index(self, model_type: type, max_search_index: int) -> PlatoonIndex:
+        """
+        查询按跟驰模型类型划分的车队索引，车辆排列不变时重复使用
+        :param model_type: 跟驰模型类
+        :param max_search_index: 最大搜索车辆数，int类型
+        :return: PlatoonIndex
+        """
+        key = (model_type, max_search_index)
+        if key not in self._platoon_index:
+            self._platoon_index[key] = PlatoonIndex(self.get_model_mask(model_type), max_search_index,
+                                                    self.ring_size)
+            pass
+        return self._platoon_index[key]
+
+    def _apply(self) -> None:
+        self.time = self._time
+        self.real_location, self._real_location = self._real_location, self.real_location
+        self.real_position, self._real_position = self._real_position, self.real_position
+        self.real_mileage, self._real_mileage = self._real_mileage, self.real_mileage
+        self.real_speed, self._real_speed = self._real_speed, self.real_speed
+        self.real_acceleration, self._real_acceleration = self._real_acceleration, self.real_acceleration
+        pass
+
+    def _count_difference(self) -> None:
+        """
+        差值计算，与Car.count_difference等价
+        :return: 无
+        """
+        leader = self.leader
+        np.subtract(self.real_speed[leader], self.real_speed, out=self.real_speed_difference)
+        np.subtract(self.real_acceleration[leader], self.real_acceleration, out=self.real_acceleration_difference)
+        dx = self.real_spacing
+        np.subtract(self.real_location[leader], self.car_size[leader, 0], out=dx)
+        dx -= self.real_location
+        dx += self.location_correction
+
+        dv = self.real_speed_difference
+        hw = self.real_headway
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(-dx, dv, out=hw)
+            hw[hw < 0] = float("inf")
+            hw[dx < 0] = -float("inf")
+            stop = dv == 0
+            hw[stop] = float("inf") * dx[stop]
+        pass
+
+    def _check_acceleration(self, acceleration: np.ndarray, index=slice(None)) -> np.ndarray:
+        limiting_acceleration = self.limiting_acceleration[index]
+        limiting_speed = self.limiting_speed[index]
+        speed = self.real_speed[index]
+        re = np.clip(acceleration, limiting_acceleration[:, 0], limiting_acceleration[:, 1])
+        re[((speed <= limiting_speed[:, 0]) & (acceleration < 0))
+           | ((speed >= limiting_speed[:, 1]) & (acceleration > 0))] = 0
+        return re
+
+    def _check_speed(self, speed: np.ndarray) -> np.ndarray:
+        return np.clip(speed, self.limiting_speed[:, 0], self.limiting_speed[:, 1])
+
+    def get_cars_location(self) -> List:
+        return self.real_location.tolist()
+
+    def get_cars_speed(self) -> List:
+        return self.real_speed.tolist()
+
+    def get_cars_acceleration(self) -> List:
+        return self.real_acceleration.tolist()
+
+    def get_cars_headway(self) -> List:
+        return self.real_headway.tolist()
+
+    def get_cars_spacing(self) -> List:
+        return self.real_spacing.tolist()
+
+    def get_cars_type(self) -> List:
+        return [self.prototypes[p].car_type for p in self.prototype_index.tolist()]
+
+    def get_data(self) -> pd.DataFrame:
+        rows = self._index.astype(int)
+        cols = ['sub_index', 'time', 'type', 'pos', 'v', 'a', 'dl', 'dv', 'da', 'hw']
+        re = np.delete(self.get_data_by_list(), 2, axis=1)
+        re = pd.DataFrame(re, index=rows, columns=cols, dtype='double')
+        re.index.name = 'index'
+        return re
+
+    def get_data_by_list(self) -> np.ndarray:
+        re = np.empty((len(self.cars), 11))
+        self._write_sample(re)
+        return re
+
+    def _write_sample(self, buffer: np.ndarray, index: np.ndarray = None) -> None:
+        if index is None:
+            index = slice(None)
+            pass
+        buffer[:, 0] = self._index[index]
+        buffer[:, 1] = self.time
+        buffer[:, 2] = self.car_id[index]
+        buffer[:, 3] = self.car_type[index]
+        buffer[:, 4] = self.real_position[index]
+        buffer[:, 5] = self.real_speed[index]
+        buffer[:, 6] = self.real_acceleration[index]
+        buffer[:, 7] = self.real_spacing[index]
+        buffer[:, 8] = self.real_speed_difference[index]
+        buffer[:, 9] = self.real_acceleration_difference[index]
+        buffer[:, 10] = self.real_headway[index]
+        pass
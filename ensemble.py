@@ -0,0 +1,55 @@
+from sweep import *
+
+
+class EnsembleFleet(SweepFleet):
+    """
+    重复样本（ensemble）车队
+    同一场景的多个随机重复样本作为一个车队同时推进，一次update推进全部样本。
+    状态数组按[样本, 车辆]依次排列，第r个样本占用下标[r * ring_size, (r + 1) * ring_size)，
+    各样本是互不相连的环形车队，车辆排列独立生成，观测误差与操作误差使用各自独立的噪声流。
+    第r个样本的结果与车辆排列相同、种子为其噪声种子的ArrayFleet一致
+    """
+
+    ring_name = 'replica'
+
+    def __init__(self,
+                 car_num: int,
+                 init_type_car: str,
+                 proportion: Dict,
+                 road_length: float,
+                 init_type_loc: str,
+                 replicas: int,
+                 engine: str = "python",
+                 parallel: bool = False,
+                 seed=None,
+                 integrator="ballistic",
+                 dtype=np.float64):
+        """
+        构造函数
+        :param car_num: 每个样本的车辆数，int类型
+        :param init_type_car: 车辆排列方式，str类型，见SET_INIT_CARS_TYPE
+        :param proportion: 车辆比例，dict类型，例如{HDC: 0.6, IDC_CACC: 0.4}
+        :param road_length: 道路长度，float类型，单位m
+        :param init_type_loc: 初始位置方式，str类型，见SET_INIT_LOC_TYPE
+        :param replicas: 重复样本数，int类型
+        :param engine: 计算引擎，str类型，见SET_ENGINE_TYPE
+        :param parallel: 编译内核是否按车辆并行(prange)
+        :param seed: 随机数种子，int类型时由numpy.random.SeedSequence派生各样本的种子，
+                     list类型时依次为各样本的种子，为None时由np.random的全局状态生成
+        :param integrator: 积分器，str类型，见integrator.DICT_INTEGRATOR，或Integrator实例
+        :param dtype: 速度、加速度等状态数组的数据类型，见ArrayFleet
+        """
+        self.replicas = replicas
+        super().__init__(car_num, init_type_car, [(proportion, road_length)] * replicas, init_type_loc,
+                         engine=engine, parallel=parallel, seed=seed, integrator=integrator,
+                         dtype=dtype)
+        self.proportion = proportion
+        self.road_length = road_length
+
+    def split_replicas(self, data: np.ndarray) -> np.ndarray:
+        """
+        按样本拆分采样数据，不复制数据
+        :param data: advance返回的采样缓冲，形状为[采样数, 车辆数, 11]
+        :return: 形状为[采样数, 样本数, 每个样本的车辆数, 11]的视图
+        """
+        return data.reshape(len(data), self.replicas, self.ring_size[0], data.shape[-1])
@@ -14,6 +14,10 @@ CYCLE_INDEX = int(SIMULATION_TIME / STEP)
 
 CAR_NUM = 50
 
+ENGINE = "numba"  # ArrayFleet计算引擎，"python"或"numba"
+INTEGRATOR = "ballistic"  # ArrayFleet积分器，"ballistic"、"verlet"或"adaptive"，后两者仅支持"python"引擎
+OUTPUT_FORMAT = "columnar"  # 采样数据输出格式，"columnar"（每列一个.npy文件的目录）或"csv"，见recorder.py
+
 DICT_FOLLOWING_MODEL = dict(FVD=FVDModel(),
                             GIPPS=GippsModel(),
                             IDM=IDMModel(),
@@ -0,0 +1,100 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from queue import Empty
+
+from task import *
+
+# 单次决策的相对开销，以一辆车一步的积分开销为1，按引擎实测
+# numba引擎下无法编译的跟驰模型（如IntelligentDrivingCarModel）每次决策都要回到Python计算
+DICT_DECISION_COST = {
+    "numba": {"compiled": 0, "external": 500},
+    "python": {"compiled": 10, "external": 15}
+}
+
+
+def estimate_cost(proportion: dict, traffic_density: float, engine: str = ENGINE) -> float:
+    """
+    估计单个场景的相对耗时，仅用于安排执行顺序
+    耗时由逐步积分（车辆数/步长）与跟驰模型决策（车辆数/反应延迟）两部分组成，单位为每仿真秒的车辆步数。
+    实测车流密度对耗时几乎没有影响，仅在耗时相同时排序靠前
+    :param proportion: 车辆比例，dict类型
+    :param traffic_density: 车流密度，float类型
+    :param engine: 计算引擎，str类型，见SET_ENGINE_TYPE
+    :return: 相对耗时，float类型
+    """
+    total = np.sum(list(proportion.values()))
+    re = 0
+    for car, share in proportion.items():
+        num = CAR_NUM * share / total
+        kind = "compiled"
+        if engine == "numba":
+            import kernel
+            if kernel.model_code(car.following_model)[0] == kernel.MODEL_EXTERNAL:
+                kind = "external"
+                pass
+            pass
+        elif not car.following_model.has_batch:
+            kind = "external"
+            pass
+        re += num / STEP + num / max(car.response_time_delay, STEP) * DICT_DECISION_COST[engine][kind]
+        pass
+    return re + traffic_density * 1e-6
+
+
+def _run_scene(cell: int, proportion: dict, traffic_density: float, dir_path: str, seed, queue,
+               checkpoint_every: int = 0, cache: WarmStartCache = None) -> int:
+    """
+    子进程中运行一个场景，进度消息经队列发回主进程
+    :return: 场景序号
+    """
+    for ti, td, pe, ty, ret in std_task_scene(proportion, traffic_density, dir_path, progress=False,
+                                                checkpoint_every=checkpoint_every, seed=seed, cache=cache):
+        if ty == 'message':
+            queue.put((cell, ti, td, pe, ret))
+            pass
+        pass
+    return cell
+
+
+def pool_task(proportions: list, traffic_densities: list, dir_path: str, workers: int = None, seed: int = None,
+              checkpoint_every: int = 0, cache: WarmStartCache = None):
+    """
+    多进程任务，结果与std_task相同
+    每个（比例，车流密度）场景为一个任务，按估计耗时从长到短提交到进程池，空闲的进程依次领取下一个任务。
+    子进程的进度消息实时转发到主进程输出
+    :param proportions: 比例列表，list类型
+    :param traffic_densities: 车流密度列表，list类型
+    :param dir_path: 输出目录，str类型
+    :param workers: 进程数，int类型，默认为CPU核数
+    :param seed: 随机数种子，int类型，由numpy.random.SeedSequence为每个场景派生独立的种子，为None时随机生成
+    :param checkpoint_every: 检查点间隔采样数，int类型，见std_task_scene，中断后重新运行时未完成的场景从检查点继续
+    :param cache: 预热缓存，类型为WarmStartCache，见std_task_scene，给定seed时重新运行可以跳过过渡过程
+    """
+    cells = [(p, td) for td in traffic_densities for p in proportions]
+    seeds = [s.generate_state(1)[0] for s in np.random.SeedSequence(seed).spawn(len(cells))]
+    order = sorted(range(len(cells)), key=lambda i: -estimate_cost(*cells[i]))
+    workers = os.cpu_count() if workers is None else workers
+
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = manager.Queue()
+        pending = {pool.submit(_run_scene, i, cells[i][0], cells[i][1], dir_path, seeds[i], queue,
+                               checkpoint_every, cache)
+                   for i in order}
+        count = 0
+        while pending or not queue.empty():
+            try:
+                cell, ti, td, pe, ret = queue.get(timeout=0.1)
+                print("Time:%s  Traffic Density:%.2f  Permeability:%.2f  Cell:%d"
+                      % (ti, td, pe, cell + 1))
+                print(ret)
+                continue
+            except Empty:
+                pass
+            done, pending = wait(pending, timeout=0, return_when=FIRST_COMPLETED)
+            for f in done:
+                count += 1
+                print("(%d/%d) Cell:%d finished" % (count, len(cells), f.result() + 1))
+                pass
+            pass
+        pass
+    pass
@@ -0,0 +1,187 @@
+import abc
+
+import numpy as np
+
+
+class Integrator(metaclass=abc.ABCMeta):
+    """
+    积分器接口类
+    跟驰模型给出的加速度在两次决策之间保持不变，积分器据此推进速度与位置
+    """
+
+    name = ''
+
+    @abc.abstractmethod
+    def integrate(self, step: float, speed: np.ndarray, acceleration: np.ndarray,
+                  limiting_speed: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        积分器虚函数，必须重载。
+        :param step: 步长，float类型，单位s
+        :param speed: 速度数组，单位m/s
+        :param acceleration: 加速度数组（已经过加速度限制），单位m/s**2
+        :param limiting_speed: 限制速度数组，形状为[车辆数, 2]，单位m/s
+        :return: (新速度, 位移)
+        """
+
+    pass
+
+
+class BallisticIntegrator(Integrator):
+    """
+    弹道积分，与Car.update一致：
+    速度按加速度推进后截断到限制速度，位移取截断前后速度平方差除以两倍加速度。
+    速度在步内达到限制后的剩余时间不计位移，因此需要小步长
+    """
+
+    name = 'ballistic'
+
+    def integrate(self, step, speed, acceleration, limiting_speed):
+        _v = step * acceleration
+        _v += speed
+        _v = np.clip(_v, limiting_speed[:, 0], limiting_speed[:, 1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dloc = np.where(acceleration == 0, _v * step, (_v ** 2 - speed ** 2) / (2 * acceleration))
+        return _v, dloc
+
+
+class VerletIntegrator(Integrator):
+    """
+    Verlet积分，加速度不变时x += v*h + a*h**2/2，v += a*h。
+    速度在步内达到限制时，先匀变速到限制速度，剩余时间按限制速度匀速行驶，
+    因此在两次决策之间对任意步长都是精确的
+    """
+
+    name = 'verlet'
+
+    def integrate(self, step, speed, acceleration, limiting_speed):
+        _v = speed + step * acceleration
+        bound = np.clip(_v, limiting_speed[:, 0], limiting_speed[:, 1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(acceleration == 0, 0, np.where(bound != _v, (bound - speed) / acceleration, step))
+        dloc = speed * t + 0.5 * acceleration * t ** 2 + bound * (step - t)
+        return bound, dloc
+
+
+class AdaptiveIntegrator(Integrator):
+    """
+    自适应步长积分
+    每步取不越过下一个反应时刻、不超过max_step的最大步长，
+    再以步长减半（一步与两个半步之差）估计误差，误差超过tolerance时继续减半。
+    半步之间按限制速度重新检查加速度，与逐步计算时的速度与加速度限制一致。
+    与1ms弹道积分、Verlet积分的步数、位置差与速度统计量对照见本文件的__main__
+    """
+
+    name = 'adaptive'
+
+    def __init__(self, base: Integrator = None, max_step: float = 0.1, tolerance: float = 1e-3):
+        """
+        构造函数
+        :param base: 基础积分器，默认为VerletIntegrator
+        :param max_step: 最大步长，float类型，单位s
+        :param tolerance: 单步位移误差限，float类型，单位m
+        """
+        self.base = VerletIntegrator() if base is None else base
+        self.max_step = max_step
+        self.tolerance = tolerance
+        self.num_steps = 0  # 已推进的步数
+
+    def integrate(self, step, speed, acceleration, limiting_speed):
+        return self.base.integrate(step, speed, acceleration, limiting_speed)
+
+    def choose_ticks(self, tick: float, limit: int, speed: np.ndarray, acceleration: np.ndarray,
+                     limiting_speed: np.ndarray) -> int:
+        """
+        选择步长
+        :param tick: 基本步长，float类型，单位s，步长为其整数倍
+        :param limit: 步数上限，int类型，通常为距下一个反应时刻或采样时刻的步数
+        :param speed: 速度数组，单位m/s
+        :param acceleration: 加速度数组（已经过加速度限制），单位m/s**2
+        :param limiting_speed: 限制速度数组，形状为[车辆数, 2]，单位m/s
+        :return: 基本步长的倍数
+        """
+        k = max(1, min(limit, int(self.max_step / tick + 1e-9)))
+        while k > 1:
+            h = k * tick
+            _, d = self.base.integrate(h, speed, acceleration, limiting_speed)
+            _v, d1 = self.base.integrate(h / 2, speed, acceleration, limiting_speed)
+            _a = np.where(((_v <= limiting_speed[:, 0]) & (acceleration < 0))
+                          | ((_v >= limiting_speed[:, 1]) & (acceleration > 0)), 0, acceleration)
+            _, d2 = self.base.integrate(h / 2, _v, _a, limiting_speed)
+            if np.max(np.abs(d - d1 - d2), initial=0) <= self.tolerance:
+                break
+            k //= 2
+            pass
+        self.num_steps += 1
+        return k
+
+
+DICT_INTEGRATOR = {
+    "ballistic": BallisticIntegrator,
+    "verlet": VerletIntegrator,
+    "adaptive": AdaptiveIntegrator
+}
+
+
+def get_integrator(integrator) -> Integrator:
+    """
+    按名称或实例获取积分器
+    :param integrator: str类型，见DICT_INTEGRATOR，或Integrator实例
+    :return: Integrator实例
+    """
+    if isinstance(integrator, Integrator):
+        return integrator
+    if integrator not in DICT_INTEGRATOR:
+        raise ValueError("integrator must be one of %s" % sorted(DICT_INTEGRATOR))
+    return DICT_INTEGRATOR[integrator]()
+
+
+if __name__ == '__main__':
+    # 自适应步长与1ms参考积分的对照：车流密度35，50辆车，python引擎
+    # 无误差时比较60s内的步数与位置差，有误差时比较3个随机种子下SAMPLING_TIME后的速度均值与标准差
+    import copy
+    import time
+
+    import example
+    from engine import ArrayFleet
+
+    def quiet(car):
+        car = copy.deepcopy(car)
+        car.observation_error = 0
+        car.operation_error = 0
+        return car
+
+    def run(proportion, n_steps, record_every, **kwargs):
+        np.random.seed(3)
+        fleet = ArrayFleet(example.CAR_NUM, "R", proportion, 1000 * example.CAR_NUM / 35, "L", **kwargs)
+        t = time.time()
+        out = fleet.advance(n_steps, example.STEP, record_every)
+        return fleet, out, time.time() - t
+
+    n = int(60 / example.STEP)
+    for name, proportion in [("HDC 0.6 + SDC_CACC 0.4", {quiet(example.HDC): 0.6, quiet(example.SDC_CACC): 0.4}),
+                             ("HDC 0.6 + IDC_CACC 0.4", {quiet(example.HDC): 0.6, quiet(example.IDC_CACC): 0.4}),
+                             ("HDC", {quiet(example.HDC): 1.0})]:
+        _, ballistic, _ = run(proportion, n, 100)
+        _, verlet, _ = run(proportion, n, 100, integrator="verlet")
+        fleet, adaptive, _ = run(proportion, n, 100, integrator="adaptive")
+        print("%s: 60s steps %d -> %d" % (name, n, fleet.integrator.num_steps))
+        for ref_name, ref in [("verlet", verlet), ("ballistic", ballistic)]:
+            error = np.abs(adaptive[..., 4] - ref[..., 4])
+            error = np.minimum(error, fleet.road_length - error).max(axis=1)
+            print("  max position error vs 1ms %-9s first 8s %.2e m, 60s %.2e m" % (ref_name, error[:80].max(),
+                                                                                     error.max()))
+            pass
+        pass
+
+    n = int(example.SIMULATION_TIME / example.STEP)
+    start = int(example.SAMPLING_TIME / example.STEP / example.SAMPLING_INTERVAL)
+    proportion = {example.HDC: 0.6, example.SDC_CACC: 0.4}
+    for seed in range(3):
+        for integrator in ["ballistic", "adaptive"]:
+            _, out, elapsed = run(proportion, n, example.SAMPLING_INTERVAL, seed=seed, integrator=integrator)
+            v = out[start:, :, 5]
+            print("seed %d %-9s speed mean %.3f m/s, std %.3f m/s, %.1fs" % (seed, integrator, v.mean(), v.std(),
+                                                                            elapsed))
+            pass
+        pass
+    pass
@@ -0,0 +1,288 @@
+import numpy as np
+from numba import njit, prange
+
+from moos import *
+
+# 内置跟驰模型编号，0表示无法编译的模型（如IntelligentDrivingCarModel或用户模型），由外部计算加速度
+MODEL_EXTERNAL = 0
+MODEL_FVD = 1
+MODEL_GIPPS = 2
+MODEL_IDM = 3
+MODEL_PATH_ACC = 4
+MODEL_PATH_CACC = 5
+MODEL_IDM_WITH_GIPPS = 6
+MODEL_PATH_ACC_WITH_GIPPS = 7
+MODEL_PATH_CACC_WITH_GIPPS = 8
+
+MODEL_PARAMETER_NUM = 3
+
+
+def model_code(model: FollowingModel) -> (int, List[float]):
+    """
+    查询跟驰模型的编号与参数
+    仅精确匹配内置类型，子类可能重载了_run，按外部模型处理
+    :param model: 跟驰模型实例
+    :return: (模型编号, 模型参数)
+    """
+    t = type(model)
+    if t is FVDModel:
+        return MODEL_FVD, [0, 0, 0]
+    elif t is GippsModel:
+        return MODEL_GIPPS, [0, 0, 0]
+    elif t is IDMModel:
+        return MODEL_IDM, [model.beta, 0, 0]
+    elif t is PATHModelACC:
+        return MODEL_PATH_ACC, [model.k1, model.k2, 0]
+    elif t is PATHModelCACC:
+        return MODEL_PATH_CACC, [model.k1, model.k2, model.k3]
+    elif t is IDMWithGipps and type(model.idm) is IDMModel and type(model.gipps) is GippsModel:
+        return MODEL_IDM_WITH_GIPPS, [model.idm.beta, 0, 0]
+    elif (t is PATHModelACCWithGipps and type(model.path_acc) is PATHModelACC
+          and type(model.gipps) is GippsModel):
+        return MODEL_PATH_ACC_WITH_GIPPS, [model.path_acc.k1, model.path_acc.k2, 0]
+    elif (t is PATHModelCACCWithGipps and type(model.path_cacc) is PATHModelCACC
+          and type(model.gipps) is GippsModel):
+        return MODEL_PATH_CACC_WITH_GIPPS, [model.path_cacc.k1, model.path_cacc.k2, model.path_cacc.k3]
+    else:
+        return MODEL_EXTERNAL, [0, 0, 0]
+
+
+@njit(cache=True)
+def _fvd(spacing, speed, speed_difference, max_speed):
+    b = 28
+    alpha = 0.16
+    beta = 1.1
+    _lambda = 0.5
+    optimal_speed = 0.5 * max_speed * (np.tanh(spacing / b - beta) - np.tanh(-beta))
+    return alpha * (optimal_speed - speed) + _lambda * speed_difference
+
+
+@njit(cache=True)
+def _gipps(spacing, speed, preceding_speed, min_acceleration, max_acceleration, max_speed,
+           preceding_min_acceleration, stopping_distance, response_time_delay, n1, n2):
+    e = ((min_acceleration * response_time_delay) ** 2
+         - min_acceleration
+         * (2 * (spacing * n1 - stopping_distance)
+            - speed * response_time_delay
+            - (preceding_speed * n2) ** 2
+            / preceding_min_acceleration))
+    if e < 0:
+        e = 0
+    v1 = (speed
+          + 2.5
+          * max_acceleration
+          * (1 - speed / max_speed)
+          * (0.0025 + speed / max_speed) ** 0.5)
+    v2 = min_acceleration * response_time_delay + e ** 0.5
+    v = min(v1, v2)
+    return (v - speed) / response_time_delay
+
+
+@njit(cache=True)
+def _idm(spacing, speed, speed_difference, min_acceleration, max_acceleration, max_speed,
+         stopping_distance, expecting_headway, n1, beta):
+    exp_spacing = (stopping_distance
+                   + speed * expecting_headway
+                   + speed * speed_difference * 0.5 / abs(max_acceleration * min_acceleration) ** 0.5)
+    if spacing > 0:
+        return abs(max_acceleration) * (
+                1
+                - abs(speed / max_speed) ** beta
+                - abs(exp_spacing / spacing * n1) ** 2
+        )
+    else:
+        return -np.inf
+
+
+@njit(cache=True)
+def _path(spacing, speed, speed_difference, preceding_acceleration, stopping_distance, expecting_headway,
+          n1, n2, n3, k1, k2, k3, cooperative):
+    e = (spacing * n1
+         - stopping_distance
+         - expecting_headway * speed)
+    if cooperative:
+        return (k1 * preceding_acceleration * n2
+                + k2 * e
+                + k3 * speed_difference * n3)
+    else:
+        return k1 * e + k2 * speed_difference * n2
+
+
+@njit(cache=True)
+def _with_gipps(a1, a2):
+    t = min(0.0, a1, a2)
+    if t == 0:
+        return a1
+    else:
+        return t
+
+
+@njit(cache=True)
+def _run_model(i, model_id, model_parameter, leader, speed, acceleration, spacing, speed_difference,
+               limiting_acceleration, limiting_speed, stopping_distance, expecting_headway, observation_error,
+               response_time_delay, noise, o):
+    """
+    内置跟驰模型，观测误差依次取noise[o]、noise[o + 1]……，顺序与批量接口一致
+    """
+    p = leader[i]
+    if model_id == MODEL_FVD:
+        return _fvd(spacing[i], speed[i], speed_difference[i], limiting_speed[i, 1])
+
+    if model_id == MODEL_IDM or model_id == MODEL_IDM_WITH_GIPPS:
+        a1 = _idm(spacing[i], speed[i], speed_difference[i], limiting_acceleration[i, 0],
+                  limiting_acceleration[i, 1], limiting_speed[i, 1], stopping_distance[i], expecting_headway[i],
+                  1 + observation_error[i] * noise[o], model_parameter[i, 0])
+        o += 1
+    elif model_id == MODEL_PATH_ACC or model_id == MODEL_PATH_ACC_WITH_GIPPS:
+        a1 = _path(spacing[i], speed[i], speed_difference[i], acceleration[p], stopping_distance[i],
+                   expecting_headway[i], 1 + observation_error[i] * noise[o],
+                   1 + observation_error[i] * noise[o + 1], 1.0,
+                   model_parameter[i, 0], model_parameter[i, 1], 0.0, False)
+        o += 2
+    elif model_id == MODEL_PATH_CACC or model_id == MODEL_PATH_CACC_WITH_GIPPS:
+        a1 = _path(spacing[i], speed[i], speed_difference[i], acceleration[p], stopping_distance[i],
+                   expecting_headway[i], 1 + observation_error[i] * noise[o],
+                   1 + observation_error[i] * noise[o + 1], 1 + observation_error[i] * noise[o + 2],
+                   model_parameter[i, 0], model_parameter[i, 1], model_parameter[i, 2], True)
+        o += 3
+    else:
+        a1 = 0.0
+
+    if model_id == MODEL_IDM or model_id == MODEL_PATH_ACC or model_id == MODEL_PATH_CACC:
+        return a1
+
+    a2 = _gipps(spacing[i], speed[i], speed[p], limiting_acceleration[i, 0], limiting_acceleration[i, 1],
+                limiting_speed[i, 1], limiting_acceleration[p, 0], stopping_distance[i], response_time_delay[i],
+                1 + observation_error[i] * noise[o], 1 + observation_error[i] * noise[o + 1])
+    if model_id == MODEL_GIPPS:
+        return a2
+    return _with_gipps(a1, a2)
+
+
+@njit(cache=True)
+def _check_acceleration(a, speed, min_speed, max_speed, min_acceleration, max_acceleration):
+    if (speed <= min_speed and a < 0) or (speed >= max_speed and a > 0):
+        return 0.0
+    if a < min_acceleration:
+        return min_acceleration
+    elif a > max_acceleration:
+        return max_acceleration
+    return a
+
+
+@njit(cache=True)
+def _check_speed(v, min_speed, max_speed):
+    if v < min_speed:
+        return min_speed
+    elif v > max_speed:
+        return max_speed
+    return v
+
+
+@njit(cache=True)
+def _count_real_headway(dx, dv):
+    if dv == 0:
+        return np.inf * dx
+    re = -dx / dv
+    if re < 0:
+        re = np.inf
+    if dx < 0:
+        re = -np.inf
+    return re
+
+
+def _advance(n_steps, step, time, road_length, leader, location_correction, car_length,
+             expecting_headway, limiting_acceleration, limiting_speed, stopping_distance,
+             observation_error, operation_error, response_time_delay,
+             model_id, model_parameter, external_index, external_acceleration, now, next_tick, interval,
+             replica, noise, noise_cursor, noise_count, noise_offset,
+             location, position, mileage, speed, acceleration,
+             spacing, speed_difference, acceleration_difference, headway,
+             _location, _position, _mileage, _speed, _acceleration):
+    """
+    多步内核，每步融合跟驰模型、加速度与速度限制、位置更新与差值计算
+    两组状态数组逐步交替作为双缓冲。
+    next_tick[i] == now的车辆到达反应时刻，决策后推迟interval[i]步
+    外部模型车辆到达反应时刻时提前返回，由调用方计算其加速度后继续
+    噪声按车辆顺序为每辆到达反应时刻的车辆分配noise_count个，noise的第r行为第r个重复样本的噪声流，
+    从noise_cursor[r]开始使用，噪声不足一步时提前返回
+    :return: (完成步数, 时间, 各样本已使用噪声个数)，完成步数为奇数时最新状态位于下划线数组
+    """
+    num = len(location)
+    done = 0
+    used = np.zeros(len(noise_cursor), dtype=np.int64)
+    need = np.zeros(len(noise_cursor), dtype=np.int64)
+    while done < n_steps:
+        if done > 0:
+            due = False
+            for j in external_index:
+                if next_tick[j] == now:
+                    due = True
+                    break
+            if due:
+                break
+
+        need[:] = 0
+        for i in range(num):
+            if next_tick[i] == now:
+                r = replica[i]
+                noise_offset[i] = noise_cursor[r] + used[r] + need[r]
+                need[r] += noise_count[i]
+        enough = True
+        for r in range(len(need)):
+            if noise_cursor[r] + used[r] + need[r] > noise.shape[1]:
+                enough = False
+        if not enough:
+            break
+
+        for i in prange(num):
+            if next_tick[i] != now:
+                _a = acceleration[i]
+            else:
+                next_tick[i] = now + interval[i]
+                o = noise_offset[i]
+                z = noise[replica[i]]
+                if model_id[i] == MODEL_EXTERNAL:
+                    _a = external_acceleration[i]
+                else:
+                    _a = _run_model(i, model_id[i], model_parameter, leader, speed, acceleration, spacing,
+                                    speed_difference, limiting_acceleration, limiting_speed, stopping_distance,
+                                    expecting_headway, observation_error, response_time_delay, z, o + 1)
+                _a = (_check_acceleration(_a, speed[i], limiting_speed[i, 0], limiting_speed[i, 1],
+                                          limiting_acceleration[i, 0], limiting_acceleration[i, 1])
+                      * (1 + operation_error[i] * z[o]))
+
+            _a = _check_acceleration(_a, speed[i], limiting_speed[i, 0], limiting_speed[i, 1],
+                                     limiting_acceleration[i, 0], limiting_acceleration[i, 1])
+            _v = _check_speed(speed[i] + step * _a, limiting_speed[i, 0], limiting_speed[i, 1])
+            if _a == 0:
+                dloc = _v * step
+            else:
+                dloc = (_v ** 2 - speed[i] ** 2) / (2 * _a)
+            _acceleration[i] = _a
+            _speed[i] = _v
+            _location[i] = location[i] + dloc
+            _mileage[i] = mileage[i] + dloc
+            _position[i] = _location[i] % road_length[i]
+
+        for i in prange(num):
+            p = leader[i]
+            speed_difference[i] = _speed[p] - _speed[i]
+            acceleration_difference[i] = _acceleration[p] - _acceleration[i]
+            spacing[i] = _location[p] - car_length[p] - _location[i] + location_correction[i]
+            headway[i] = _count_real_headway(spacing[i], speed_difference[i])
+
+        location, _location = _location, location
+        position, _position = _position, position
+        mileage, _mileage = _mileage, mileage
+        speed, _speed = _speed, speed
+        acceleration, _acceleration = _acceleration, acceleration
+        time += step
+        now += 1
+        used += need
+        done += 1
+    return done, time, used
+
+
+advance_serial = njit(cache=True)(_advance)
+advance_parallel = njit(cache=True, parallel=True)(_advance)
@@ -0,0 +1,209 @@
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from moos import *
+
+FRAME_MAGIC = 0x4F54534652414D45  # 共享内存帧缓冲的标识
+
+# 头部为int64数组，依次为标识、帧缓冲容量、每帧车辆数、每帧列数、已写入的帧数
+HEADER_SIZE = 8
+HEADER_MAGIC, HEADER_CAPACITY, HEADER_ROWS, HEADER_COLUMNS, HEADER_COUNT = range(5)
+
+_created = set()  # 本进程创建的共享内存名称，由写入端删除
+
+
+def _attach(name: str) -> SharedMemory:
+    # 只读取的进程退出时不应删除共享内存，不交给resource_tracker管理
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # 早期版本打开已有的共享内存时也会登记，打开后取消登记；本进程创建的共享内存只登记一次，保留登记由写入端删除
+    shm = SharedMemory(name=name)
+    if shm._name not in _created:
+        resource_tracker.unregister(shm._name, "shared_memory")
+        pass
+    return shm
+
+
+def _layout(buffer, capacity: int, rows: int, columns: int) -> (np.ndarray, np.ndarray, np.ndarray):
+    # 共享内存布局：头部、每个槽位的序号、帧数据，均按8字节对齐
+    header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=buffer)
+    sequence = np.ndarray((capacity,), dtype=np.int64, buffer=buffer, offset=HEADER_SIZE * 8)
+    frames = np.ndarray((capacity, rows, columns), dtype=np.float64, buffer=buffer,
+                        offset=(HEADER_SIZE + capacity) * 8)
+    return header, sequence, frames
+
+
+class FrameWriter:
+    """
+    共享内存帧缓冲的写入端
+    车队状态按固定布局的帧写入共享内存中的环形缓冲，每帧的行与列同get_data_by_list，由_write_sample直接写入，
+    不经过列表、DataFrame或序列化，写入一帧的开销与一次采样相同。
+    每个槽位有一个序号（seqlock）：写入第f帧前置为2f+1（奇数表示正在写入），写完后置为2f+2，再更新已写入的帧数；
+    读取端在复制帧前后检查序号，不一致时重读，写入端从不等待读取端。
+    序号与帧数据的写入顺序依赖x86等强内存序的处理器
+    """
+
+    def __init__(self, fleet: Fleet, capacity: int = 64, name: str = None):
+        """
+        构造函数
+        :param fleet: 车队，类型为Fleet或其子类，每帧的车辆数为创建时的车辆数
+        :param capacity: 环形缓冲的帧数，int类型，读取端最多可以取回最近capacity帧
+        :param name: 共享内存名称，str类型，为None时自动生成，读取端按name打开
+        """
+        rows = len(fleet.cars)
+        columns = 11
+        size = (HEADER_SIZE + capacity + capacity * rows * columns) * 8
+        self.shm = SharedMemory(name=name, create=True, size=size)
+        self.name = self.shm.name
+        _created.add(self.shm._name)
+        self.capacity = capacity
+        self._header, self._sequence, self._frames = _layout(self.shm.buf, capacity, rows, columns)
+        self._sequence[:] = 0
+        self._header[:] = 0
+        self._header[[HEADER_MAGIC, HEADER_CAPACITY, HEADER_ROWS, HEADER_COLUMNS]] = [FRAME_MAGIC, capacity, rows,
+                                                                                     columns]
+        pass
+
+    @property
+    def count(self) -> int:
+        """
+        已写入的帧数
+        """
+        return int(self._header[HEADER_COUNT])
+
+    def publish(self, fleet: Fleet) -> int:
+        """
+        写入车队的当前状态
+        :param fleet: 车队，车辆数与创建时相同
+        :return: 帧序号，int类型，从0开始
+        """
+        f = self.count
+        slot = f % self.capacity
+        self._sequence[slot] = 2 * f + 1
+        fleet._write_sample(self._frames[slot])
+        self._sequence[slot] = 2 * f + 2
+        self._header[HEADER_COUNT] = f + 1
+        return f
+
+    def __call__(self, fleet: Fleet, k: int) -> None:
+        # 作为advance的采样回调，每次采样写入一帧
+        self.publish(fleet)
+        pass
+
+    def advance(self, fleet: Fleet, n_steps: int, step: float, publish_every: int = 1) -> None:
+        """
+        推进车队，每publish_every步写入一帧，不保留采样
+        :param fleet: 车队
+        :param n_steps: 推进步数，int类型
+        :param step: 步长，float类型
+        :param publish_every: 写入间隔步数，int类型
+        """
+        fleet.advance(n_steps, step, publish_every, out=np.empty((n_steps // publish_every, 0, 11)),
+                      hook=self, index=np.empty(0, dtype=np.int64))
+        pass
+
+    def close(self) -> None:
+        """
+        关闭并删除共享内存，读取端已打开的映射仍然有效
+        """
+        if self.shm is None:
+            return
+        del self._header, self._sequence, self._frames
+        self.shm.close()
+        self.shm.unlink()
+        _created.discard(self.shm._name)
+        self.shm = None
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        pass
+
+    pass
+
+
+class FrameReader:
+    """
+    共享内存帧缓冲的读取端，可以在其他进程中打开
+    读取只复制一帧的数组，不影响写入端
+    """
+
+    def __init__(self, name: str, retries: int = 100):
+        """
+        构造函数
+        :param name: 共享内存名称，str类型，即FrameWriter.name
+        :param retries: 帧被同时写入时的最多重读次数，int类型
+        """
+        self.shm = _attach(name)
+        header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=self.shm.buf)
+        if header[HEADER_MAGIC] != FRAME_MAGIC:
+            del header
+            self.shm.close()
+            raise ValueError("%s is not a frame buffer" % name)
+        self.capacity, self.rows, self.columns = header[[HEADER_CAPACITY, HEADER_ROWS, HEADER_COLUMNS]].tolist()
+        del header
+        self.retries = retries
+        self._header, self._sequence, self._frames = _layout(self.shm.buf, self.capacity, self.rows, self.columns)
+        pass
+
+    @property
+    def count(self) -> int:
+        """
+        写入端已写入的帧数
+        """
+        return int(self._header[HEADER_COUNT])
+
+    def read(self, f: int) -> np.ndarray:
+        """
+        读取第f帧
+        :param f: 帧序号，int类型
+        :return: 形状为[车辆数, 11]的数组，该帧已被覆盖或尚未写入时为None
+        """
+        slot = f % self.capacity
+        for _ in range(self.retries):
+            if self._sequence[slot] != 2 * f + 2:
+                if self.count <= f or self.count - f > self.capacity:
+                    return None
+                continue
+            re = self._frames[slot].copy()
+            if self._sequence[slot] == 2 * f + 2:
+                return re
+            pass
+        return None
+
+    def latest(self) -> (int, np.ndarray):
+        """
+        读取最新的一帧
+        :return: (帧序号, 形状为[车辆数, 11]的数组)，尚未写入任何帧时为(-1, None)
+        """
+        for _ in range(self.retries):
+            f = self.count - 1
+            if f < 0:
+                return -1, None
+            re = self.read(f)
+            if re is not None:
+                return f, re
+            pass
+        return -1, None
+
+    def close(self) -> None:
+        if self.shm is None:
+            return
+        del self._header, self._sequence, self._frames
+        self.shm.close()
+        self.shm = None
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        pass
+
+    pass
@@ -20,6 +20,8 @@ elif mod == '-43':
     std_task(proportions[6:], traffic_densities[:6], path)
 elif mod == '-44':
     std_task(proportions[6:], traffic_densities[6:], path)
+elif mod == '-sweep':
+    std_sweep_task(proportions, traffic_densities, path)
 else:
     print("Fail")
     pass
@@ -1,10 +1,11 @@
-import copy
+import os
 import time
 from typing import List, Dict
 
 import pandas as pd
 
 from std_interface import *
+from vehicle_type import VehicleTypeTable, new_car_ids
 
 
 class Car(CarInfo):
@@ -33,8 +34,7 @@ class Car(CarInfo):
         """
         super().__init__()
         self.name = car_name
-        self.id = hash(time.time())
-        time.sleep(0.001)
+        self.id = int(new_car_ids(1)[0])
         self.car_type = car_type
         self.following_model = following_model
         self.init_location = float()
@@ -85,8 +85,7 @@ class Car(CarInfo):
         self._response_time_delay = np.random.random() * self.response_time_delay
 
     def __call__(self):
-        self.id = hash(time.time())
-        time.sleep(0.001)
+        self.id = int(new_car_ids(1)[0])
 
     def __repr__(self):
         return self.name
@@ -212,7 +211,7 @@ class Car(CarInfo):
         :return: 无
         """
         if self._response_time_delay > 0:
-            self._response_time_delay -= 0.001
+            self._response_time_delay -= step
             _a = self._real_acceleration
         else:
             self._response_time_delay = self.response_time_delay
@@ -304,10 +303,27 @@ class FVDModel(FollowingModel):
         # print(optimal_speed, _a)
         return _a
 
+    def _run_batch(self, following_cars: CarBatch) -> np.ndarray:
+        b = 28
+        alpha = 0.16
+        beta = 1.1
+        _lambda = 0.5
+        optimal_speed = (
+                0.5 * following_cars.limiting_speed[:, 1]
+                * (np.tanh(following_cars.real_spacing / b - beta) - np.tanh(-beta))
+        )
+        _a = (
+                alpha * (optimal_speed - following_cars.real_speed)
+                + _lambda * following_cars.real_speed_difference
+        )
+        return _a
+
     pass
 
 
 class GippsModel(FollowingModel):
+    noise_size = 2
+
     def _run(self, following_car: Car) -> float:
         e = ((following_car.limiting_acceleration[0] * following_car.response_time_delay) ** 2
              - following_car.limiting_acceleration[0]
@@ -333,10 +349,33 @@ class GippsModel(FollowingModel):
         _a = (v - following_car.real_speed) / following_car.response_time_delay
         return _a
 
+    def _run_batch(self, following_cars: CarBatch) -> np.ndarray:
+        e = ((following_cars.limiting_acceleration[:, 0] * following_cars.response_time_delay) ** 2
+             - following_cars.limiting_acceleration[:, 0]
+             * (2 * (following_cars.real_spacing
+                     * following_cars.observation_noise()
+                     - following_cars.stopping_distance)
+                - following_cars.real_speed * following_cars.response_time_delay
+                - (following_cars.preceding_speed
+                   * following_cars.observation_noise()) ** 2
+                / following_cars.preceding_limiting_acceleration[:, 0]))
+        e[e < 0] = 0
+        v1 = (following_cars.real_speed
+              + 2.5
+              * following_cars.limiting_acceleration[:, 1]
+              * (1 - following_cars.real_speed / following_cars.limiting_speed[:, 1])
+              * (0.0025 + following_cars.real_speed / following_cars.limiting_speed[:, 1]) ** 0.5)
+        v2 = (following_cars.limiting_acceleration[:, 0] * following_cars.response_time_delay + e ** 0.5)
+        v = np.minimum(v1, v2)
+        _a = (v - following_cars.real_speed) / following_cars.response_time_delay
+        return _a
+
     pass
 
 
 class IDMModel(FollowingModel):
+    noise_size = 1
+
     def __init__(self, beta=4):
         self.beta = beta
 
@@ -367,10 +406,37 @@ class IDMModel(FollowingModel):
             _a = -float('inf')
         return _a
 
+    def _run_batch(self, following_cars: CarBatch) -> np.ndarray:
+        exp_spacing = (
+                following_cars.stopping_distance
+                + following_cars.real_speed
+                * following_cars.expecting_headway
+                + following_cars.real_speed
+                * following_cars.real_speed_difference * 0.5
+                / np.abs(following_cars.limiting_acceleration[:, 1]
+                         * following_cars.limiting_acceleration[:, 0]) ** 0.5
+        )
+        spacing = following_cars.real_spacing
+        with np.errstate(divide='ignore', invalid='ignore'):
+            _a = (
+                    np.abs(following_cars.limiting_acceleration[:, 1])
+                    * (1
+                       - np.abs(following_cars.real_speed
+                                / following_cars.limiting_speed[:, 1]) ** self.beta
+                       - np.abs(exp_spacing
+                                / spacing
+                                * following_cars.observation_noise()) ** 2
+                       )
+            )
+        _a[spacing <= 0] = -float('inf')
+        return _a
+
     pass
 
 
 class PATHModelACC(FollowingModel):
+    noise_size = 2
+
     def __init__(self, k1=0.23, k2=0.07):
         self.k1 = k1
         self.k2 = k2
@@ -389,10 +455,26 @@ class PATHModelACC(FollowingModel):
               * np.random.normal(1, following_car.observation_error))
         return _a
 
+    def _run_batch(self, following_cars: CarBatch) -> np.ndarray:
+        e = (
+                following_cars.real_spacing
+                * following_cars.observation_noise()
+                - following_cars.stopping_distance
+                - following_cars.expecting_headway
+                * following_cars.real_speed
+        )
+        _a = (self.k1 * e
+              + self.k2
+              * following_cars.real_speed_difference
+              * following_cars.observation_noise())
+        return _a
+
     pass
 
 
 class PATHModelCACC(FollowingModel):
+    noise_size = 3
+
     def __init__(self, k1=1.1, k2=0.23, k3=0.07):
         self.k1 = k1
         self.k2 = k2
@@ -415,10 +497,29 @@ class PATHModelCACC(FollowingModel):
               * np.random.normal(1, following_car.observation_error))
         return _a
 
+    def _run_batch(self, following_cars: CarBatch) -> np.ndarray:
+        e = (
+                following_cars.real_spacing
+                * following_cars.observation_noise()
+                - following_cars.stopping_distance
+                - following_cars.expecting_headway
+                * following_cars.real_speed
+        )
+        _a = (self.k1
+              * following_cars.preceding_acceleration
+              * following_cars.observation_noise()
+              + self.k2 * e
+              + self.k3
+              * following_cars.real_speed_difference
+              * following_cars.observation_noise())
+        return _a
+
     pass
 
 
 class IDMWithGipps(FollowingModel):
+    noise_size = 3
+
     def __init__(self, beta=4):
         self.beta = beta
         self.idm = IDMModel(beta)
@@ -437,8 +538,16 @@ class IDMWithGipps(FollowingModel):
             pass
         return re
 
+    def _run_batch(self, following_cars: CarBatch) -> np.ndarray:
+        a1 = self.idm.batch(following_cars)
+        a2 = self.gipps.batch(following_cars)
+        t = np.minimum(np.minimum(0, a1), a2)
+        return np.where(t == 0, a1, t)
+
 
 class PATHModelACCWithGipps(FollowingModel):
+    noise_size = 4
+
     def __init__(self, k1=0.23, k2=0.07):
         self.k1 = k1
         self.k2 = k2
@@ -458,8 +567,16 @@ class PATHModelACCWithGipps(FollowingModel):
             pass
         return re
 
+    def _run_batch(self, following_cars: CarBatch) -> np.ndarray:
+        a1 = self.path_acc.batch(following_cars)
+        a2 = self.gipps.batch(following_cars)
+        t = np.minimum(np.minimum(0, a1), a2)
+        return np.where(t == 0, a1, t)
+
 
 class PATHModelCACCWithGipps(FollowingModel):
+    noise_size = 5
+
     def __init__(self, k1=1.1, k2=0.23, k3=0.07):
         self.k1 = k1
         self.k2 = k2
@@ -480,6 +597,12 @@ class PATHModelCACCWithGipps(FollowingModel):
             pass
         return re
 
+    def _run_batch(self, following_cars: CarBatch) -> np.ndarray:
+        a1 = self.path_cacc.batch(following_cars)
+        a2 = self.gipps.batch(following_cars)
+        t = np.minimum(np.minimum(0, a1), a2)
+        return np.where(t == 0, a1, t)
+
 
 class IntelligentDrivingCarModel(FollowingModel):
     dict_mode = {0: 'head', 1: 'body', 2: 'tail'}
@@ -496,7 +619,6 @@ class IntelligentDrivingCarModel(FollowingModel):
 
     def _run(self, following_car: Car) -> float:
 
-        _following_car = following_car.get_info()
         a = 0
 
         cars = []
@@ -510,34 +632,40 @@ class IntelligentDrivingCarModel(FollowingModel):
         body = []
         tail = []
 
+        # 每个向量叠加此前所有向量之和，按tail、body分别累计
+        sum_tail = 0
+        sum_body = 0
         tag = 2
         for c in cars[:-1]:
             if tag == 2 and type(c.preceding_car.following_model) == type(self):
                 t = c.get_difference()
-                tail.append(t + np.sum(tail, 0))
+                tail.append(t + sum_tail)
+                sum_tail = sum_tail + tail[-1]
                 continue
             elif tag == 2 and type(c.preceding_car.following_model) != type(self):
                 tag = 1
                 t = c.get_difference()
-                body.append(t + np.sum(tail, 0))
+                body.append(t + sum_tail)
+                sum_body = sum_body + body[-1]
                 continue
             elif tag == 1 and type(c.preceding_car.following_model) != type(self):
                 t = c.get_difference()
-                body.append(t + np.sum(tail, 0) + np.sum(body, 0))
+                body.append(t + sum_tail + sum_body)
+                sum_body = sum_body + body[-1]
                 continue
             elif tag == 1 and type(c.preceding_car.following_model) == type(self):
                 tag = 0
                 t = c.get_difference()
-                head.append(t + np.sum(tail, 0) + np.sum(body, 0))
-                continue
+                head.append(t + sum_tail + sum_body)
+                break
             else:
                 pass
             pass
 
         if len(body) == 0 or len(head) == 0:
-            a = self.model(_following_car)
+            a = self.model(following_car)
             pass
-        elif type(_following_car.following_car.following_model) is not type(self):
+        elif type(following_car.following_car.following_model) is not type(self):
             # head
             if len(tail) != 0:
                 vector_pre_car = tail[0]
@@ -555,12 +683,12 @@ class IntelligentDrivingCarModel(FollowingModel):
                 (0, vector_pre_car[2], vector_mean_body[2], vector_head[2])
             )
             da = np.min((vector_pre_car[2], vector_mean_body[2], vector_head[2]))
-            _following_car.real_spacing = dx
-            _following_car.real_speed_difference = dv
-            _following_car.real_acceleration_difference = da
-            a = self.model(_following_car)
+            a = self.model(CarOverride(following_car,
+                                       real_spacing=dx,
+                                       real_speed_difference=dv,
+                                       real_acceleration_difference=da))
             pass
-        elif type(_following_car.following_car.following_model) is type(self):
+        elif type(following_car.following_car.following_model) is type(self):
             # tail
             if len(tail) != 0:
                 vector_pre_car = tail[0]
@@ -568,7 +696,7 @@ class IntelligentDrivingCarModel(FollowingModel):
                 vector_pre_car = body[0]
             vector_mean_body = np.mean(body, 0)
             vector_head = head[0]
-            t = _following_car.expecting_headway
+            t = following_car.expecting_headway
             t = t - self.alpha * t * np.tanh(self.beta * (np.max((vector_pre_car[1],
                                                                  vector_mean_body[1],
                                                                  vector_head[1]))
@@ -576,19 +704,149 @@ class IntelligentDrivingCarModel(FollowingModel):
                                                           * np.max((vector_pre_car[2],
                                                                    vector_mean_body[2],
                                                                    vector_head[2]))))
-            _following_car.expecting_headway = t
-            a = self.model(_following_car)
+            a = self.model(CarOverride(following_car, expecting_headway=t))
             pass
         else:
             print("ERROR")
             exit()
         return a
 
+    @property
+    def has_batch(self) -> bool:
+        return self.model.has_batch
+
+    @property
+    def noise_size(self) -> int:
+        return self.model.noise_size
+
+    def _run_batch(self, following_cars: CarBatch) -> np.ndarray:
+        if not self.model.has_batch:
+            return super()._run_batch(following_cars)
+
+        fleet = following_cars.fleet
+        platoon = fleet.get_platoon_index(type(self), self.max_search_index)
+        index = following_cars.index
+        rows = np.flatnonzero(platoon.valid[index])
+        if not len(rows):
+            return self.model.batch(following_cars)
+
+        # 仅对存在body与head的车辆沿前车链累计差值向量
+        index = index[rows]
+        num = len(index)
+        num_tail = platoon.num_tail[index]
+        num_head = num_tail + platoon.num_body[index]
+        vector_pre_car = np.stack((fleet.real_spacing[index],
+                                   fleet.real_speed_difference[index],
+                                   fleet.real_acceleration_difference[index]), axis=1)
+        vector_sum_body = np.zeros((num, 3))
+        vector_head = np.zeros((num, 3))
+        total = np.zeros((num, 3))
+        chain = index
+        for i in range(num_head.max() + 1):
+            vector = np.stack((fleet.real_spacing[chain],
+                               fleet.real_speed_difference[chain],
+                               fleet.real_acceleration_difference[chain]), axis=1)
+            vector += total
+            in_body = (num_tail <= i) & (i < num_head)
+            vector_sum_body[in_body] += vector[in_body]
+            at_head = num_head == i
+            vector_head[at_head] = vector[at_head]
+            total += vector
+            chain = fleet.leader[chain]
+            pass
+        vector_mean_body = vector_sum_body / platoon.num_body[index][:, None]
+
+        mode_tail = platoon.mode_tail[index]
+        mode_head = ~mode_tail
+
+        dx = np.maximum(
+            vector_pre_car[:, 0]
+            + self.gamma
+            * np.minimum(np.minimum(0, vector_pre_car[:, 1]),
+                         np.minimum(vector_mean_body[:, 1], vector_head[:, 1])),
+            0
+        )
+        dv = vector_pre_car[:, 1] + self.gamma * np.minimum(
+            np.minimum(0, vector_pre_car[:, 2]),
+            np.minimum(vector_mean_body[:, 2], vector_head[:, 2])
+        )
+        da = np.minimum(vector_pre_car[:, 2], np.minimum(vector_mean_body[:, 2], vector_head[:, 2]))
+        t = following_cars.expecting_headway[rows]
+        t = t - self.alpha * t * np.tanh(self.beta * (np.maximum(vector_pre_car[:, 1],
+                                                                 np.maximum(vector_mean_body[:, 1],
+                                                                            vector_head[:, 1]))
+                                                      + self.gamma
+                                                      * np.maximum(vector_pre_car[:, 2],
+                                                                   np.maximum(vector_mean_body[:, 2],
+                                                                              vector_head[:, 2]))))
+
+        # 仅替换被修正的变量，其余变量由覆盖视图直接读取
+        head = rows[mode_head]
+        tail = rows[mode_tail]
+        real_spacing = following_cars.real_spacing.copy()
+        real_spacing[head] = dx[mode_head]
+        real_speed_difference = following_cars.real_speed_difference.copy()
+        real_speed_difference[head] = dv[mode_head]
+        real_acceleration_difference = following_cars.real_acceleration_difference.copy()
+        real_acceleration_difference[head] = da[mode_head]
+        expecting_headway = following_cars.expecting_headway.copy()
+        expecting_headway[tail] = t[mode_tail]
+        _following_cars = CarOverride(following_cars,
+                                      real_spacing=real_spacing,
+                                      real_speed_difference=real_speed_difference,
+                                      real_acceleration_difference=real_acceleration_difference,
+                                      expecting_headway=expecting_headway)
+        return self.model.batch(_following_cars)
+
 
 SET_INIT_LOC_TYPE = {"L", "U", "R"}
 
 SET_INIT_CARS_TYPE = {"U", "R"}
 
+SNAPSHOT_VERSION = 1  # 快照格式版本
+
+# 快照中保存的车辆动态变量
+LIST_CAR_STATE = ['time', '_time', 'init_location', 'init_speed', 'init_acceleration', 'road_length',
+                  'real_location', '_real_location', 'real_position', '_real_position',
+                  'real_mileage', '_real_mileage', 'real_speed', '_real_speed',
+                  'real_acceleration', '_real_acceleration', 'real_headway', 'real_spacing',
+                  'real_speed_difference', 'real_acceleration_difference', '_response_time_delay']
+
+
+def arrange_cars(car_num: int, init_type_car: str, proportion_values: List) -> np.ndarray:
+    """
+    车辆排列，各类车辆数按比例向下取整
+    "R"为随机排列：每辆车抽取一个均匀分布随机数，按随机数排序
+    :param car_num: 车辆数，int类型
+    :param init_type_car: 车辆排列方式，str类型，见SET_INIT_CARS_TYPE
+    :param proportion_values: 各类车辆的比例，list类型
+    :return: 每辆车的类型下标数组
+    """
+    if init_type_car == "R":
+        list_num = np.array(np.array(proportion_values) * car_num / np.sum(proportion_values), dtype=int)
+        rand_num = np.concatenate([np.random.rand(ln) for ln in list_num] + [np.empty(0)])
+        kind = np.repeat(np.arange(len(list_num)), list_num)
+        return kind[np.argsort(rand_num)]
+    return np.empty(0, dtype=np.int64)
+
+
+def random_locations(car_length: np.ndarray, stopping_distance: np.ndarray, road_length: float) -> np.ndarray:
+    """
+    环形道路上的随机初始位置，车辆顺序不变，任意相邻两车（含末车与首车）的间隔不小于前车的停车间距。
+    除去全部车长与停车间距后的空余长度上抽取车辆数个均匀分布随机数并排序，依次作为每辆车额外的间隔
+    :param car_length: 按车辆排列的车长数组，单位m
+    :param stopping_distance: 按车辆排列的停车间距数组，单位m
+    :param road_length: 道路长度，float类型，单位m
+    :return: 位置数组，单位m
+    """
+    num = len(car_length)
+    free = road_length - np.sum(car_length) - np.sum(stopping_distance)
+    if free < 0:
+        raise ValueError("road of %.1f m is too short for %d cars" % (road_length, num))
+    gap = np.zeros(num)
+    gap[1:] = stopping_distance[:-1] + car_length[1:]
+    return np.sort(np.random.uniform(0, free, num)) + np.cumsum(gap)
+
 
 class Fleet:
     def __init__(self,
@@ -623,39 +881,155 @@ class Fleet:
         self.cars[-1].count_difference(location_correction=self.road_length)
         pass
 
-    def _init_cars(self) -> List[Car]:
-        proportion_keys = list(self.proportion.keys())
-        proportion_values = list(self.proportion.values())
-        re = []
-        if self.init_type_car is "U":
-            pass
-        elif self.init_type_car is "R":
-            list_rand_num = []
-            num_and_car = []
-            list_num = list(
-                np.array(np.array(proportion_values)
-                         * self.car_num
-                         / np.sum(proportion_values),
-                         dtype=int)
-            )
-            for ln in list_num:
-                list_rand_num.append(list(np.random.rand(ln)))
-                pass
-            for lrn, c in zip(list_rand_num, proportion_keys):
-                for u in lrn:
-                    num_and_car.append([u, copy.deepcopy(c)])
+    def advance(self, n_steps: int, step: float, record_every: int = 1, out: np.ndarray = None,
+                hook=None, index: np.ndarray = None) -> np.ndarray:
+        """
+        连续推进多步，每record_every步采样一次，采样数据直接写入out
+        :param n_steps: 推进步数，int类型
+        :param step: 步长，float类型
+        :param record_every: 采样间隔步数，int类型，0表示不采样
+        :param out: 采样缓冲，numpy数组，形状为[采样数, 车辆数, 11]，列与get_data_by_list一致，为None时自动分配
+        :param hook: 采样回调，可选，每次采样后调用hook(fleet, k)，k为采样序号
+        :param index: 采样的车辆下标数组，可选，为None时采样全部车辆，给定时out的第二维为len(index)。
+                      大规模车队只记录部分车辆，out也可以是numpy.lib.format.open_memmap打开的磁盘文件，内存占用与采样数无关
+        :return: 采样缓冲
+        """
+        num_sample = n_steps // record_every if record_every else 0
+        if out is None:
+            out = np.empty((num_sample, len(self.cars) if index is None else len(index), 11))
+        elif len(out) < num_sample:
+            raise ValueError("out holds %d samples, %d required" % (len(out), num_sample))
+
+        done = 0
+        k = 0
+        while done < n_steps:
+            if record_every:
+                chunk = min(record_every - done % record_every, n_steps - done)
+            else:
+                chunk = n_steps - done
+            self._advance(chunk, step)
+            done += chunk
+            if record_every and done % record_every == 0:
+                self._write_sample(out[k], index)
+                if hook is not None:
+                    hook(self, k)
                     pass
+                k += 1
+                pass
+            pass
+        return out
+
+    def _advance(self, n_steps: int, step: float) -> None:
+        for _ in range(n_steps):
+            self.update(step)
+            pass
+        pass
+
+    def snapshot(self, file, **extra) -> None:
+        """
+        保存车队快照，包括车辆排列、前车关系、全部动态数据（含双缓冲）、反应延迟倒计时与随机数状态
+        以numpy的npz二进制格式写入，file为路径时先写入临时文件再替换，写入中断不会损坏已有快照
+        :param file: 快照文件路径或二进制文件对象
+        :param extra: 附加数组，与快照一同保存，restore时原样返回，例如已有的采样数据
+        :return: 无
+        """
+        state = {'version': np.array(SNAPSHOT_VERSION), 'fleet': np.array(type(self).__name__)}
+        state.update(self._get_state())
+        random_state = np.random.get_state()
+        state['random_key'] = random_state[1]
+        state['random_param'] = np.array(random_state[2:], dtype=np.float64)
+        for k, v in extra.items():
+            state['extra_' + k] = np.asarray(v)
+            pass
+
+        if isinstance(file, str):
+            with open(file + '.tmp', 'wb') as f:
+                np.savez(f, **state)
                 pass
-            num_and_car = np.array(num_and_car)
-            index = np.argsort(num_and_car[:, 0])
-            for _i in index:
-                re.append(num_and_car[_i, 1])
+            os.replace(file + '.tmp', file)
         else:
+            np.savez(file, **state)
             pass
+        pass
 
-        for r in re:
-            r()
+    def restore(self, file) -> dict:
+        """
+        从快照恢复车队，此后的推进结果与保存快照的车队继续推进完全一致
+        车队须与保存快照的车队以相同的参数构造（随机数种子除外），车辆排列按快照重建。
+        同时恢复np.random的全局状态
+        :param file: 快照文件路径或二进制文件对象
+        :return: snapshot时保存的附加数组，dict类型
+        """
+        with np.load(file) as data:
+            state = {k: data[k] for k in data.files}
+            pass
+        if int(state['version']) != SNAPSHOT_VERSION:
+            raise ValueError("snapshot version %d is not supported" % int(state['version']))
+        if str(state['fleet']) != type(self).__name__:
+            raise ValueError("snapshot of %s cannot be restored to %s" % (state['fleet'], type(self).__name__))
+        if len(self.prototypes) <= state['prototype_index'].max(initial=-1):
+            raise ValueError("snapshot uses %d prototypes, fleet has %d"
+                             % (state['prototype_index'].max() + 1, len(self.prototypes)))
+        self._set_state(state)
+        pos, has_gauss, cached_gaussian = state['random_param'].tolist()
+        np.random.set_state(('MT19937', state['random_key'], int(pos), int(has_gauss), cached_gaussian))
+        return {k[6:]: v for k, v in state.items() if k.startswith('extra_')}
+
+    def _get_state(self) -> dict:
+        state = {'prototype_index': self.prototype_index,
+                 'car_id': np.array([c.id for c in self.cars], dtype=np.int64),
+                 '_index': self._index}
+        for name in LIST_CAR_STATE:
+            state['car_' + name] = np.array([getattr(c, name) for c in self.cars], dtype=np.float64)
+            pass
+        return state
+
+    def _set_state(self, state: dict) -> None:
+        self._restore_cars(state)
+        self._index = state['_index'].copy()
+        for name in LIST_CAR_STATE:
+            for c, v in zip(self.cars, state['car_' + name].tolist()):
+                setattr(c, name, v)
+                pass
+            pass
+        for c in self.cars:
+            c.is_initialized = True
+            pass
+        pass
 
+    def _restore_cars(self, state: dict) -> None:
+        # 按快照中的原型下标重建车辆排列与前车关系，车辆ID沿用快照
+        self.prototype_index = state['prototype_index'].copy()
+        self.cars = self._make_cars(self.prototype_index)
+        for c, car_id in zip(self.cars, state['car_id'].tolist()):
+            c.id = car_id
+            pass
+        self._make_cars_link()
+        pass
+
+    def _write_sample(self, buffer: np.ndarray, index: np.ndarray = None) -> None:
+        if index is None:
+            buffer[:] = self.get_data_by_list()
+        else:
+            buffer[:] = np.asarray(self.get_data_by_list())[index]
+        pass
+
+    def _init_cars(self) -> List[Car]:
+        self.types = VehicleTypeTable(self.proportion.keys())  # 车辆类型表，类型顺序与proportion一致
+        self.prototypes = self.types.prototypes  # 车辆原型
+        # 每辆车的原型在prototypes中的下标
+        self.prototype_index = arrange_cars(self.car_num, self.init_type_car, list(self.proportion.values()))
+        return self._make_cars(self.prototype_index)
+
+    def _make_cars(self, prototype_index: np.ndarray) -> List[Car]:
+        # 由原型浅复制车辆，静态参数与跟驰模型实例共享，动态数据各自赋值，ID由计数器分配
+        re = []
+        for p, car_id in zip(prototype_index.tolist(), new_car_ids(len(prototype_index)).tolist()):
+            c = object.__new__(type(self.prototypes[p]))
+            c.__dict__ = self.prototypes[p].__dict__.copy()
+            c.id = car_id
+            re.append(c)
+            pass
         return re
 
     def _make_cars_link(self):
@@ -689,6 +1063,11 @@ class Fleet:
                 pass
             pass
         elif self.init_type_loc is "R":
+            loc = random_locations(np.array([c.car_size[0] for c in self.cars]),
+                                   np.array([c.stopping_distance for c in self.cars]), self.road_length)
+            for cl, car in zip(loc.tolist(), self.cars):
+                car.initialize(cl, 0, 0, self.road_length)
+                pass
             pass
         else:
             pass
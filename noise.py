@@ -0,0 +1,155 @@
+import json
+from typing import List
+
+import numpy as np
+
+
+class NoiseProvider:
+    """
+    噪声流
+    从numpy.random.Generator按块生成标准正态分布随机数，按顺序分发给车队与跟驰模型。
+    误差乘子N(1, error)由1 + error * z得到，与np.random.normal(1, error)同分布
+    """
+
+    def __init__(self, seed: int = None, block_size: int = 1 << 16):
+        """
+        构造函数
+        :param seed: 随机数种子，int类型，为None时由np.random的全局状态生成，使np.random.seed仍然有效
+        :param block_size: 每块随机数个数，int类型
+        """
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+            pass
+        self.seed = seed
+        self.block_size = block_size
+        self.generator = np.random.default_rng(seed)
+        self._block = np.empty(0)
+        self._cursor = 0
+
+    def peek(self, size: int) -> np.ndarray:
+        """
+        查看当前块中尚未使用的随机数，不足size个时补充新块
+        :param size: 至少需要的随机数个数，int类型
+        :return: 尚未使用的随机数
+        """
+        if len(self._block) - self._cursor < size:
+            self._block = np.concatenate((self._block[self._cursor:],
+                                          self.generator.standard_normal(max(self.block_size, size))))
+            self._cursor = 0
+            pass
+        return self._block[self._cursor:]
+
+    def consume(self, size: int) -> None:
+        """
+        标记前size个随机数已使用，需先调用peek
+        :param size: 已使用的随机数个数，int类型
+        """
+        self._cursor += size
+        pass
+
+    def take(self, size: int) -> np.ndarray:
+        """
+        取出size个随机数
+        :param size: 随机数个数，int类型
+        :return: 标准正态分布随机数
+        """
+        re = self.peek(size)[:size]
+        self.consume(size)
+        return re
+
+    def normal(self, scale: np.ndarray) -> np.ndarray:
+        """
+        误差乘子，服从N(1, scale)
+        :param scale: 标准差数组
+        :return: 与scale等长的随机数
+        """
+        return 1 + scale * self.take(len(scale))
+
+    def get_state(self) -> dict:
+        """
+        噪声流的完整状态，用于车队快照
+        :return: dict类型，值均为numpy数组
+        """
+        return {'generator': np.array(json.dumps(self.generator.bit_generator.state)),
+                'block': self._block[self._cursor:].copy(),
+                'cursor': np.array(0)}
+
+    def set_state(self, state: dict) -> None:
+        """
+        恢复get_state保存的状态，此后的随机数序列与保存时一致
+        :param state: get_state的返回值
+        """
+        self.generator.bit_generator.state = json.loads(str(state['generator']))
+        self._block = np.array(state['block'], dtype=np.float64)
+        self._cursor = int(state['cursor'])
+        pass
+
+
+class EnsembleNoiseProvider:
+    """
+    重复样本（ensemble）的噪声流
+    每个样本使用独立的numpy.random.Generator，第r个样本的随机数序列与种子相同的NoiseProvider一致。
+    各样本的随机数按行保存在同一个二维块中，每行有各自的使用位置
+    """
+
+    def __init__(self, seeds: List, block_size: int = 1 << 16):
+        """
+        构造函数
+        :param seeds: 每个样本的随机数种子，list类型，元素为int或numpy.random.SeedSequence
+        :param block_size: 每块每个样本的随机数个数，int类型
+        """
+        self.seeds = seeds
+        self.block_size = block_size
+        self.generators = [np.random.default_rng(s) for s in seeds]
+        self._block = np.empty((len(seeds), 0))
+        self._cursor = np.zeros(len(seeds), dtype=np.int64)
+
+    def peek(self, size: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        查看尚未使用的随机数，任一样本不足size个时补充新块
+        :param size: 每个样本至少需要的随机数个数
+        :return: (随机数块，第r行为第r个样本, 每个样本尚未使用的起始位置)
+        """
+        remain = self._block.shape[1] - self._cursor
+        if (remain < size).any():
+            width = remain.max() + max(self.block_size, int(np.max(size)))
+            block = np.empty((len(self.generators), width))
+            for r, g in enumerate(self.generators):
+                block[r, :remain[r]] = self._block[r, self._cursor[r]:]
+                block[r, remain[r]:] = g.standard_normal(width - remain[r])
+                pass
+            self._block = block
+            self._cursor[:] = 0
+            pass
+        return self._block, self._cursor.copy()
+
+    def consume(self, size: np.ndarray) -> None:
+        """
+        标记每个样本前size个随机数已使用，需先调用peek
+        :param size: 每个样本已使用的随机数个数
+        """
+        self._cursor += size
+        pass
+
+    def get_state(self) -> dict:
+        """
+        噪声流的完整状态，用于车队快照
+        :return: dict类型，值均为numpy数组
+        """
+        return {'generator': np.array([json.dumps(g.bit_generator.state) for g in self.generators]),
+                'block': self._block[:, self._cursor.min(initial=0):].copy(),
+                'cursor': self._cursor - self._cursor.min(initial=0)}
+
+    def set_state(self, state: dict) -> None:
+        """
+        恢复get_state保存的状态，此后各样本的随机数序列与保存时一致
+        :param state: get_state的返回值，样本数须与本噪声流一致
+        """
+        if len(state['generator']) != len(self.generators):
+            raise ValueError("state holds %d streams, %d expected" % (len(state['generator']), len(self.generators)))
+        for g, s in zip(self.generators, state['generator']):
+            g.bit_generator.state = json.loads(str(s))
+            pass
+        self._block = np.array(state['block'], dtype=np.float64)
+        self._cursor = np.array(state['cursor'], dtype=np.int64)
+        pass
@@ -0,0 +1,128 @@
+import numpy as np
+
+
+class PlatoonIndex:
+    """
+    环形车队的车队（platoon）索引
+    按标记把环形车队划分为连续的同类车段（run-length segments），第i辆车的前车为第i+1辆车。
+    对每辆车给出前方连续的同类车（tail）与其后连续的非同类车（body）的数量，
+    IntelligentDrivingCarModel据此直接定位head/body/tail，无需逐车搜索与分类。
+    单车道环形道路上车辆顺序不变，索引只在车辆排列改变时重建
+    """
+
+    def __init__(self, flag: np.ndarray, max_search_index: int, ring_size: int = None):
+        """
+        构造函数
+        :param flag: 同类车标记数组，按环形顺序排列
+        :param max_search_index: 最大搜索车辆数，int类型，与IntelligentDrivingCarModel一致
+        :param ring_size: 每个环形车队的车辆数，多个环形车队（如重复样本、批量场景）依次排列时给出，
+                          int类型表示各环形车队等长，数组表示依次的车辆数，默认为一个环形车队
+        """
+        self.flag = np.asarray(flag, dtype=bool)
+        self.max_search_index = max_search_index
+        self.ring_size = len(self.flag) if ring_size is None else ring_size
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """
+        按flag重建车段与各车的head/body/tail数量，车辆排列改变后调用
+        """
+        segment_start = []
+        segment_length = []
+        segment_run = []
+        num_tail = []
+        num_body = []
+        mode_tail = []
+        if np.ndim(self.ring_size) == 0:
+            sizes = [self.ring_size] * (len(self.flag) // self.ring_size)
+        else:
+            sizes = list(self.ring_size)
+            pass
+        for start, size in zip(np.cumsum([0] + sizes[:-1]), sizes):
+            re = self._build(self.flag[start:start + size])
+            segment_start.append(re[0] + start)
+            segment_length.append(re[1])
+            segment_run.append(re[2])
+            num_tail.append(re[3])
+            num_body.append(re[4])
+            mode_tail.append(re[5])
+            pass
+        self.segment_start = np.concatenate(segment_start)  # 各车段首车下标
+        self.segment_length = np.concatenate(segment_length)  # 各车段车辆数
+        self.segment_run = np.concatenate(segment_run)  # 自身及前方同段的车辆数，上限为max_search_index
+        self.num_tail = np.concatenate(num_tail)
+        self.num_body = np.concatenate(num_body)
+        self.valid = (self.num_body > 0) & (self.num_tail + self.num_body < self.max_search_index)
+        self.mode_tail = self.valid & np.concatenate(mode_tail)
+        pass
+
+    def _build(self, flag: np.ndarray) -> tuple:
+        num = len(flag)
+        k = self.max_search_index
+        rows = np.arange(num)
+
+        start = np.flatnonzero(flag != np.roll(flag, 1))
+        if len(start):
+            length = np.diff(np.append(start, start[0] + num))
+            # 首个车段之前的车辆属于跨越环形末端的最后一个车段
+            segment = np.searchsorted(start, rows, side='right') - 1
+            end = start[segment] + length[segment]
+            run = np.minimum(end - np.where(segment < 0, rows + num, rows), k)
+        else:
+            start = np.zeros(1, dtype=np.int64)
+            length = np.array([num])
+            run = np.full(num, k)
+            pass
+
+        # tail为前车起连续的同类车，body为其后连续的非同类车，head为body之后的第一辆同类车
+        first = (rows + 1) % num
+        num_tail = np.where(flag[first], run[first], 0)
+        first = (rows + 1 + num_tail) % num
+        num_body = np.where(flag[first], 0, np.minimum(run[first], k - num_tail))
+        # 后车同为同类车时按tail方式修正期望车头时距，否则按head方式修正间距与差值
+        mode_tail = flag[(rows - 1) % num]
+        return start, length, run, num_tail, num_body, mode_tail
+
+
+class LinkedPlatoonIndex(PlatoonIndex):
+    """
+    按前后车关系建立的车队（platoon）索引
+    车辆排列与前后车关系无关时（如多车道、开放道路）使用：沿前车链逐车查找至多max_search_index辆前车，
+    各车的head/body/tail数量与按前车链逐车搜索的IntelligentDrivingCarModel._run一致，前后车关系改变后重建
+    """
+
+    def __init__(self, flag: np.ndarray, leader: np.ndarray, follower: np.ndarray, max_search_index: int):
+        """
+        构造函数
+        :param flag: 同类车标记数组，按车辆下标排列
+        :param leader: 前车下标数组，前方无车的车辆以自身为前车
+        :param follower: 后车下标数组，后方无车的车辆以自身为后车
+        :param max_search_index: 最大搜索车辆数，int类型，与IntelligentDrivingCarModel一致
+        """
+        self.leader = np.asarray(leader)
+        self.follower = np.asarray(follower)
+        super().__init__(flag, max_search_index)
+
+    def rebuild(self) -> None:
+        """
+        沿前车链重建各车的head/body/tail数量，前后车关系改变后调用
+        """
+        k = self.max_search_index
+        # chain[:, j]为第j辆前车，第0辆为自身
+        chain = np.empty((len(self.flag), k + 1), dtype=np.int64)
+        chain[:, 0] = np.arange(len(self.flag))
+        for j in range(k):
+            chain[:, j + 1] = self.leader[chain[:, j]]
+            pass
+        flag = self.flag[chain]
+        # tail为前车起连续的同类车，body为其后连续的非同类车，各列之后不足k辆时按k截断
+        self.num_tail = np.argmin(np.append(flag[:, 1:], np.zeros((len(flag), 1), dtype=bool), axis=1), axis=1)
+        rest = np.arange(k + 1) > self.num_tail[:, None]
+        body = np.append(~flag[:, 1:] | ~rest[:, 1:], np.zeros((len(flag), 1), dtype=bool), axis=1)
+        self.num_body = np.argmin(body, axis=1) - self.num_tail
+        self.valid = (self.num_body > 0) & (self.num_tail + self.num_body < k)
+        # 后车同为同类车时按tail方式修正期望车头时距，否则按head方式修正间距与差值
+        self.mode_tail = self.valid & self.flag[self.follower]
+        pass
+
+    pass
@@ -0,0 +1,569 @@
+import abc
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+
+LIST_SAMPLE_COLUMN = ['sub_index', 'time', 'id', 'type', 'pos', 'v', 'a', 'dl', 'dv', 'da', 'hw']  # 采样数据的列
+SET_OUTPUT_FORMAT = {"columnar", "csv"}  # 采样数据输出格式，见ColumnarSink与CsvSink
+
+COLUMNAR_FORMAT = "ots-columnar"  # 列式目录header.json中的格式名
+COLUMNAR_VERSION = 2  # 版本2起静态字段写入车辆表vehicles.csv
+NPY_HEADER_LENGTH = 128  # 列文件的.npy头部长度，单位B，采样数增加后头部原位改写
+
+
+class RecordSink(metaclass=abc.ABCMeta):
+    """
+    采样数据输出接口类
+    记录器的后台线程按采样顺序把写满的块交给write，块的形状为[采样数, 车辆数, 列数]。
+    tell给出当前写入位置，保存在检查点中，open时给出该位置则截断此后的内容并从该位置继续写入
+    """
+
+    @abc.abstractmethod
+    def open(self, position: dict = None) -> None:
+        """
+        打开输出，必须重载
+        :param position: 写入位置，dict类型，为tell的返回值，为None时从头写入
+        """
+
+    @abc.abstractmethod
+    def write(self, chunk: np.ndarray) -> None:
+        """
+        写入一块采样数据，必须重载，chunk在返回后会被记录器复用，不能保留引用
+        :param chunk: 采样数据，numpy数组，形状为[采样数, 车辆数, 列数]
+        """
+
+    @abc.abstractmethod
+    def tell(self) -> dict:
+        """
+        当前写入位置，必须重载
+        :return: dict类型，值为numpy数组或标量
+        """
+
+    def close(self) -> None:
+        pass
+
+    pass
+
+
+def vehicle_table(fleet) -> pd.DataFrame:
+    """
+    车队的车辆表，每辆车一行，行号即车辆下标vehicle，与采样中车辆的排列顺序一致
+    包括采样中不随时间变化的sub_index、id、type，以及原型名称、跟驰模型、尺寸与参数，记录时只写入一次
+    :param fleet: 车队，类型为Fleet或其子类，车辆的排列与身份在记录期间不变
+    :return: DataFrame类型，id为int64
+    """
+    types = fleet.types
+    p = np.asarray(fleet.prototype_index)
+    re = pd.DataFrame({
+        'vehicle': np.arange(len(p), dtype=np.int64),
+        'sub_index': np.asarray(fleet._index).astype(np.int64),
+        'id': np.array([c.id for c in fleet.cars], dtype=np.int64),
+        'type': types.car_type[p].astype(np.int64),
+        'name': [types.prototypes[i].name for i in p.tolist()],
+        'model': [type(types.following_model[i]).__name__ for i in p.tolist()],
+        'length': types.car_size[p, 0],
+        'width': types.car_size[p, 1],
+        'expecting_headway': types.expecting_headway[p],
+        'min_acceleration': types.limiting_acceleration[p, 0],
+        'max_acceleration': types.limiting_acceleration[p, 1],
+        'min_speed': types.limiting_speed[p, 0],
+        'max_speed': types.limiting_speed[p, 1],
+        'stopping_distance': types.stopping_distance[p],
+        'observation_error': types.observation_error[p],
+        'operation_error': types.operation_error[p],
+        'response_time_delay': types.response_time_delay[p]})
+    return re.set_index('vehicle')
+
+
+def read_vehicle_table(path: str) -> pd.DataFrame:
+    """
+    读取vehicle_table写入的车辆表CSV文件
+    :param path: 文件路径，str类型
+    :return: DataFrame类型，索引为车辆下标vehicle
+    """
+    return pd.read_csv(path, sep=',', header=0, index_col=0, dtype={'id': np.int64},
+                       float_precision='round_trip')
+
+
+def csv_vehicles_path(path: str) -> str:
+    """
+    CSV采样数据文件对应的车辆表路径，data_*.csv对应同目录下的vehicles_*.csv
+    :param path: 采样数据文件路径，str类型
+    :return: 车辆表路径，str类型
+    """
+    d, name = os.path.split(path)
+    if name[:5] == 'data_':
+        return os.path.join(d, 'vehicles_' + name[5:])
+    return os.path.join(d, os.path.splitext(name)[0] + '_vehicles.csv')
+
+
+class CsvSink(RecordSink):
+    """
+    CSV文件输出，格式与DataFrame.to_csv一致，首列为行号index，每个采样的每辆车为一行
+    给出车辆表时，车辆表写入csv_vehicles_path给出的文件，采样行以车辆下标vehicle代替车辆表中的列
+    """
+
+    def __init__(self, path: str, columns: list = None, vehicles: pd.DataFrame = None):
+        """
+        构造函数
+        :param path: 文件路径，str类型
+        :param columns: 采样数据的列名列表，默认为LIST_SAMPLE_COLUMN
+        :param vehicles: 车辆表，可选，见vehicle_table，与车辆表同名的列不再逐行写入
+        """
+        self.path = path
+        self.columns = LIST_SAMPLE_COLUMN if columns is None else columns
+        self.vehicles = vehicles
+        # 逐行写入的列在采样数据中的位置
+        self._fields = [i for i, c in enumerate(self.columns) if vehicles is None or c not in vehicles.columns]
+        self.file = None
+        self.count = 0  # 已写入的采样数
+        self.rows = 0  # 已写入的行数
+        pass
+
+    def open(self, position: dict = None) -> None:
+        if self.vehicles is not None:
+            self.vehicles.to_csv(csv_vehicles_path(self.path), sep=',')
+            pass
+        if position is None:
+            self.file = open(self.path, 'wb')
+            self.count = self.rows = 0
+        else:
+            self.file = open(self.path, 'r+b')
+            self.file.seek(int(position['offset']))
+            self.file.truncate()
+            self.count = int(position['count'])
+            self.rows = int(position['rows'])
+            pass
+        pass
+
+    def write(self, chunk: np.ndarray) -> None:
+        num = chunk.shape[0] * chunk.shape[1]
+        data = pd.DataFrame(chunk[:, :, self._fields].reshape(num, -1), columns=[self.columns[i] for i in self._fields],
+                            dtype='double', index=pd.RangeIndex(self.rows, self.rows + num, name='index'))
+        if self.vehicles is not None:
+            data.insert(0, 'vehicle', np.tile(np.arange(chunk.shape[1], dtype=np.int64), chunk.shape[0]))
+            pass
+        self.file.write(data.to_csv(sep=',', header=self.rows == 0).encode())
+        self.count += chunk.shape[0]
+        self.rows += num
+        pass
+
+    def tell(self) -> dict:
+        self.file.flush()
+        return {'count': self.count, 'rows': self.rows, 'offset': self.file.tell()}
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            pass
+        pass
+
+    pass
+
+
+def _npy_header(shape: tuple, dtype) -> bytes:
+    # 版本1.0的.npy头部，补齐到NPY_HEADER_LENGTH，与numpy.lib.format写入的头部等价
+    header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                                      tuple(shape))
+    header = header.ljust(NPY_HEADER_LENGTH - 10 - 1) + '\n'
+    return np.lib.format.MAGIC_PREFIX + bytes([1, 0]) + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+class ColumnarSink(RecordSink):
+    """
+    列式目录输出
+    目录下每列一个.npy文件，形状为[采样数, 车辆数]，第二维即车辆下标，可用numpy.load(..., mmap_mode='r')读取；
+    header.json记录格式、列名、数据类型、采样数、车辆数及附加信息。给出车辆表时写入vehicles.csv，
+    与车辆表同名的列不再逐个采样写入。
+    各列按块追加写入，tell与close时改写.npy头部与header.json中的采样数，读取见TrajectoryReader
+    """
+
+    def __init__(self, path: str, columns: list = None, dtype=np.float64, meta: dict = None,
+                 vehicles: pd.DataFrame = None):
+        """
+        构造函数
+        :param path: 目录路径，str类型
+        :param columns: 采样数据的列名列表，默认为LIST_SAMPLE_COLUMN
+        :param dtype: 各列的数据类型，默认为float64
+        :param meta: 附加信息，dict类型，值可以写入JSON，例如车流密度、渗透率、步长
+        :param vehicles: 车辆表，可选，见vehicle_table
+        """
+        self.path = path
+        self.vehicles = vehicles
+        columns = LIST_SAMPLE_COLUMN if columns is None else columns
+        # 写入的列及其在采样数据中的位置
+        self._fields = [i for i, c in enumerate(columns) if vehicles is None or c not in vehicles.columns]
+        self.columns = [columns[i] for i in self._fields]
+        self.dtype = np.dtype(dtype)
+        self.meta = {} if meta is None else meta
+        self.files = []
+        self.count = 0  # 已写入的采样数
+        self.num_rows = 0 if vehicles is None else len(vehicles)  # 每个采样的行数（车辆数），首次写入时确定
+        pass
+
+    def open(self, position: dict = None) -> None:
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+            pass
+        if self.vehicles is not None:
+            self.vehicles.to_csv(os.path.join(self.path, 'vehicles.csv'), sep=',')
+            pass
+        self.count = 0 if position is None else int(position['count'])
+        self.num_rows = self.num_rows if position is None else int(position['rows'])
+        self.files = []
+        for c in self.columns:
+            if position is None:
+                f = open(os.path.join(self.path, c + '.npy'), 'wb')
+                f.write(_npy_header((0, self.num_rows), self.dtype))
+            else:
+                f = open(os.path.join(self.path, c + '.npy'), 'r+b')
+                f.seek(NPY_HEADER_LENGTH + self.count * self.num_rows * self.dtype.itemsize)
+                f.truncate()
+                pass
+            self.files.append(f)
+            pass
+        self._write_header()
+        pass
+
+    def write(self, chunk: np.ndarray) -> None:
+        self.num_rows = chunk.shape[1]
+        for i, f in zip(self._fields, self.files):
+            f.write(np.ascontiguousarray(chunk[:, :, i], dtype=self.dtype))
+            pass
+        self.count += chunk.shape[0]
+        pass
+
+    def _write_header(self) -> None:
+        # 改写各列的.npy头部与header.json，此前写入的采样即可读取
+        for f in self.files:
+            f.seek(0)
+            f.write(_npy_header((self.count, self.num_rows), self.dtype))
+            f.seek(0, os.SEEK_END)
+            f.flush()
+            pass
+        header = {'format': COLUMNAR_FORMAT, 'version': COLUMNAR_VERSION, 'columns': self.columns,
+                  'dtype': self.dtype.str, 'num_samples': self.count, 'num_vehicles': self.num_rows,
+                  'vehicles': None if self.vehicles is None else 'vehicles.csv'}
+        header.update(self.meta)
+        with open(os.path.join(self.path, 'header.json'), 'w') as f:
+            json.dump(header, f, indent=1)
+            pass
+        pass
+
+    def tell(self) -> dict:
+        self._write_header()
+        return {'count': self.count, 'rows': self.num_rows}
+
+    def close(self) -> None:
+        if self.files:
+            self._write_header()
+            for f in self.files:
+                f.close()
+                pass
+            self.files = []
+            pass
+        pass
+
+    pass
+
+
+class TrajectoryReader:
+    """
+    采样数据读取
+    列式目录（见ColumnarSink）按内存映射读取，只有实际访问的时间窗与车辆从磁盘读入；
+    CSV文件（见CsvSink）在打开时整体解析一次，此后的接口相同。
+    每列为形状[采样数, 车辆数]的数组，时间窗按采样时间选取(start, end]。
+    有车辆表时，车辆表中的sub_index、id、type等列按车辆下标展开为同样形状的只读数组，与逐采样写入时的读取方式相同
+    """
+
+    def __init__(self, path: str):
+        """
+        构造函数
+        :param path: 列式目录或CSV文件路径，str类型
+        """
+        self.path = path
+        self.vehicles = None  # 车辆表，DataFrame类型，见vehicle_table，旧格式的采样数据为None
+        if os.path.isdir(path):
+            with open(os.path.join(path, 'header.json')) as f:
+                self.header = json.load(f)
+                pass
+            if self.header.get('format') != COLUMNAR_FORMAT:
+                raise ValueError("%s is not a %s directory" % (path, COLUMNAR_FORMAT))
+            if self.header['version'] > COLUMNAR_VERSION:
+                raise ValueError("%s version %d is not supported" % (COLUMNAR_FORMAT, self.header['version']))
+            if self.header.get('vehicles'):
+                self.vehicles = read_vehicle_table(os.path.join(path, self.header['vehicles']))
+                pass
+            self._data = {c: np.load(os.path.join(path, c + '.npy'),
+                                     mmap_mode='r' if self.header['num_samples'] else None)
+                          for c in self.header['columns']}
+        else:
+            data = pd.read_csv(path, sep=',', header=0, index_col=0, dtype=np.float64,
+                               float_precision='round_trip')
+            if 'vehicle' in data.columns:
+                self.vehicles = read_vehicle_table(csv_vehicles_path(path))
+                num_rows = len(self.vehicles)
+                data = data.drop(columns='vehicle')
+            else:
+                num_rows = int((data['time'] == data['time'].iloc[0]).sum()) if len(data) else 0
+                pass
+            self.header = {'num_samples': len(data) // max(num_rows, 1), 'num_vehicles': num_rows}
+            self._data = {c: data[c].to_numpy().reshape(-1, num_rows) for c in data.columns}
+            pass
+        self.num_samples = self.header['num_samples']
+        self.num_vehicles = self.header['num_vehicles']
+        # 可读取的列，车辆表中的静态列按LIST_SAMPLE_COLUMN的顺序并入
+        self.columns = [c for c in LIST_SAMPLE_COLUMN if c in self._data or self._static(c)]
+        self.columns += [c for c in self._data if c not in self.columns]
+        pass
+
+    def _static(self, column: str) -> bool:
+        return self.vehicles is not None and column in self.vehicles.columns and column not in self._data
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        """
+        整列数据
+        :param column: 列名，str类型，见columns，也可以是车辆表中的其他列
+        :return: 形状为[采样数, 车辆数]的数组，列式目录为只读内存映射，车辆表中的列为只读的展开视图
+        """
+        if self._static(column):
+            return np.broadcast_to(self.vehicles[column].to_numpy(), (self.num_samples, self.num_vehicles))
+        return self._data[column]
+
+    @property
+    def time(self) -> np.ndarray:
+        """
+        各采样的时间，单位s
+        """
+        return np.asarray(self._data['time'][:, 0])
+
+    def window(self, start: float = None, end: float = None) -> slice:
+        """
+        时间窗(start, end]内的采样序号
+        :param start: 开始时间，float类型，单位s，为None时从第一个采样开始
+        :param end: 结束时间，float类型，单位s，为None时到最后一个采样
+        :return: slice类型
+        """
+        t = self.time
+        return slice(0 if start is None else int(np.searchsorted(t, start, side='right')),
+                     len(t) if end is None else int(np.searchsorted(t, end, side='right')))
+
+    def select(self, column: str, start: float = None, end: float = None, vehicles=None) -> np.ndarray:
+        """
+        按时间窗与车辆选取一列
+        :param column: 列名，str类型
+        :param start: 开始时间，见window
+        :param end: 结束时间，见window
+        :param vehicles: 车辆下标，int、slice或下标数组，为None时选取全部车辆
+        :return: 形状为[时间窗内采样数, 车辆数]的数组
+        """
+        re = self[column][self.window(start, end)]
+        if vehicles is not None:
+            re = re[:, vehicles]
+            pass
+        return re
+
+    def to_dataframe(self, start: float = None, end: float = None, vehicles=None) -> pd.DataFrame:
+        """
+        按时间窗与车辆选取全部列，排列与不带车辆表的CSV文件相同，每个采样的每辆车为一行
+        :return: DataFrame类型
+        """
+        data = {c: np.asarray(self.select(c, start, end, vehicles)) for c in self.columns}
+        re = pd.DataFrame({c: v.reshape(-1) for c, v in data.items()}, columns=self.columns, dtype='double')
+        re.index.name = 'index'
+        return re
+
+    def to_csv(self, path: str, chunk_size: int = 256) -> None:
+        """
+        导出为CSV文件，有车辆表时同时导出车辆表，格式与CsvSink相同，按块转换，内存占用与采样数无关
+        :param path: CSV文件路径，str类型
+        :param chunk_size: 每次转换的采样数，int类型
+        """
+        sink = CsvSink(path, self.columns, self.vehicles)
+        sink.open()
+        try:
+            for i in range(0, self.num_samples, chunk_size):
+                sink.write(np.stack([self[c][i:i + chunk_size] for c in self.columns], axis=-1))
+                pass
+        finally:
+            sink.close()
+            pass
+        pass
+
+    pass
+
+
+class ChunkRecorder:
+    """
+    分块采样记录器
+    预先分配num_buffers个形状为[chunk_size, 车辆数, 列数]的块，车队采样直接写入当前块，
+    写满的块交给后台线程依次写入各输出，写完后回收复用。内存占用固定为num_buffers个块，与仿真时长无关；
+    各块均在写入中时推进等待后台线程
+    """
+
+    def __init__(self, sinks: list, num_rows: int, chunk_size: int = 256, num_buffers: int = 2, columns: int = 11,
+                 position: dict = None):
+        """
+        构造函数
+        :param sinks: 输出列表，元素类型为RecordSink
+        :param num_rows: 每个采样的行数（车辆数），int类型
+        :param chunk_size: 每块的采样数，int类型
+        :param num_buffers: 块数，int类型，不小于2时推进与写入重叠
+        :param columns: 列数，int类型
+        :param position: 写入位置，dict类型，为tell的返回值，从检查点继续时给出
+        """
+        self.sinks = sinks
+        self.chunk_size = chunk_size
+        for i, sink in enumerate(sinks):
+            sink.open(None if position is None else
+                      {k[len('%d_' % i):]: v for k, v in position.items() if k.startswith('%d_' % i)})
+            pass
+        self.nbytes = num_buffers * chunk_size * num_rows * columns * 8  # 块占用的内存，单位B
+        self._free = queue.Queue()
+        for _ in range(num_buffers):
+            self._free.put(np.empty((chunk_size, num_rows, columns)))
+            pass
+        self._full = queue.Queue()
+        self._error = None
+        self._current = self._free.get()
+        self._fill = 0
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+        pass
+
+    def _flush_loop(self) -> None:
+        while True:
+            item = self._full.get()
+            if item is None:
+                self._full.task_done()
+                break
+            buffer, n = item
+            if self._error is None:
+                try:
+                    for sink in self.sinks:
+                        sink.write(buffer[:n])
+                        pass
+                except BaseException as e:
+                    self._error = e
+                    pass
+                pass
+            self._free.put(buffer)
+            self._full.task_done()
+            pass
+        pass
+
+    def _check(self) -> None:
+        if self._error is not None:
+            raise self._error
+        pass
+
+    def _submit(self) -> None:
+        # 当前块交给后台线程，取下一空闲块
+        self._check()
+        self._full.put((self._current, self._fill))
+        self._current = self._free.get()
+        self._fill = 0
+        pass
+
+    def block(self, n: int) -> np.ndarray:
+        """
+        当前块中可写入的采样缓冲，写入后调用commit
+        :param n: 需要的采样数，int类型
+        :return: numpy数组，形状为[min(n, 当前块剩余采样数), 车辆数, 列数]
+        """
+        return self._current[self._fill:self._fill + min(n, self.chunk_size - self._fill)]
+
+    def commit(self, n: int) -> None:
+        """
+        确认已写入block返回的前n个采样，块写满时交给后台线程
+        :param n: 采样数，int类型
+        """
+        self._fill += n
+        if self._fill == self.chunk_size:
+            self._submit()
+            pass
+        pass
+
+    def append(self, sample: np.ndarray) -> None:
+        """
+        写入一个采样
+        :param sample: 采样数据，numpy数组，形状为[车辆数, 列数]
+        """
+        self.block(1)[0] = sample
+        self.commit(1)
+        pass
+
+    def advance(self, fleet, n_steps: int, step: float, record_every: int = 1, hook=None,
+                index: np.ndarray = None) -> None:
+        """
+        推进车队，每record_every步采样一次，采样直接写入块中，参数见Fleet.advance
+        :param hook: 采样回调，可选，每次采样后调用hook(fleet, k)，k为本次推进中的采样序号
+        """
+        num_sample = n_steps // record_every if record_every else 0
+        k = 0
+        while k < num_sample:
+            out = self.block(num_sample - k)
+            fleet.advance(len(out) * record_every, step, record_every, out=out, index=index,
+                          hook=None if hook is None else lambda f, j, k=k: hook(f, k + j))
+            k += len(out)
+            self.commit(len(out))
+            pass
+        if n_steps > num_sample * record_every:
+            fleet.advance(n_steps - num_sample * record_every, step, 0)
+            pass
+        pass
+
+    def flush(self) -> None:
+        """
+        写出当前块中已有的采样，并等待后台线程写完全部块
+        """
+        if self._fill:
+            self._submit()
+            pass
+        self._full.join()
+        self._check()
+        pass
+
+    def tell(self) -> dict:
+        """
+        写出全部采样后的写入位置，保存在检查点中，从检查点继续时作为position传入
+        :return: dict类型，键为“输出序号_位置名”
+        """
+        self.flush()
+        re = {}
+        for i, sink in enumerate(self.sinks):
+            re.update({'%d_%s' % (i, k): v for k, v in sink.tell().items()})
+            pass
+        return re
+
+    def close(self) -> None:
+        """
+        写出全部采样，结束后台线程并关闭各输出
+        """
+        if self._thread is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._full.put(None)
+            self._thread.join()
+            self._thread = None
+            for sink in self.sinks:
+                sink.close()
+                pass
+            pass
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        pass
+
+    pass
@@ -0,0 +1,338 @@
+from engine import *
+from platoon import LinkedPlatoonIndex
+from road.lane_change import MOBIL
+
+
+class LaneIndex:
+    """
+    车道索引
+    每条车道的车辆按道路位置排序，依次保存在order中，第l条车道占用order[lane_start[l]:lane_start[l + 1]]。
+    同一车道内车辆的环形顺序在跟驰过程中不变，推进后只需按越过道路终点的车辆旋转；
+    换道时只删除与插入换道车辆，不重新排序；相邻车道的前后车由二分查找给出
+    """
+
+    def __init__(self, lane: np.ndarray, position: np.ndarray, num_lanes: int, road_length: float):
+        """
+        构造函数
+        :param lane: 每辆车所在的车道数组，编号从0开始
+        :param position: 每辆车的道路位置数组，范围[0, road_length)，单位m
+        :param num_lanes: 车道数，int类型
+        :param road_length: 道路长度，float类型，单位m
+        """
+        self.lane = np.array(lane, dtype=np.int64)
+        self.num_lanes = num_lanes
+        self.road_length = road_length
+        self.rebuild(position)
+
+    def rebuild(self, position: np.ndarray) -> None:
+        """
+        按车道与位置完全重新排序
+        :param position: 每辆车的道路位置数组，单位m
+        """
+        self.order = np.lexsort((position, self.lane))
+        self._count()
+        pass
+
+    def _count(self) -> None:
+        size = np.bincount(self.lane, minlength=self.num_lanes)
+        self.lane_start = np.concatenate(([0], np.cumsum(size)))  # 各车道在order中的起始位置，末尾为车辆数
+        pass
+
+    def _key(self, lane: np.ndarray, position: np.ndarray) -> np.ndarray:
+        # 车道与位置合并为一个键，order按此键全局有序
+        return lane * self.road_length + position
+
+    def update(self, position: np.ndarray) -> None:
+        """
+        推进后更新排序：每条车道按位置最小的车辆旋转，车道内顺序改变（发生超越）时该车道重新排序
+        :param position: 每辆车的道路位置数组，单位m
+        """
+        for start, end in zip(self.lane_start[:-1].tolist(), self.lane_start[1:].tolist()):
+            if end - start < 2:
+                continue
+            segment = self.order[start:end]
+            p = position[segment]
+            first = int(np.argmin(p))
+            if first:
+                segment[:] = np.roll(segment, -first)
+                p = np.roll(p, -first)
+                pass
+            if np.any(p[1:] < p[:-1]):
+                segment[:] = segment[np.argsort(p, kind='stable')]
+                pass
+            pass
+        pass
+
+    def neighbours(self, lane: np.ndarray, query: np.ndarray, position: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        查询给定车道中位于给定位置前后的车辆，位置相同时已有车辆视为后车
+        :param lane: 目标车道数组
+        :param query: 查询位置数组，单位m
+        :param position: 每辆车的道路位置数组，单位m
+        :return: (前车下标数组, 后车下标数组)，目标车道无车时为-1
+        """
+        k = np.searchsorted(self._key(self.lane[self.order], position[self.order]), self._key(lane, query),
+                            side='right')
+        start = self.lane_start[lane]
+        end = self.lane_start[lane + 1]
+        empty = start == end
+        # 越过道路终点时前车为车道首车，后车为车道末车
+        leader = np.where(k < end, k, start)
+        follower = np.where(k > start, k, end) - 1
+        leader = np.where(empty, -1, self.order[np.minimum(leader, len(self.order) - 1)])
+        follower = np.where(empty, -1, self.order[np.maximum(follower, 0)])
+        return leader, follower
+
+    def move(self, index: np.ndarray, lane: np.ndarray, position: np.ndarray) -> None:
+        """
+        换道：从原车道删除车辆并按位置插入目标车道，其余车辆的顺序不变
+        :param index: 换道车辆下标数组，车辆互不相同
+        :param lane: 各车辆的目标车道数组
+        :param position: 每辆车的道路位置数组，单位m
+        """
+        rank = np.empty(len(self.order), dtype=np.int64)
+        rank[self.order] = np.arange(len(self.order))
+        rest = np.delete(self.order, rank[index])
+        self.lane[index] = lane
+        key = self._key(lane, position[index])
+        sort = np.argsort(key, kind='stable')
+        k = np.searchsorted(self._key(self.lane[rest], position[rest]), key[sort], side='right')
+        self.order = np.insert(rest, k, index[sort])
+        self._count()
+        pass
+
+    def links(self) -> (np.ndarray, np.ndarray):
+        """
+        车道内的前后车关系，车道内末车的前车为车道首车，车道内只有一辆车时前后车均为自身
+        :return: (前车下标数组, 后车下标数组)
+        """
+        num = len(self.order)
+        start = self.lane_start[self.lane[self.order]]
+        end = self.lane_start[self.lane[self.order] + 1]
+        rows = np.arange(num)
+        leader = np.empty(num, dtype=np.int64)
+        follower = np.empty(num, dtype=np.int64)
+        leader[self.order] = self.order[np.where(rows + 1 < end, rows + 1, start)]
+        follower[self.order] = self.order[np.where(rows > start, rows, end) - 1]
+        return leader, follower
+
+
+class MultiLaneFleet(ArrayFleet):
+    """
+    多车道车队
+    多条并行车道组成的环形道路，车辆在车道内跟驰，每隔lane_change_interval按换道模型（LaneChangeModel）批量换道。
+    车道内的前后车关系由LaneIndex给出，换道后更新leader、follower与location_correction，
+    两次换道之间的推进与ArrayFleet相同，python与numba引擎均可使用。
+    每次换道只向同一方向（奇偶次交替向编号较大、较小的车道），多辆车换入同一位置时只保留激励最大者。
+    IntelligentDrivingCarModel的车队索引沿车道内的前车链建立，换道后重建
+    """
+
+    ring_name = 'road'
+
+    def __init__(self,
+                 car_num: int,
+                 init_type_car: str,
+                 proportion: Dict,
+                 road_length: float,
+                 init_type_loc: str,
+                 num_lanes: int = 2,
+                 lane_change_model: LaneChangeModel = None,
+                 lane_change_interval: float = 1,
+                 engine: str = "python",
+                 parallel: bool = False,
+                 seed: int = None,
+                 integrator="ballistic",
+                 dtype=np.float64):
+        """
+        构造函数
+        车辆按初始位置方式排列在一条车道的长度上，第i辆车位于第i % num_lanes条车道
+        :param car_num: 车辆数，int类型，为全部车道的车辆总数
+        :param init_type_car: 车辆排列方式，str类型，见SET_INIT_CARS_TYPE
+        :param proportion: 车辆比例，dict类型，例如{HDC: 0.6, IDC_CACC: 0.4}
+        :param road_length: 道路长度，float类型，单位m
+        :param init_type_loc: 初始位置方式，str类型，见SET_INIT_LOC_TYPE
+        :param num_lanes: 车道数，int类型
+        :param lane_change_model: 换道模型，类型为LaneChangeModel，默认为MOBIL()
+        :param lane_change_interval: 换道决策间隔，float类型，单位s
+        :param engine: 计算引擎，str类型，见SET_ENGINE_TYPE
+        :param parallel: 编译内核是否按车辆并行(prange)
+        :param seed: 观测误差与操作误差的随机数种子，int类型
+        :param integrator: 积分器，str类型，见integrator.DICT_INTEGRATOR，或Integrator实例
+        :param dtype: 速度、加速度等状态数组的数据类型，见ArrayFleet
+        """
+        self.num_lanes = num_lanes
+        self.lane_change_model = MOBIL() if lane_change_model is None else lane_change_model
+        self.lane_change_interval = lane_change_interval
+        super().__init__(car_num, init_type_car, proportion, road_length, init_type_loc, engine=engine,
+                         parallel=parallel, seed=seed, integrator=integrator, dtype=dtype)
+
+    def _init_arrays(self) -> None:
+        super()._init_arrays()
+        self.lanes = LaneIndex(np.arange(len(self.cars)) % self.num_lanes, self.real_position, self.num_lanes,
+                               self.road_length)
+        self._lane_change_countdown = 0  # 距下次换道决策的步数
+        self._lane_change_pass = 0  # 已进行的换道决策次数，决定换道方向
+        self._link()
+        self._count_difference()
+        pass
+
+    @property
+    def lane(self) -> np.ndarray:
+        """
+        每辆车所在的车道数组
+        """
+        return self.lanes.lane
+
+    def _link(self) -> None:
+        # 按车道索引更新前后车，位置修正使前车的修正后位置位于本车前方一个道路长度以内
+        self.leader, self.follower = self.lanes.links()
+        x = self.real_location - self.real_location[self.leader]
+        self.location_correction = self._road_length * (np.floor(x / self._road_length) + 1)
+        self._platoon_index = {}
+        pass
+
+    def get_platoon_index(self, model_type: type, max_search_index: int) -> PlatoonIndex:
+        # 车道内的前后车与车辆下标无关，沿前车链建立索引，换道后由_link清空
+        key = (model_type, max_search_index)
+        if key not in self._platoon_index:
+            self._platoon_index[key] = LinkedPlatoonIndex(self.get_model_mask(model_type), self.leader, self.follower,
+                                                          max_search_index)
+            pass
+        return self._platoon_index[key]
+
+    def get_gap(self, index: np.ndarray, leader: np.ndarray) -> np.ndarray:
+        """
+        假设前车为leader时车辆的车头车尾间隔，leader为自身时为独占车道的间隔
+        :param index: 车辆下标数组
+        :param leader: 前车下标数组
+        :return: 间隔数组，单位m
+        """
+        road_length = self._road_length[index]
+        x = np.mod(self.real_position[leader] - self.real_position[index], road_length)
+        return np.where(leader == index, road_length, x) - self.car_size[leader, 0]
+
+    def get_neighbours(self, index: np.ndarray, lane: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        车辆在给定车道中的前后车
+        :param index: 车辆下标数组
+        :param lane: 目标车道数组
+        :return: (前车下标数组, 后车下标数组)，目标车道无车时为-1
+        """
+        return self.lanes.neighbours(lane, self.real_position[index], self.real_position)
+
+    def expected_acceleration(self, index: np.ndarray, leader: np.ndarray) -> np.ndarray:
+        """
+        假设前车为leader时车辆的跟驰模型加速度，不含观测误差与操作误差，不做加速度限制，供换道模型比较换道前后的加速度
+        :param index: 车辆下标数组
+        :param leader: 前车下标数组，与index等长
+        :return: 加速度数组，单位m/s**2
+        """
+        re = np.empty(len(index))
+        groups = self.model_index[index]
+        for g in np.unique(groups).tolist():
+            mask = groups == g
+            re[mask] = self.models[g].batch(self._get_batch_with_leader(index[mask], leader[mask], self.models[g]))
+            pass
+        return re
+
+    def _get_batch_with_leader(self, index: np.ndarray, leader: np.ndarray, model: FollowingModel) -> CarBatch:
+        re = self.get_batch(index)
+        dx = self.get_gap(index, leader)
+        dv = self.real_speed[leader] - self.real_speed[index]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hw = -dx / dv
+            hw[hw < 0] = float("inf")
+            hw[dx < 0] = -float("inf")
+            stop = dv == 0
+            hw[stop] = float("inf") * dx[stop]
+        re.real_spacing = dx
+        re.real_speed_difference = dv
+        re.real_acceleration_difference = self.real_acceleration[leader] - self.real_acceleration[index]
+        re.real_headway = hw
+        re.preceding_speed = self.real_speed[leader]
+        re.preceding_acceleration = self.real_acceleration[leader]
+        re.preceding_limiting_acceleration = self.limiting_acceleration[leader]
+
+        # 观测误差全部为0，批量模型使用全0的噪声，不消耗随机数
+        re.observation_error = np.zeros(len(index))
+        re.noise_size = model.noise_size
+        re.noise = np.zeros(len(index) * (model.noise_size + 1))
+        re.noise_offset = np.arange(len(index)) * (model.noise_size + 1)
+        if not model.has_batch:
+            re.cars = [CarOverride(self.cars[i], preceding_car=self.cars[j], real_spacing=s, real_speed_difference=v,
+                                   real_acceleration_difference=a, real_headway=h, observation_error=0.0)
+                       for i, j, s, v, a, h in zip(index.tolist(), leader.tolist(), dx.tolist(), dv.tolist(),
+                                                   re.real_acceleration_difference.tolist(), hw.tolist())]
+            pass
+        return re
+
+    def update(self, step):
+        self._advance(1, step)
+        pass
+
+    def _advance(self, n_steps: int, step: float) -> None:
+        every = max(int(round(self.lane_change_interval / step)), 1)
+        done = 0
+        while done < n_steps:
+            if self._lane_change_countdown <= 0:
+                self.change_lanes()
+                self._lane_change_countdown = every
+                pass
+            chunk = min(self._lane_change_countdown, n_steps - done)
+            if self.engine == "python" and not isinstance(self.integrator, AdaptiveIntegrator):
+                # Fleet._advance逐步调用update，此处直接调用ArrayFleet.update，避免重复计数
+                for _ in range(chunk):
+                    super().update(step)
+                    pass
+            else:
+                super()._advance(chunk, step)
+            self._lane_change_countdown -= chunk
+            done += chunk
+            pass
+        pass
+
+    def change_lanes(self) -> int:
+        """
+        一次换道决策：全部可以向本次方向换道的车辆批量调用换道模型，激励大于0的车辆换道
+        :return: 换道车辆数，int类型
+        """
+        self.lanes.update(self.real_position)
+        direction = 1 if self._lane_change_pass % 2 == 0 else -1
+        self._lane_change_pass += 1
+        target = self.lane + direction
+        index = np.flatnonzero((target >= 0) & (target < self.num_lanes))
+        target = target[index]
+        if len(index):
+            incentive = self.lane_change_model(self, index, target)
+            change = incentive > 0
+            index, target, incentive = index[change], target[change], incentive[change]
+            pass
+        if len(index):
+            # 换入同一位置（目标车道的同一前车，空车道视为同一位置）的车辆只保留激励最大者
+            leader, _ = self.get_neighbours(index, target)
+            slot = target * (len(self.cars) + 1) + leader + 1
+            sort = np.lexsort((-incentive, slot))
+            keep = sort[np.concatenate(([True], slot[sort][1:] != slot[sort][:-1]))]
+            index, target = index[keep], target[keep]
+            self.lanes.move(index, target, self.real_position)
+            pass
+        self._link()
+        self._count_difference()
+        return len(index)
+
+    def get_cars_lane(self) -> List:
+        return self.lane.tolist()
+
+    def _get_state(self) -> dict:
+        state = super()._get_state()
+        state['lane'] = self.lane
+        state['lane_change_countdown'] = np.array(self._lane_change_countdown)
+        state['lane_change_pass'] = np.array(self._lane_change_pass)
+        return state
+
+    def _set_state(self, state: dict) -> None:
+        super()._set_state(state)
+        self.lanes = LaneIndex(state['lane'], self.real_position, self.num_lanes, self.road_length)
+        self._lane_change_countdown = state['lane_change_countdown'].item()
+        self._lane_change_pass = state['lane_change_pass'].item()
+        pass
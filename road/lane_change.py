@@ -0,0 +1,49 @@
+import numpy as np
+
+from std_interface import LaneChangeModel
+
+
+class MOBIL(LaneChangeModel):
+    """
+    MOBIL换道模型（Minimizing Overall Braking Induced by Lane changes）
+    安全条件：换道后目标车道后车的加速度不低于-b_safe，且与前后车均无重叠；
+    激励条件：本车加速度增益与politeness加权的新旧后车加速度增益之和大于threshold
+    """
+
+    def __init__(self, politeness: float = 0.2, threshold: float = 0.1, b_safe: float = 4, bias: float = 0):
+        """
+        构造函数
+        :param politeness: 礼让系数，float类型，0为只考虑本车
+        :param threshold: 换道阈值，float类型，单位m/s**2
+        :param b_safe: 目标车道后车的最大安全减速度，float类型，单位m/s**2
+        :param bias: 车道偏好，float类型，单位m/s**2，为正时向编号较小的车道换道更容易
+        """
+        self.politeness = politeness
+        self.threshold = threshold
+        self.b_safe = b_safe
+        self.bias = bias
+        pass
+
+    def _run(self, fleet, index: np.ndarray, target_lane: np.ndarray) -> np.ndarray:
+        leader_new, follower_new = fleet.get_neighbours(index, target_lane)
+        empty = leader_new < 0
+        # 目标车道无车时本车独占一条环形车道，前车为自身
+        leader_new = np.where(empty, index, leader_new)
+        follower_new = np.where(empty, index, follower_new)
+        leader_old = fleet.leader[index]
+        follower_old = fleet.follower[index]
+        alone = follower_old == index
+
+        acc = fleet.expected_acceleration
+        follower_new_acc = acc(follower_new, index)
+        gain = acc(index, leader_new) - acc(index, leader_old)
+        gain_new = np.where(empty, 0, follower_new_acc - acc(follower_new, leader_new))
+        gain_old = np.where(alone, 0, acc(follower_old, leader_old) - acc(follower_old, index))
+
+        safe = (fleet.get_gap(index, leader_new) > 0) & (empty | (fleet.get_gap(follower_new, index) > 0))
+        safe &= empty | (follower_new_acc >= -self.b_safe)
+        re = (gain + self.politeness * (gain_new + gain_old) - self.threshold
+              - self.bias * (target_lane - fleet.lane[index]))
+        return np.where(safe, re, -float('inf'))
+
+    pass
@@ -0,0 +1,743 @@
+import abc
+import collections
+import heapq
+import json
+
+from engine import *
+from platoon import LinkedPlatoonIndex
+from scheduler import NEVER, count_ticks
+
+FREE_ROAD_GAP = 1e4  # 前方无车时的虚拟间隔，单位m
+
+STEP_EPS = 1e-3  # 期望车头时距为0时的下限，单位s；事件时刻按步长换算时的相对容差
+
+
+class Inflow(metaclass=abc.ABCMeta):
+    """
+    入流生成器基类
+    依次生成车辆到达的时间间隔，到达车辆的类型按比例随机抽取
+    """
+
+    def __init__(self, proportion: Dict, speed: float = None, seed: int = None):
+        """
+        构造函数
+        :param proportion: 到达车辆的比例，dict类型，例如{HDC: 0.6, SDC_CACC: 0.4}
+        :param speed: 进入道路的速度，float类型，单位m/s，为None时为车辆的最大限制速度；
+                      均不超过入口前方第一辆车的速度，且按期望车头时距不超过间隔允许的速度
+        :param seed: 随机数种子，int类型
+        """
+        self.proportion = proportion
+        self.speed = speed
+        self.rng = np.random.default_rng(seed)
+        values = np.array(list(proportion.values()), dtype=np.float64)
+        self._p = values / values.sum()
+        self.next_time = self._headway()  # 下一辆车的到达时间，单位s
+
+    @abc.abstractmethod
+    def _headway(self) -> float:
+        """
+        到达间隔虚函数，必须重载。
+        每次调用给出下一辆车与上一辆车的到达时间间隔，随机性由self.rng产生，以便保存在车队快照中
+        :return: 到达间隔，float类型，单位s
+        """
+
+    def arrivals(self, time: float) -> List:
+        """
+        取出time之前到达的车辆
+        :param time: 当前时间，float类型，单位s
+        :return: 到达车辆的原型列表，类型为Car
+        """
+        re = []
+        cars = list(self.proportion.keys())
+        while self.next_time <= time:
+            re.append(cars[self.rng.choice(len(cars), p=self._p)])
+            self.next_time += self._headway()
+            pass
+        return re
+
+    def get_state(self) -> dict:
+        """
+        入流状态，保存在车队快照中
+        """
+        return {'next_time': np.array(self.next_time), 'rng': np.array(json.dumps(self.rng.bit_generator.state))}
+
+    def set_state(self, state: dict) -> None:
+        self.next_time = state['next_time'].item()
+        self.rng.bit_generator.state = json.loads(str(state['rng']))
+        pass
+
+    pass
+
+
+class PoissonInflow(Inflow):
+    """
+    泊松入流，到达间隔服从指数分布
+    """
+
+    def __init__(self, proportion: Dict, rate: float, speed: float = None, seed: int = None):
+        """
+        构造函数
+        :param rate: 到达率，float类型，单位veh/h
+        """
+        self.rate = rate
+        super().__init__(proportion, speed, seed)
+
+    def _headway(self) -> float:
+        return self.rng.exponential(3600 / self.rate)
+
+    pass
+
+
+class FixedHeadwayInflow(Inflow):
+    """
+    固定车头时距入流
+    """
+
+    def __init__(self, proportion: Dict, headway: float, speed: float = None, seed: int = None):
+        """
+        构造函数
+        :param headway: 到达间隔，float类型，单位s
+        """
+        self.headway = headway
+        super().__init__(proportion, speed, seed)
+
+    def _headway(self) -> float:
+        return self.headway
+
+    pass
+
+
+class RoadNetwork:
+    """
+    开放道路网络
+    由单车道路段组成，每个路段至多有一个下游路段，多个路段汇入同一下游路段即为合流（如匝道汇入主路），
+    没有下游路段的路段末端为出口（sink），入流（source）位于路段起点。
+    路段沿下游方向首尾相接，每个路段有一个全局坐标的起点，车辆位置为全局坐标，跨越路段时不需要修正。
+    合流前merge_zone范围内的车辆投影到下游路段，与下游路段及其他汇入路段的车辆统一排序跟驰。
+    汇入同一路段的路段中编号最小者为主路，其余路段（如匝道）让行：合流区内有可接受间隙时汇入，否则在路段末端停车等待
+    """
+
+    def __init__(self, merge_zone: float = 100):
+        """
+        构造函数
+        :param merge_zone: 合流区长度，float类型，单位m
+        """
+        self.merge_zone = merge_zone
+        self.length = []  # 各路段长度，单位m
+        self.downstream = []  # 各路段的下游路段，-1为出口
+        self.sources = []  # (路段, 入流)
+
+    def add_segment(self, length: float, downstream: int = -1) -> int:
+        """
+        添加路段，下游路段须先添加
+        :param length: 路段长度，float类型，单位m
+        :param downstream: 下游路段编号，int类型，-1表示末端为出口
+        :return: 路段编号，int类型
+        """
+        if downstream >= len(self.length):
+            raise ValueError("downstream segment %d does not exist" % downstream)
+        self.length.append(float(length))
+        self.downstream.append(int(downstream))
+        return len(self.length) - 1
+
+    def add_source(self, segment: int, inflow: Inflow) -> None:
+        """
+        在路段起点添加入流
+        :param segment: 路段编号，int类型
+        :param inflow: 入流，类型为Inflow
+        """
+        self.sources.append((segment, inflow))
+        pass
+
+    def build(self) -> None:
+        """
+        计算路段的全局坐标与合流关系，添加完路段后调用
+        """
+        num = len(self.length)
+        self.length = np.array(self.length, dtype=np.float64)
+        self.downstream = np.array(self.downstream, dtype=np.int64)
+        # 下游路段先添加，逆序即可由下游推算上游的起点
+        start = np.zeros(num)
+        for s in range(num - 1, -1, -1):
+            if self.downstream[s] >= 0:
+                start[s] = start[self.downstream[s]] - self.length[s]
+                pass
+            pass
+        self.start = start - start.min()  # 路段起点的全局坐标，单位m
+        self.end = self.start + self.length
+        feeders = np.bincount(self.downstream[self.downstream >= 0], minlength=num)
+        self.merging = (self.downstream >= 0) & (feeders[np.maximum(self.downstream, 0)] > 1)  # 是否汇入合流
+        # 汇入同一路段的路段中编号最小者为主路，其余为让行路段
+        self.priority = np.full(num, -1, dtype=np.int64)  # 各路段的主路上游路段
+        for s in range(num - 1, -1, -1):
+            if self.merging[s]:
+                self.priority[self.downstream[s]] = s
+                pass
+            pass
+        self.yielding = self.merging & (self.priority[np.maximum(self.downstream, 0)] != np.arange(num))
+        pass
+
+    def get_types(self) -> Dict:
+        """
+        全部入流的车辆原型，顺序为首次出现的顺序
+        """
+        re = {}
+        for _, inflow in self.sources:
+            for c in inflow.proportion:
+                re[c] = 1
+                pass
+            pass
+        return re
+
+    pass
+
+
+class OpenRoadFleet(ArrayFleet):
+    """
+    开放道路车队
+    车辆在RoadNetwork的路段上行驶，由入流进入、到达出口后离开。
+    车辆保存在容量固定的槽位池中，空闲槽位以空闲链表（free list）管理，进入与离开只写入槽位，不重新分配或重建状态数组。
+    空闲槽位的限制速度为0且永不决策，不参与跟驰；采样中空闲槽位除序号与时间外均为nan。
+    每隔network_interval检查出口与入流并按路段重建前车关系，其间的推进与ArrayFleet相同，python与numba引擎均可使用。
+    交通设施（见traffic_device）的状态变化按事件时刻排入堆中，推进在事件时刻分段，事件后只重建前车关系；
+    禁止通行的设施以停车线槽位作为前方第一辆能停下的车辆的前车，逐步推进时没有额外开销；
+    槽位顺序与道路顺序无关，IntelligentDrivingCarModel的车队索引沿前车链建立，重建前车关系后重建
+    """
+
+    ring_name = 'network'
+
+    def __init__(self,
+                 network: RoadNetwork,
+                 capacity: int,
+                 network_interval: float = 0.1,
+                 devices: List = (),
+                 engine: str = "python",
+                 parallel: bool = False,
+                 seed: int = None,
+                 integrator="ballistic",
+                 dtype=np.float64):
+        """
+        构造函数
+        :param network: 道路网络，类型为RoadNetwork，车辆原型为全部入流的原型
+        :param capacity: 槽位数，int类型，为同时在路上的车辆数上限，槽位用尽时到达车辆在入口排队
+        :param network_interval: 入流、出口与前车关系的更新间隔，float类型，单位s
+        :param devices: 交通设施列表，类型为TrafficDevice，例如信号灯
+        :param engine: 计算引擎，str类型，见SET_ENGINE_TYPE
+        :param parallel: 编译内核是否按车辆并行(prange)
+        :param seed: 观测误差与操作误差的随机数种子，int类型
+        :param integrator: 积分器，str类型，见integrator.DICT_INTEGRATOR，或Integrator实例
+        :param dtype: 速度、加速度等状态数组的数据类型，见ArrayFleet
+        """
+        network.build()
+        self.network = network
+        self.network_interval = network_interval
+        types = network.get_types()
+        self.devices = list(devices)
+        for d in self.devices:
+            if not 0 <= d.location <= network.length[d.segment]:
+                raise ValueError("device location %g is outside segment %d" % (d.location, d.segment))
+            pass
+        if capacity < len(types) + np.sum(network.yielding) + len(self.devices):
+            raise ValueError("capacity must be at least the number of vehicle types, yielding segments and devices")
+        super().__init__(capacity, "R", types, float("inf"), "U", engine=engine, parallel=parallel, seed=seed,
+                         integrator=integrator, dtype=dtype)
+
+        num = len(self.cars)  # 按类型比例取整后可能略少于capacity
+        self.active = np.zeros(num, dtype=bool)  # 槽位是否有车
+        self.segment = np.full(num, -1, dtype=np.int64)  # 车辆所在路段
+        self._merged = np.zeros(num, dtype=bool)  # 让行路段上已汇入的车辆
+        self._free = list(range(num - 1, -1, -1))  # 空闲链表，栈顶为下一个使用的槽位
+        # 每个让行路段占用一个槽位作为末端的停车线，速度为0，车尾位于路段终点
+        self._stop_line = np.full(len(network.length), -1, dtype=np.int64)
+        for s in np.flatnonzero(network.yielding).tolist():
+            slot = self._free.pop()
+            self._stop_line[s] = slot
+            self.real_location[slot] = self._real_location[slot] = network.end[s] + self.car_size[slot, 0]
+            pass
+        # 每个交通设施占用一个槽位作为停车线
+        self._device_slot = np.full(len(self.devices), -1, dtype=np.int64)
+        for k, d in enumerate(self.devices):
+            slot = self._free.pop()
+            self._device_slot[k] = slot
+            line = network.start[d.segment] + d.location
+            self.real_location[slot] = self._real_location[slot] = line + self.car_size[slot, 0]
+            pass
+        self._held = np.full(len(self.devices), -1, dtype=np.int64)  # 各设施前停车等待的车辆，-1为无
+        self._events = [(d.next_time, k) for k, d in enumerate(self.devices)]  # (事件时刻, 设施下标)的堆
+        heapq.heapify(self._events)
+        self._queue = [collections.deque() for _ in network.sources]  # 各入口排队车辆的原型下标
+        self._network_countdown = 0  # 距下次更新的步数
+        self.entered = 0  # 累计进入车辆数
+        self.exited = 0  # 累计离开车辆数
+        self.limiting_speed[:] = 0
+        pass
+
+    def _init_arrays(self) -> None:
+        super()._init_arrays()
+        # 各原型的跟驰模型分组，模型分组顺序由车辆排列决定，恢复快照后重新生成
+        self._type_group = np.array([[m is model for m in self.models].index(True)
+                                     for model in self.types.following_model], dtype=np.int64)
+        pass
+
+    def _init_ring(self, num: int) -> None:
+        # 开放道路：前车由路段重建，空闲槽位与前方无车的车辆以自身为前车，间隔为FREE_ROAD_GAP
+        self.leader = np.arange(num)
+        self.follower = np.arange(num)
+        self.location_correction = np.full(num, FREE_ROAD_GAP)
+        self._road_length = np.full(num, float("inf"))
+        self.ring_size = num
+        self.num_replica = 1
+        self.replica = np.zeros(num, dtype=np.int64)
+        pass
+
+    def _init_location(self) -> np.ndarray:
+        return np.zeros(len(self.cars))
+
+    @property
+    def queue_length(self) -> List:
+        """
+        各入口排队的车辆数
+        """
+        return [len(q) for q in self._queue]
+
+    def _get_scheduler(self, step: float) -> ReactionScheduler:
+        if self.scheduler is None:
+            super()._get_scheduler(step)
+            self.scheduler.next_tick[~self.active] = NEVER
+            self.scheduler.rebuild()
+        elif self.scheduler.tick != step:
+            # 改变步长时按倒计时换算，空闲槽位不参与换算
+            self.scheduler.next_tick[~self.active] = self.scheduler.now
+            self.scheduler.rescale(step)
+            self.scheduler.next_tick[~self.active] = NEVER
+            self.scheduler.rebuild()
+            pass
+        return self.scheduler
+
+    def update(self, step):
+        self._advance(1, step)
+        pass
+
+    def _advance(self, n_steps: int, step: float) -> None:
+        every = max(int(round(self.network_interval / step)), 1)
+        done = 0
+        while done < n_steps:
+            fired = self._fire_devices(step)
+            if self._network_countdown <= 0:
+                self.update_network(step)
+                self._network_countdown = every
+            elif fired:
+                self._link()
+                self._count_difference()
+                pass
+            chunk = min(self._network_countdown, n_steps - done, self._steps_to_event(step))
+            if self.engine == "python" and not isinstance(self.integrator, AdaptiveIntegrator):
+                # Fleet._advance逐步调用update，此处直接调用ArrayFleet.update，避免重复计数
+                for _ in range(chunk):
+                    super().update(step)
+                    pass
+            else:
+                super()._advance(chunk, step)
+            self._network_countdown -= chunk
+            done += chunk
+            pass
+        pass
+
+    def _fire_devices(self, step: float) -> bool:
+        """
+        处理已到时刻的设施事件，设施给出下一事件时刻后重新入堆
+        :param step: 步长，float类型，事件时刻允许有远小于步长的舍入误差
+        :return: 是否处理了事件
+        """
+        fired = False
+        while self._events and self._events[0][0] <= self.time + STEP_EPS * step:
+            _, k = heapq.heappop(self._events)
+            d = self.devices[k]
+            d.fire(self.time, self)
+            heapq.heappush(self._events, (d.next_time, k))
+            fired = True
+            pass
+        return fired
+
+    def _steps_to_event(self, step: float) -> int:
+        # 到下一设施事件的步数，至少为1
+        if not self._events:
+            return NEVER
+        return max(int(np.ceil((self._events[0][0] - self.time) / step - STEP_EPS)), 1)
+
+    def get_vehicles(self, segment: int, start: float = 0, end: float = float("inf")) -> np.ndarray:
+        """
+        路段上车头位于[start, end]范围内的在路车辆
+        :param segment: 路段编号，int类型
+        :param start: 范围起点距路段起点的距离，float类型，单位m
+        :param end: 范围终点距路段起点的距离，float类型，单位m
+        :return: 车辆下标数组
+        """
+        x = self.real_location - self.network.start[segment]
+        return np.flatnonzero(self.active & (self.segment == segment) & (x >= start) & (x <= end))
+
+    def update_network(self, step: float) -> None:
+        """
+        一次网络更新：更新车辆所在路段，移除到达出口的车辆，插入到达入口的车辆，重建前车关系
+        :param step: 步长，float类型
+        """
+        scheduler = self._get_scheduler(step)
+        net = self.network
+        changed = False
+
+        # 跨越路段终点的车辆进入下游路段，可能连续跨越多个路段
+        index = np.flatnonzero(self.active)
+        seg = self.segment[index]
+        x = self.real_location[index]
+        # 以停车线为前车的车辆停车时可能略微越过路段终点，越过不超过停车间距时仍在让行路段等待汇入
+        wait = (self.leader[index] == self._stop_line[seg]) & (x < net.end[seg] + self.stopping_distance[index])
+        while True:
+            cross = (x >= net.end[seg]) & (net.downstream[seg] >= 0) & ~wait
+            if not cross.any():
+                break
+            seg[cross] = net.downstream[seg[cross]]
+            pass
+        self.segment[index] = seg
+        gone = index[(x >= net.end[seg]) & (net.downstream[seg] < 0)]
+        if len(gone):
+            self._deactivate(gone)
+            changed = True
+            pass
+
+        # 入口后方有足够间隔时插入排队的第一辆车，每个入口每次至多一辆
+        for k, (s, inflow) in enumerate(net.sources):
+            self._queue[k].extend(self.types.register(c) for c in inflow.arrivals(self.time))
+            if not self._queue[k] or not self._free:
+                continue
+            p = self._queue[k][0]
+            on = np.flatnonzero(self.active & (self.segment == s))
+            speed = self.types.limiting_speed[p, 1] if inflow.speed is None else inflow.speed
+            if len(on):
+                rear = on[np.argmin(self.real_location[on])]
+                gap = self.real_location[rear] - self.car_size[rear, 0] - net.start[s]
+                if gap < self.types.stopping_distance[p]:
+                    continue
+                # 进入速度不超过前方第一辆车的速度，且间隔不小于停车间距与期望车头时距之和
+                speed = min(speed, self.real_speed[rear],
+                            (gap - self.types.stopping_distance[p]) / max(self.types.expecting_headway[p], STEP_EPS))
+                pass
+            self._queue[k].popleft()
+            self._activate(self._free.pop(), p, s, speed, scheduler)
+            changed = True
+            pass
+
+        if changed:
+            self._model_mask = {}
+            if self.engine == "numba":
+                import kernel
+                self._external_index = np.flatnonzero(self._model_id == kernel.MODEL_EXTERNAL)
+                pass
+            scheduler.invalidate()
+            pass
+        self._link()
+        self._count_difference()
+        pass
+
+    def _activate(self, slot: int, p: int, segment: int, speed: float, scheduler: ReactionScheduler) -> None:
+        # 把原型p的车辆写入空闲槽位，位于路段起点
+        types = self.types
+        self.prototype_index[slot] = p
+        self.car_id[slot] = new_car_ids(1)[0]
+        self.car_type[slot] = types.car_type[p]
+        self.car_size[slot] = types.car_size[p]
+        self.expecting_headway[slot] = types.expecting_headway[p]
+        self.limiting_acceleration[slot] = types.limiting_acceleration[p]
+        self.limiting_speed[slot] = types.limiting_speed[p]
+        self.stopping_distance[slot] = types.stopping_distance[p]
+        self.observation_error[slot] = types.observation_error[p]
+        self.operation_error[slot] = types.operation_error[p]
+        self.response_time_delay[slot] = types.response_time_delay[p]
+        self._init_delay[slot] = types.init_delay[p]
+        g = self._type_group[p]
+        self.model_index[slot] = g
+        self.noise_count[slot] = 1 + self.models[g].noise_size
+        if self.engine == "numba":
+            import kernel
+            code = kernel.model_code(self.models[g])
+            self._model_id[slot] = code[0]
+            self._model_parameter[slot] = code[1]
+            self._car_length[slot] = types.car_size[p, 0]
+            pass
+        self.cars.discard(slot)
+
+        location = self.network.start[segment]
+        for name in ['real_location', '_real_location', 'real_position', '_real_position']:
+            getattr(self, name)[slot] = location
+            pass
+        for name in ['real_mileage', '_real_mileage', 'real_acceleration', '_real_acceleration']:
+            getattr(self, name)[slot] = 0
+            pass
+        self.real_speed[slot] = self._real_speed[slot] = speed
+
+        scheduler.response_time_delay[slot] = types.response_time_delay[p]
+        scheduler.interval[slot] = count_ticks(types.response_time_delay[p:p + 1], scheduler.tick)[0] + 1
+        scheduler.next_tick[slot] = count_ticks(types.init_delay[p:p + 1], scheduler.tick)[0] + scheduler.now
+        self.active[slot] = True
+        self.segment[slot] = segment
+        self.entered += 1
+        pass
+
+    def _deactivate(self, index: np.ndarray) -> None:
+        # 车辆离开，槽位归还空闲链表，保留最后的位置与里程
+        self.active[index] = False
+        self.segment[index] = -1
+        self._merged[index] = False
+        self.limiting_speed[index] = 0
+        for name in ['real_speed', '_real_speed', 'real_acceleration', '_real_acceleration']:
+            getattr(self, name)[index] = 0
+            pass
+        self.scheduler.next_tick[index] = NEVER
+        self._free.extend(index[::-1].tolist())
+        self.exited += len(index)
+        pass
+
+    def _link(self) -> None:
+        """
+        按路段重建前车关系
+        合流区内主路的车辆归入下游路段统一排序，让行路段的车辆有可接受间隙时归入下游路段；
+        未汇入的车辆中最前方者以同路段已汇入的最后方车辆为前车，没有已汇入车辆或停车线的约束更紧时以停车线为前车；
+        其余每组最前方车辆的前车为下游最近的非空组的最后方车辆
+        """
+        net = self.network
+        num = len(self.cars)
+        self.leader = np.arange(num)
+        self.follower = np.arange(num)
+        self.location_correction = np.full(num, FREE_ROAD_GAP)
+
+        index = np.flatnonzero(self.active)
+        if not len(index):
+            return
+        seg = self.segment[index]
+        x = self.real_location[index]
+        zone = net.merging[seg] & (net.end[seg] - x <= net.merge_zone)
+        group = np.where(zone & ~net.yielding[seg], net.downstream[seg], seg)
+        merged = np.full(len(net.length), -1, dtype=np.int64)  # 各让行路段上已汇入但仍在本路段的最后方车辆
+        for s in np.flatnonzero(net.yielding).tolist():
+            wait = np.flatnonzero(zone & (seg == s))
+            if len(wait):
+                accept = wait[self._accept_gap(index, seg, x, group, wait, s)]
+                group[accept] = net.downstream[s]
+                self._merged[index[wait]] = False
+                self._merged[index[accept]] = True
+                if len(accept):
+                    merged[s] = index[accept[np.argmin(x[accept])]]
+                    pass
+                pass
+            pass
+        order = np.lexsort((x, group))
+        index, group = index[order], group[order]
+
+        same = group[1:] == group[:-1]
+        self.leader[index[:-1][same]] = index[1:][same]
+        self.location_correction[index[:-1][same]] = 0
+
+        # 各组最后方车辆，由下游向上游查找最近的非空组
+        first = np.flatnonzero(np.concatenate(([True], ~same)))
+        last = np.append(first[1:], len(index)) - 1
+        rear = np.full(len(net.length), -1, dtype=np.int64)
+        rear[group[first]] = index[first]
+        for g, k in zip(group[last].tolist(), index[last].tolist()):
+            if net.yielding[g]:
+                # 汇入按由前向后的顺序，已汇入的车辆均在未汇入车辆的前方
+                line = self._stop_line[g]
+                self.leader[k] = line if merged[g] < 0 else self._line_or_leader(k, merged[g], line)
+                self.location_correction[k] = 0
+                continue
+            s = net.downstream[g]
+            while s >= 0 and rear[s] < 0:
+                s = net.downstream[s]
+                pass
+            if s >= 0:
+                self.leader[k] = rear[s]
+                self.location_correction[k] = 0
+                pass
+            pass
+
+        self._link_devices()
+
+        linked = index[(self.leader[index] != index) & self.active[self.leader[index]]]
+        self.follower[self.leader[linked]] = linked
+        self._platoon_index = {}
+        pass
+
+    def _line_or_leader(self, i: int, leader: int, line: int) -> int:
+        """
+        车辆i的前车与停车线中约束更紧者
+        前车以最大减速度停下时车尾越过停车线，车辆i须在停车线前停车，以停车线为前车；否则前车先于停车线约束车辆i
+        :param i: 车辆下标，int类型
+        :param leader: 前车下标，int类型，为i时表示前方无车
+        :param line: 停车线槽位下标，int类型
+        :return: 前车下标，int类型
+        """
+        if leader == i:
+            return line
+        stop = (self.real_location[leader] - self.car_size[leader, 0]
+                + self.real_speed[leader] ** 2 / (2 * np.abs(self.limiting_acceleration[leader, 0])))
+        return line if stop >= self.real_location[line] - self.car_size[line, 0] else leader
+
+    def _link_devices(self) -> None:
+        # 禁止通行的设施：停车线上游第一辆能以最大减速度停在停车线前的车辆取停车线与前车中约束更紧者为前车，直到恢复通行；
+        # 每次重建时重新选择，越过停车线或已不能停在停车线前的车辆不以停车线为前车
+        for k, d in enumerate(self.devices):
+            if not d.blocking:
+                self._held[k] = -1
+                continue
+            line = self.network.start[d.segment] + d.location
+            index = self.get_vehicles(d.segment, end=d.location)
+            can_stop = (line - self.real_location[index]
+                        >= self.real_speed[index] ** 2 / (2 * np.abs(self.limiting_acceleration[index, 0])))
+            index = index[can_stop]
+            if not len(index):
+                self._held[k] = -1
+                continue
+            i = self._held[k] = index[np.argmax(self.real_location[index])]
+            self.leader[i] = self._line_or_leader(i, self.leader[i], self._device_slot[k])
+            self.location_correction[i] = 0
+            pass
+        pass
+
+    def get_platoon_index(self, model_type: type, max_search_index: int) -> PlatoonIndex:
+        # 槽位顺序与道路顺序无关，沿_link建立的前车链建立索引，重建前车关系后由_link清空
+        key = (model_type, max_search_index)
+        if key not in self._platoon_index:
+            self._platoon_index[key] = LinkedPlatoonIndex(self.get_model_mask(model_type), self.leader, self.follower,
+                                                          max_search_index)
+            pass
+        return self._platoon_index[key]
+
+    def _accept_gap(self, index: np.ndarray, seg: np.ndarray, x: np.ndarray, group: np.ndarray, wait: np.ndarray,
+                    segment: int) -> np.ndarray:
+        """
+        让行路段合流区内车辆的间隙接受判断
+        汇入后与前车的间隔不小于本车停车间距，与后车的间隔不小于后车的停车间距、期望车头时距内的行驶距离
+        与速度差对应的制动距离之和；前方同路段车辆均汇入时才汇入，已汇入的车辆不再重新判断
+        :param index: 在路车辆下标数组
+        :param seg: 在路车辆所在路段数组
+        :param x: 在路车辆位置数组，单位m
+        :param group: 在路车辆的排序组数组
+        :param wait: 等待汇入车辆在index中的位置数组
+        :param segment: 让行路段编号，int类型
+        :return: 是否汇入的布尔数组，与wait等长
+        """
+        net = self.network
+        target = net.downstream[segment]
+        # 汇入后的前后车：下游组与主路的全部车辆
+        other = np.flatnonzero((group == target) | (seg == net.priority[target]))
+        other = other[np.argsort(x[other])]
+        ok = np.ones(len(wait), dtype=bool)
+        if len(other):
+            k = np.searchsorted(x[other], x[wait], side='right')
+            me = index[wait]
+            leader = index[other[np.minimum(k, len(other) - 1)]]
+            follower = index[other[np.maximum(k - 1, 0)]]
+            front = x[other[np.minimum(k, len(other) - 1)]] - self.car_size[leader, 0] - x[wait]
+            back = x[wait] - self.car_size[me, 0] - x[other[np.maximum(k - 1, 0)]]
+            speed = self.real_speed[me]
+            follower_speed = self.real_speed[follower]
+            need = (self.stopping_distance[follower] + follower_speed * self.expecting_headway[follower]
+                    + np.maximum(follower_speed - speed, 0) ** 2 / (2 * np.abs(self.limiting_acceleration[follower, 0])))
+            ok &= (k >= len(other)) | (front >= self.stopping_distance[me])
+            ok &= (k == 0) | (back >= need)
+            pass
+        ok |= self._merged[index[wait]]
+        order = np.argsort(-x[wait])
+        re = np.zeros(len(wait), dtype=bool)
+        re[order] = np.cumprod(ok[order]).astype(bool)
+        return re
+
+    def _write_sample(self, buffer: np.ndarray, index: np.ndarray = None) -> None:
+        super()._write_sample(buffer, index)
+        active = self.active if index is None else self.active[index]
+        buffer[~active, 2:] = np.nan
+        pass
+
+    def _get_state(self) -> dict:
+        state = super()._get_state()
+        state['active'] = self.active
+        state['segment'] = self.segment
+        state['merged'] = self._merged
+        state['free'] = np.array(self._free, dtype=np.int64)
+        state['network_count'] = np.array([self._network_countdown, self.entered, self.exited])
+        for k, (_, inflow) in enumerate(self.network.sources):
+            state['queue_%d' % k] = np.array(self._queue[k], dtype=np.int64)
+            for name, v in inflow.get_state().items():
+                state['inflow_%d_%s' % (k, name)] = v
+                pass
+            pass
+        state['device_held'] = self._held
+        for k, d in enumerate(self.devices):
+            for name, v in d.get_state().items():
+                state['device_%d_%s' % (k, name)] = v
+                pass
+            pass
+        return state
+
+    def _set_state(self, state: dict) -> None:
+        super()._set_state(state)
+        self.active = state['active'].copy()
+        self.segment = state['segment'].copy()
+        self._merged = state['merged'].copy()
+        self.limiting_speed[~self.active] = 0
+        self._free = state['free'].tolist()
+        self._network_countdown, self.entered, self.exited = state['network_count'].tolist()
+        for k, (_, inflow) in enumerate(self.network.sources):
+            self._queue[k] = collections.deque(state['queue_%d' % k].tolist())
+            prefix = 'inflow_%d_' % k
+            inflow.set_state({name[len(prefix):]: v for name, v in state.items() if name.startswith(prefix)})
+            pass
+        self._held = state['device_held'].copy()
+        for k, d in enumerate(self.devices):
+            prefix = 'device_%d_' % k
+            d.set_state({name[len(prefix):]: v for name, v in state.items() if name.startswith(prefix)})
+            pass
+        self._events = [(d.next_time, k) for k, d in enumerate(self.devices)]
+        heapq.heapify(self._events)
+        pass
+
+    pass
+
+
+if __name__ == '__main__':
+    # 匝道汇入检查：主路500m+1000m，300m匝道，主路1500veh/h、匝道400veh/h，推进110s，同一路段的相邻车辆不应重叠
+    # 观测误差与操作误差会使跟驰模型在排队时自身发生重叠，此处取为0，只检查前车关系与汇入
+    import example
+
+    np.random.seed(0)
+    car = Car(car_name='HDC',
+              car_type=example.DICT_CAR_TYPE["HDC"],
+              following_model=example.DICT_FOLLOWING_MODEL["IDM_WITH_GIPPS"],
+              car_size=example.CAR_SIZE,
+              expecting_headway=3,
+              limiting_acceleration=example.LIMITING_ACCELERATION,
+              limiting_speed=example.LIMITING_SPEED,
+              stopping_distance=1,
+              observation_error=0,
+              operation_error=0,
+              response_time_delay=0.67,
+              car_color=(1, 0, 0))
+    for engine in ["python", "numba"]:
+        net = RoadNetwork(merge_zone=100)
+        main2 = net.add_segment(1000)
+        main1 = net.add_segment(500, main2)
+        ramp = net.add_segment(300, main2)
+        net.add_source(main1, PoissonInflow({car: 1.0}, 1500, seed=1))
+        net.add_source(ramp, PoissonInflow({car: 1.0}, 400, seed=2))
+        np.random.seed(1)
+        fleet = OpenRoadFleet(net, 300, engine=engine, seed=3)
+        for _ in range(1100):
+            fleet.update(0.1)
+            for s in range(len(net.length)):
+                i = fleet.get_vehicles(s)
+                i = i[np.argsort(fleet.real_location[i])]
+                gap = fleet.real_location[i[1:]] - fleet.car_size[i[1:], 0] - fleet.real_location[i[:-1]]
+                assert (gap >= 0).all(), "segment %d overlaps at %.1fs" % (s, fleet.time)
+                pass
+            pass
+        print("%s: entered %d, exited %d, no overlap in %.0fs" % (engine, fleet.entered, fleet.exited, fleet.time))
+        pass
+    pass
@@ -1,19 +1,8 @@
-from example import *
-from usr_example import *
-import os
+from executor import *
 
 
-def task(dir_path: str, cpu_core_num: int = 4):
-    if cpu_core_num == 1:
-        os.system("start python m_threads.py -1 %s" % dir_path)
-    elif cpu_core_num == 2:
-        os.system("start python m_threads.py -21 %s" % dir_path)
-        os.system("start python m_threads.py -22 %s" % dir_path)
-    elif cpu_core_num == 4:
-        os.system("start python m_threads.py -41 %s" % dir_path)
-        os.system("start python m_threads.py -42 %s" % dir_path)
-        os.system("start python m_threads.py -43 %s" % dir_path)
-        os.system("start python m_threads.py -44 %s" % dir_path)
+def task(dir_path: str, cpu_core_num: int = None):
+    pool_task(std_hdc_idc_cacc_proportions, std_traffic_densities, dir_path, workers=cpu_core_num)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,139 @@
+import heapq
+
+import numpy as np
+
+NEVER = np.iinfo(np.int64).max // 2  # 不参与决策的车辆（如空闲槽位）的下一次决策步数，永不到达
+
+
+def count_ticks(delay: np.ndarray, tick: float) -> np.ndarray:
+    """
+    反应延迟倒计时所需的步数
+    与Car.update一致：倒计时大于0时每步减去一个步长，不大于0时决策
+    按不同取值逐步相减，结果与逐车倒计时完全一致
+    :param delay: 倒计时数组，单位s
+    :param tick: 步长，float类型，单位s
+    :return: 每辆车倒计时归零前经过的步数
+    """
+    values, inverse = np.unique(np.asarray(delay, dtype=np.float64), return_inverse=True)
+    count = np.zeros(len(values), dtype=np.int64)
+    mask = values > 0
+    while mask.any():
+        values[mask] -= tick
+        count[mask] += 1
+        mask = values > 0
+        pass
+    return count[inverse.reshape(-1)]
+
+
+class ReactionScheduler:
+    """
+    反应时刻调度器
+    以步数记录每辆车下一次决策的时刻，按时刻分桶，桶的时刻保存在最小堆中。
+    每步只取出到达反应时刻的车辆，其余车辆沿用上次的加速度
+    """
+
+    def __init__(self, response_time_delay: np.ndarray, delay: np.ndarray, tick: float, now: int = 0):
+        """
+        构造函数
+        :param response_time_delay: 反应延迟数组，单位s
+        :param delay: 当前倒计时数组，单位s
+        :param tick: 步长，float类型，单位s
+        :param now: 当前步数，int类型
+        """
+        self.tick = tick
+        self.now = now
+        self.response_time_delay = np.asarray(response_time_delay, dtype=np.float64)
+        self.interval = count_ticks(self.response_time_delay, tick) + 1  # 两次决策间隔的步数
+        self.next_tick = count_ticks(delay, tick) + now  # 下一次决策的步数
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """
+        按next_tick重建分桶，外部直接修改next_tick后调用
+        """
+        self._bucket = {}
+        self._heap = []
+        self._dirty = False
+        self._schedule(np.arange(len(self.next_tick)))
+        pass
+
+    def invalidate(self) -> None:
+        """
+        标记分桶失效，外部（如编译内核）直接修改next_tick与now后调用，下次使用时重建
+        """
+        self._dirty = True
+        pass
+
+    def _schedule(self, index: np.ndarray) -> None:
+        if not len(index):
+            return
+        order = np.argsort(self.next_tick[index], kind='stable')
+        index = index[order]
+        ticks, start = np.unique(self.next_tick[index], return_index=True)
+        for t, group in zip(ticks.tolist(), np.split(index, start[1:])):
+            if t in self._bucket:
+                self._bucket[t].append(group)
+            else:
+                self._bucket[t] = [group]
+                heapq.heappush(self._heap, t)
+                pass
+            pass
+        pass
+
+    def pop(self) -> np.ndarray:
+        """
+        取出当前步到达反应时刻的车辆，并安排其下一次决策
+        :return: 车辆下标数组，升序
+        """
+        if self._dirty:
+            self.rebuild()
+            pass
+        if not self._heap or self._heap[0] != self.now:
+            return np.empty(0, dtype=np.int64)
+        heapq.heappop(self._heap)
+        group = self._bucket.pop(self.now)
+        index = group[0] if len(group) == 1 else np.sort(np.concatenate(group))
+        self.next_tick[index] = self.now + self.interval[index]
+        self._schedule(index)
+        return index
+
+    def advance(self, n_ticks: int = 1) -> None:
+        """
+        推进n_ticks步，不得越过尚未取出的决策时刻
+        """
+        if self._dirty:
+            self.rebuild()
+            pass
+        if self._heap and self._heap[0] < self.now + n_ticks:
+            raise RuntimeError("reaction events at tick %d were not handled" % self._heap[0])
+        self.now += n_ticks
+        pass
+
+    def ticks_to_next(self) -> int:
+        """
+        距下一个决策时刻的步数
+        """
+        if self._dirty:
+            self.rebuild()
+            pass
+        if not self._heap:
+            return np.iinfo(np.int64).max
+        return self._heap[0] - self.now
+
+    def get_delay(self) -> np.ndarray:
+        """
+        换算为倒计时（单位s），取所在步长区间的中点，用于改变步长
+        """
+        return (self.next_tick - self.now - 0.5) * self.tick
+
+    def rescale(self, tick: float) -> None:
+        """
+        改变步长，按剩余倒计时重新计算决策时刻
+        :param tick: 新步长，float类型，单位s
+        """
+        delay = self.get_delay()
+        self.tick = tick
+        self.interval = count_ticks(self.response_time_delay, tick) + 1
+        self.next_tick = count_ticks(delay, tick) + self.now
+        self.rebuild()
+        pass
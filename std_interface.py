@@ -7,9 +7,26 @@ class FollowingModel(metaclass=abc.ABCMeta):
     跟驰模型接口类
     """
 
+    noise_size = 0  # 每次批量计算中每辆车抽取观测误差的次数，车队据此预先分配噪声
+
     def __call__(self, following_car):
         return self._run(following_car)
 
+    def batch(self, following_cars) -> np.ndarray:
+        """
+        批量计算入口，一次计算一组车辆的加速度
+        :param following_cars: 跟驰车批量信息，类型为CarBatch
+        :return: 返回加速度数组，单位m/s**2
+        """
+        return self._run_batch(following_cars)
+
+    @property
+    def has_batch(self) -> bool:
+        """
+        是否重载了_run_batch，未重载时批量计算逐车回退到_run
+        """
+        return type(self)._run_batch is not FollowingModel._run_batch
+
     @abc.abstractmethod
     def _run(self, following_car) -> float:
         """
@@ -20,6 +37,39 @@ class FollowingModel(metaclass=abc.ABCMeta):
         :return: 返回加速度，浮点类型，单位m/s**2
         """
 
+    def _run_batch(self, following_cars) -> np.ndarray:
+        """
+        批量跟驰模型计算入口，可选重载。
+        在此方法中，可以调用CarBatch中所有变量，变量均为按车辆排列的数组
+        默认实现逐车调用_run，因此只重载_run的模型同样可以批量计算
+        :param following_cars: 跟驰车批量信息，类型为CarBatch
+        :return: 返回加速度数组，单位m/s**2
+        """
+        return np.array([self._run(c) for c in following_cars.cars], dtype=np.float64)
+
+    pass
+
+
+class LaneChangeModel(metaclass=abc.ABCMeta):
+    """
+    换道模型接口类
+    多车道车队每隔一段时间对可以换道的车辆批量调用一次，车辆的加速度仍由各自的跟驰模型（FollowingModel）给出
+    """
+
+    def __call__(self, fleet, index: np.ndarray, target_lane: np.ndarray) -> np.ndarray:
+        return self._run(fleet, index, target_lane)
+
+    @abc.abstractmethod
+    def _run(self, fleet, index: np.ndarray, target_lane: np.ndarray) -> np.ndarray:
+        """
+        换道模型接口类虚函数，必须重载。
+        在此方法中，可以通过fleet.get_neighbours查询目标车道的前后车，通过fleet.expected_acceleration计算换道前后的加速度
+        :param fleet: 多车道车队，类型为MultiLaneFleet
+        :param index: 候选车辆下标数组
+        :param target_lane: 各候选车辆的目标车道数组
+        :return: 换道激励数组，大于0的车辆换道，多辆车换入同一位置时激励大者优先
+        """
+
     pass
 
 
@@ -61,6 +111,241 @@ class CarInfo(metaclass=abc.ABCMeta):
         self.real_position = 0  # 真实道路位置，单位m
 
 
+class CarBatch:
+    """
+    跟驰车批量信息
+    变量名与CarInfo一致，但均为按车辆排列的数组，二维变量按[车辆, 分量]排列
+    """
+
+    def __init__(self):
+        self.index = np.array([], dtype=np.int64)  # 车辆在车队中的下标
+        self.fleet = None  # 数据来源车队，需要更多前车信息的模型可以通过下标查询
+        self.cars = []  # 对应的车辆实例，仅供标量回退使用
+
+        self.expecting_headway = np.array([])  # 期望车头时距，单位s
+        self.car_size = np.empty((0, 2))  # 车辆尺寸[length, width]，单位m
+        self.limiting_acceleration = np.empty((0, 2))  # 限制加速度[减速度（负值），加速度]，单位m/s**2
+        self.limiting_speed = np.empty((0, 2))  # 限制速度[最小速度，最大速度]，单位m/s
+        self.stopping_distance = np.array([])  # 停车间距/安全间距，单位m
+        self.observation_error = np.array([])  # 观测误差
+        self.operation_error = np.array([])  # 操作误差
+        self.response_time_delay = np.array([])  # 响应延迟
+
+        self.real_location = np.array([])  # 真实位置，单位m
+        self.real_speed = np.array([])  # 真实速度，单位m/s
+        self.real_acceleration = np.array([])  # 真实加速度，单位m/s**2
+
+        self.real_headway = np.array([])  # 真实车头时距，单位s
+        self.real_spacing = np.array([])  # 真实车头车尾间隔，单位m
+        self.real_speed_difference = np.array([])  # 真实速度差，单位m/s
+        self.real_acceleration_difference = np.array([])  # 真实加速度差，单位m/s**2
+
+        self.preceding_speed = np.array([])  # 前车速度，单位m/s
+        self.preceding_acceleration = np.array([])  # 前车加速度，单位m/s**2
+        self.preceding_limiting_acceleration = np.empty((0, 2))  # 前车限制加速度，单位m/s**2
+
+        self.time = 0  # 模拟时间
+
+        self.noise = None  # 车队预先生成的标准正态分布随机数，每辆车占用一段，第0个用于操作误差
+        self.noise_offset = np.array([], dtype=np.int64)  # 每辆车在noise中的起始位置
+        self.noise_size = 0  # 每辆车可用的观测误差随机数个数
+        self._noise_slot = 1
+
+    def __len__(self):
+        return len(self.index)
+
+    def observation_noise(self) -> np.ndarray:
+        """
+        观测误差乘子，服从N(1, observation_error)
+        依次使用车队预先分配的随机数，用尽或未分配时直接抽样
+        :return: 按车辆排列的数组
+        """
+        if self.noise is None or self._noise_slot > self.noise_size:
+            return np.random.normal(1, self.observation_error, len(self))
+        z = self.noise[self.noise_offset + self._noise_slot]
+        self._noise_slot += 1
+        return 1 + self.observation_error * z
+
+    def copy(self):
+        """
+        浅拷贝，替换数组变量时不影响原批量信息
+        """
+        ret = CarBatch()
+        ret.__dict__.update(self.__dict__)
+        return ret
+
+
+class CarOverride:
+    """
+    跟驰车覆盖视图
+    包装一辆跟驰车（Car）或一组跟驰车（CarBatch），读取变量时优先返回覆盖值，其余变量直接读取被包装对象，不复制车辆状态。
+    组合模型修改内层模型的输入时使用，例如self.model(CarOverride(following_car, expecting_headway=t))。
+    对视图的赋值只写入覆盖值，不修改被包装对象；被包装对象的方法（如observation_noise）读取的仍是原变量
+    """
+
+    __slots__ = ('_target', '_override')
+
+    def __init__(self, target, **override):
+        """
+        构造函数
+        :param target: 被包装的跟驰车，类型为Car、CarInfo、CarBatch或CarOverride
+        :param override: 覆盖的变量，变量名与CarInfo、CarBatch一致
+        """
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_override', override)
+
+    def __getattr__(self, name):
+        if name in self._override:
+            return self._override[name]
+        return getattr(self._target, name)
+
+    def __setattr__(self, name, value):
+        self._override[name] = value
+
+    def __len__(self):
+        return len(self._target)
+
+
+def _scalar_field(array: str) -> property:
+    # 读写车队数组中本车的元素，读取时返回float
+    def fget(self):
+        return getattr(self._fleet, array).item(self._index)
+
+    def fset(self, value):
+        getattr(self._fleet, array)[self._index] = value
+
+    return property(fget, fset)
+
+
+def _vector_field(array: str) -> property:
+    # 二维变量返回车队数组中本车的一行，为视图，不复制
+    def fget(self):
+        return getattr(self._fleet, array)[self._index]
+
+    return property(fget)
+
+
+class CarView:
+    """
+    车辆视图
+    数组化车队（ArrayFleet）中一辆车的轻量表示，只保存车队与下标，变量直接读写车队的数组，始终为当前状态。
+    变量名与CarInfo一致，以Car为输入的跟驰模型（_run）无需修改即可使用；
+    其余静态变量（name、car_type、following_model、car_color等）读取该车的原型
+    """
+
+    __slots__ = ('_fleet', '_index', '_prototype')
+
+    def __init__(self, fleet, index: int, prototype):
+        """
+        构造函数
+        :param fleet: 车队，类型为ArrayFleet
+        :param index: 车辆在车队中的下标，int类型
+        :param prototype: 车辆原型，类型为Car
+        """
+        self._fleet = fleet
+        self._index = index
+        self._prototype = prototype
+
+    def __getattr__(self, name):
+        # 只读取原型的实例变量，原型的方法作用于原型本身，不能代替本车的方法
+        try:
+            return vars(self._prototype)[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __repr__(self):
+        return self.name
+
+    def get_info(self) -> CarInfo:
+        """
+        当前状态的CarInfo副本
+        """
+        ret = CarInfo()
+        for name in vars(ret):
+            setattr(ret, name, getattr(self, name))
+            pass
+        return ret
+
+    def get_difference(self) -> np.ndarray:
+        return np.array([self.real_spacing, self.real_speed_difference, self.real_acceleration_difference])
+
+    id = property(lambda self: int(self._fleet.car_id[self._index]),
+                  lambda self, value: self._fleet.car_id.__setitem__(self._index, value))
+    time = property(lambda self: self._fleet.time)
+    preceding_car = property(lambda self: self._fleet.cars[self._fleet.leader.item(self._index)])
+    following_car = property(lambda self: self._fleet.cars[self._fleet.follower.item(self._index)])
+
+    expecting_headway = _scalar_field('expecting_headway')
+    car_size = _vector_field('car_size')
+    limiting_acceleration = _vector_field('limiting_acceleration')
+    limiting_speed = _vector_field('limiting_speed')
+    stopping_distance = _scalar_field('stopping_distance')
+    observation_error = _scalar_field('observation_error')
+    operation_error = _scalar_field('operation_error')
+    response_time_delay = _scalar_field('response_time_delay')
+    road_length = _scalar_field('_road_length')
+
+    real_mileage = _scalar_field('real_mileage')
+    real_location = _scalar_field('real_location')
+    real_position = _scalar_field('real_position')
+    real_speed = _scalar_field('real_speed')
+    real_acceleration = _scalar_field('real_acceleration')
+
+    real_headway = _scalar_field('real_headway')
+    real_spacing = _scalar_field('real_spacing')
+    real_speed_difference = _scalar_field('real_speed_difference')
+    real_acceleration_difference = _scalar_field('real_acceleration_difference')
+
+
+class CarViewList:
+    """
+    车辆视图列表
+    数组化车队的cars，按下标首次访问时才建立该车的CarView并保留，之后返回同一实例。
+    百万辆车的车队只建立被访问的视图，未访问的车辆每辆只占用一个空位
+    """
+
+    __slots__ = ('_fleet', '_views')
+
+    def __init__(self, fleet, num: int):
+        """
+        构造函数
+        :param fleet: 车队，类型为ArrayFleet，需要已有prototypes与prototype_index
+        :param num: 车辆数，int类型
+        """
+        self._fleet = fleet
+        self._views = [None] * num
+
+    def __len__(self):
+        return len(self._views)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        re = self._views[index]
+        if re is None:
+            index = range(len(self))[index]
+            fleet = self._fleet
+            re = CarView(fleet, index, fleet.prototypes[fleet.prototype_index.item(index)])
+            self._views[index] = re
+            pass
+        return re
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+            pass
+
+    def discard(self, index) -> None:
+        """
+        丢弃已建立的视图，车辆槽位改为其他原型的车辆时调用，下次访问时按新原型重新建立
+        :param index: 车辆下标数组
+        """
+        for i in np.atleast_1d(index).tolist():
+            self._views[i] = None
+            pass
+        pass
+
+
 # 如何输入自己的跟驰模型，例如
 class MyFollowingModel(FollowingModel):  # 首先需要继承FollowingModel接口
     def __init__(self, b: float = 28, alpha: float = 0.16, beta: float = 1.1, _lambda: float = 0.5):
@@ -0,0 +1,114 @@
+from engine import *
+from noise import EnsembleNoiseProvider
+
+
+class SweepFleet(ArrayFleet):
+    """
+    场景批量车队
+    车流密度×渗透率网格中的多个场景打包为一个车队同时推进，一次update推进全部场景。
+    各场景依次排列为互不相连的环形车队，车辆数可以不同，按场景顺序紧密排列，不做填充。
+    每辆车有各自的道路长度、跟驰模型编号与参数，跟驰模型按原型实例跨场景分组批量计算，
+    观测误差与操作误差按场景使用各自独立的噪声流。
+    第s个场景的结果与车辆排列相同、种子为其噪声种子的ArrayFleet一致
+    """
+
+    ring_name = 'scenario'  # 采样数据与统计结果中环形车队编号的名称
+
+    def __init__(self,
+                 car_num: int,
+                 init_type_car: str,
+                 scenarios: List,
+                 init_type_loc: str,
+                 engine: str = "python",
+                 parallel: bool = False,
+                 seed=None,
+                 integrator="ballistic",
+                 dtype=np.float64):
+        """
+        构造函数
+        :param car_num: 每个场景的车辆数，int类型
+        :param init_type_car: 车辆排列方式，str类型，见SET_INIT_CARS_TYPE
+        :param scenarios: 场景列表，元素为(车辆比例, 道路长度)，例如[({HDC: 0.6, IDC_CACC: 0.4}, 1000), ...]
+        :param init_type_loc: 初始位置方式，str类型，见SET_INIT_LOC_TYPE
+        :param engine: 计算引擎，str类型，见SET_ENGINE_TYPE
+        :param parallel: 编译内核是否按车辆并行(prange)
+        :param seed: 随机数种子，int类型时由numpy.random.SeedSequence派生各场景的种子，
+                     list类型时依次为各场景的种子，为None时由np.random的全局状态生成
+        :param integrator: 积分器，str类型，见integrator.DICT_INTEGRATOR，或Integrator实例
+        :param dtype: 速度、加速度等状态数组的数据类型，见ArrayFleet
+        """
+        self.scenarios = list(scenarios)
+        super().__init__(car_num, init_type_car, None, np.array([s[1] for s in self.scenarios], dtype=np.float64),
+                         init_type_loc, engine=engine, parallel=parallel, seed=seed, integrator=integrator,
+                         dtype=dtype)
+        self._index = np.concatenate([np.linspace(1, n, n) for n in self.ring_size])
+
+    def _init_cars(self) -> List[Car]:
+        # 各场景分别生成车辆排列，原型登记在同一个车辆类型表中，车辆共享原型的跟驰模型实例，批量计算时跨场景分组
+        self.types = VehicleTypeTable()
+        self.prototypes = self.types.prototypes
+        self._ring_sizes = []
+        prototype_index = [np.empty(0, dtype=np.int64)]
+        for proportion, road_length in self.scenarios:
+            lookup = np.array([self.types.register(c) for c in proportion], dtype=np.int64)
+            kind = arrange_cars(self.car_num, self.init_type_car, list(proportion.values()))
+            prototype_index.append(lookup[kind])
+            self._ring_sizes.append(len(kind))
+            pass
+        self.prototype_index = np.concatenate(prototype_index)
+        return self._make_cars(self.prototype_index)
+
+    def _set_state(self, state: dict) -> None:
+        self._ring_sizes = state['ring_size'].tolist()
+        super()._set_state(state)
+        pass
+
+    def _init_noise(self, seed) -> None:
+        num = len(self.scenarios)
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+            pass
+        if np.ndim(seed) == 0:
+            seed = np.random.SeedSequence(seed).spawn(num)
+        elif len(seed) != num:
+            raise ValueError("%d seeds given for %d rings" % (len(seed), num))
+        self.noise = EnsembleNoiseProvider(list(seed))
+        pass
+
+    def _init_ring(self, num: int) -> None:
+        # 每个场景是一个环形车队：场景内第i辆车的前车为第i+1辆车，末车的前车为场景首车，并修正该场景的道路长度
+        size = np.array(self._ring_sizes, dtype=np.int64)
+        start = np.cumsum(size) - size
+        ring = np.repeat(np.arange(len(size)), size)
+        rows = np.arange(num)
+        local = rows - start[ring]
+        self.leader = start[ring] + (local + 1) % size[ring]
+        self.follower = start[ring] + (local - 1) % size[ring]
+        self._road_length = np.array([s[1] for s in self.scenarios], dtype=np.float64)[ring]
+        self.location_correction = np.where(local == size[ring] - 1, self._road_length, 0.0)
+        self.ring_size = size
+        self.ring_start = start
+        self.num_replica = len(size)
+        self.replica = ring
+        pass
+
+    def _peek_noise(self, size: np.ndarray) -> (np.ndarray, np.ndarray):
+        return self.noise.peek(size)
+
+    def _consume_noise(self, size: np.ndarray) -> None:
+        self.noise.consume(size)
+        pass
+
+    def split(self, data: np.ndarray) -> List[np.ndarray]:
+        """
+        按场景拆分采样数据，不复制数据
+        :param data: advance返回的采样缓冲，形状为[采样数, 车辆数, 11]
+        :return: 每个场景一个形状为[采样数, 场景车辆数, 11]的视图
+        """
+        return [data[:, s:s + n] for s, n in zip(self.ring_start, self.ring_size)]
+
+    def get_data(self) -> pd.DataFrame:
+        rows = pd.MultiIndex.from_arrays([self.replica, self._index.astype(int)], names=[self.ring_name, 'index'])
+        cols = ['sub_index', 'time', 'type', 'pos', 'v', 'a', 'dl', 'dv', 'da', 'hw']
+        re = np.delete(self.get_data_by_list(), 2, axis=1)
+        return pd.DataFrame(re, index=rows, columns=cols, dtype='double')
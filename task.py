@@ -4,71 +4,61 @@ import sys
 from matplotlib import pyplot as plt
 from progressbar import *
 
+from engine import ArrayFleet
+from recorder import (RecordSink, CsvSink, ColumnarSink, ChunkRecorder, SET_OUTPUT_FORMAT, vehicle_table,
+                      csv_vehicles_path)
+from sweep import SweepFleet
+from warmstart import WarmStartCache, scenario_key
 from example import *
 from usr_example import *
 
 
-def std_task_scene(proportion: dict, traffic_density: float, dir_path: str):
-    road_length = 1000 * CAR_NUM / traffic_density
-
-    start_tag = time.time()
+class SpeedHistogram(RecordSink):
+    """
+    速度-频率统计，作为记录器的输出按块累计time > SAMPLING_TIME的采样速度，不保留采样数据
+    """
 
-    permeability = 1 - list(proportion.values())[0]
-
-    cars = Fleet(CAR_NUM, "R", proportion, road_length, "L")
-    dump = []
-    end_tag = time.time()
-    yield (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-           traffic_density,
-           permeability,
-           'message',
-           "1.初始化完成.用时%.2fsec." % (end_tag - start_tag))
+    def __init__(self):
+        self.bins = np.linspace(0, MAX_SPEED, int(MAX_SPEED / 10) + 1)  # 速度区间，单位km/h
+        self.hist = np.zeros(len(self.bins) - 1, dtype=np.int64)
+        self.total = 0.0  # 速度之和，单位km/h
+        self.count = 0
+        pass
 
-    yield (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-           traffic_density,
-           permeability,
-           'message',
-           "2.仿真开始.运行目标:+%.2fsec." % (STEP * CYCLE_INDEX))
-    start_tag = time.time()
-    bar = ProgressBar()
-    dump.append(cars.get_data_by_list())
-    for _ in bar(range(int(CYCLE_INDEX / SAMPLING_INTERVAL))):
-        for j in range(SAMPLING_INTERVAL):
-            cars.update(STEP)
+    def open(self, position: dict = None) -> None:
+        if position is not None:
+            self.hist = np.array(position['hist'], dtype=np.int64)
+            self.total = float(position['total'])
+            self.count = int(position['count'])
             pass
-        dump.append(cars.get_data_by_list())
         pass
 
-    end_tag = time.time()
+    def write(self, chunk: np.ndarray) -> None:
+        data = chunk[:, :, 5][chunk[:, :, 1] > SAMPLING_TIME] * 3.6
+        data[data > MAX_SPEED] = MAX_SPEED
+        self.hist += np.histogram(data, bins=self.bins)[0]
+        self.total += data.sum()
+        self.count += len(data)
+        pass
 
-    yield (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-           traffic_density,
-           permeability,
-           'message',
-           ("3.仿真完成.运行目标+%.2fsec,用时:%.2fsec,数据内存使用:%.2fKB."
-            % (CYCLE_INDEX * STEP, end_tag - start_tag, sys.getsizeof(dump) / 1024)))
+    def tell(self) -> dict:
+        return {'hist': self.hist.copy(), 'total': self.total, 'count': self.count}
 
-    start_tag = time.time()
+    pass
 
-    if not os.path.exists(dir_path):
-        os.makedirs(dir_path)
-        pass
 
+def plot_scene(statistics: SpeedHistogram, traffic_density: float, permeability: float, dir_path: str) -> None:
+    """
+    绘制单个场景的速度-频率曲线
+    :param statistics: 速度-频率统计，类型为SpeedHistogram
+    :param traffic_density: 车流密度，float类型
+    :param permeability: 渗透率，float类型
+    :param dir_path: 输出目录，str类型
+    """
     file_name = ('TD_%.2f_PE_%.2f' % (traffic_density, permeability))
-    cols = ['sub_index', 'time', 'id', 'type', 'pos', 'v', 'a', 'dl', 'dv', 'da', 'hw']
-    dump = np.vstack(dump)
-    dump = pd.DataFrame(dump, columns=cols, dtype='double')
-    dump.index.name = 'index'
-    dump.to_csv(dir_path + 'data_' + file_name + '.csv', sep=',')
-    # np.save(file_name, dump)
-
-    data = np.array(dump['v'][dump['time'] > SAMPLING_TIME]) * 3.6
-    data[data > MAX_SPEED] = MAX_SPEED
-    mean = np.mean(data)
-    x = np.linspace(0, MAX_SPEED, int(MAX_SPEED / 10) + 1)
-    y, _ = np.histogram(data, bins=x)
-    y = y / y.sum()
-    x = x[:-1] + 5
+    mean = statistics.total / statistics.count
+    y = statistics.hist / statistics.hist.sum()
+    x = statistics.bins[:-1] + 5
     plt.figure(figsize=(5, 3), dpi=100)
     plt.rcParams['font.sans-serif'] = ['SimHei']
     plt.rcParams['axes.unicode_minus'] = False
@@ -87,23 +77,200 @@ def std_task_scene(proportion: dict, traffic_density: float, dir_path: str):
     plt.tight_layout()
     plt.savefig(dir_path + file_name + '.jpg')
     plt.close()
+    pass
 
+
+def scene_sinks(traffic_density: float, permeability: float, dir_path: str,
+                output: str = OUTPUT_FORMAT, vehicles: pd.DataFrame = None) -> (str, list):
+    """
+    单个场景的记录器输出：采样数据与速度-频率统计
+    :param output: 采样数据输出格式，str类型，见SET_OUTPUT_FORMAT，
+                   "columnar"写入目录data_*（见ColumnarSink），"csv"写入文件data_*.csv
+    :param vehicles: 车辆表，可选，见vehicle_table，给出时只写入一次，采样数据不再重复sub_index、id、type
+    :return: (采样数据路径, [ColumnarSink或CsvSink, SpeedHistogram])
+    """
+    if output not in SET_OUTPUT_FORMAT:
+        raise ValueError("output format %s is not in %s" % (output, SET_OUTPUT_FORMAT))
+    if not os.path.exists(dir_path):
+        os.makedirs(dir_path)
+        pass
+    file_name = ('TD_%.2f_PE_%.2f' % (traffic_density, permeability))
+    if output == "columnar":
+        path = dir_path + 'data_' + file_name
+        sink = ColumnarSink(path, meta={'traffic_density': traffic_density, 'permeability': permeability,
+                                        'step': STEP, 'sampling_interval': SAMPLING_INTERVAL}, vehicles=vehicles)
+    else:
+        path = dir_path + 'data_' + file_name + '.csv'
+        sink = CsvSink(path, vehicles=vehicles)
+        pass
+    return path, [sink, SpeedHistogram()]
+
+
+def data_size(path: str) -> int:
+    """
+    采样数据占用的磁盘空间
+    :param path: 采样数据路径，列式目录或CSV文件
+    :return: 字节数，int类型
+    """
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, _)) for _ in os.listdir(path))
+    if os.path.exists(csv_vehicles_path(path)):
+        return os.path.getsize(path) + os.path.getsize(csv_vehicles_path(path))
+    return os.path.getsize(path)
+
+
+def save_scene(dump: np.ndarray, traffic_density: float, permeability: float, dir_path: str,
+               chunk_size: int = 256, output: str = OUTPUT_FORMAT) -> str:
+    """
+    保存单个场景的采样数据与速度-频率曲线，采样数据按块写入
+    :param dump: 采样数据，形状为[采样数, 车辆数, 11]，列与get_data_by_list一致
+    :param traffic_density: 车流密度，float类型
+    :param permeability: 渗透率，float类型
+    :param dir_path: 输出目录，str类型
+    :param chunk_size: 每次写入的采样数，int类型
+    :param output: 采样数据输出格式，见scene_sinks
+    :return: 采样数据路径
+    """
+    path, sinks = scene_sinks(traffic_density, permeability, dir_path, output)
+    for sink in sinks:
+        sink.open()
+        for i in range(0, len(dump), chunk_size):
+            sink.write(dump[i:i + chunk_size])
+            pass
+        sink.close()
+        pass
+    plot_scene(sinks[1], traffic_density, permeability, dir_path)
+    return path
+
+
+def std_task_scene(proportion: dict, traffic_density: float, dir_path: str, progress: bool = True,
+                   checkpoint_every: int = 0, seed: int = None, cache: WarmStartCache = None,
+                   chunk_size: int = 256, output: str = OUTPUT_FORMAT):
+    """
+    单个场景任务，依次产出进度消息与采样数据文件路径
+    采样直接写入ChunkRecorder的块中，由后台线程逐块写入采样数据并累计速度-频率统计，内存占用与仿真时长无关
+    :param proportion: 车辆比例，dict类型
+    :param traffic_density: 车流密度，float类型
+    :param dir_path: 输出目录，str类型
+    :param progress: 是否显示进度条，bool类型
+    :param checkpoint_every: 检查点间隔采样数，int类型，0表示不保存检查点。
+                             每隔checkpoint_every次采样将车队快照与采样数据的写入位置写入输出目录下的checkpoint_*.npz，
+                             再次运行同一场景时从检查点继续，场景完成后删除检查点
+    :param seed: 随机数种子，int类型，用于np.random.seed，为None时沿用np.random的全局状态
+    :param cache: 预热缓存，类型为WarmStartCache，需同时给出seed。
+                  命中时从SAMPLING_TIME时刻的快照开始，采样数据只包含此后的部分；未命中时在SAMPLING_TIME时刻写入快照
+    :param chunk_size: 记录器每块的采样数，int类型，见ChunkRecorder
+    :param output: 采样数据输出格式，str类型，见scene_sinks，读取见TrajectoryReader
+    """
+    road_length = 1000 * CAR_NUM / traffic_density
+
+    start_tag = time.time()
+
+    permeability = 1 - list(proportion.values())[0]
+
+    if seed is not None:
+        np.random.seed(seed)
+        pass
+    cars = ArrayFleet(CAR_NUM, "R", proportion, road_length, "L", engine=ENGINE, integrator=INTEGRATOR)
+    num_sample = int(CYCLE_INDEX / SAMPLING_INTERVAL)
+    checkpoint = dir_path + 'checkpoint_TD_%.2f_PE_%.2f.npz' % (traffic_density, permeability)
+    # 越过过渡过程的采样序号，预热缓存在此写入
+    warm = int(round(SAMPLING_TIME / (STEP * SAMPLING_INTERVAL)))
+    key = None
+    if cache is not None and seed is not None and warm < num_sample:
+        key = scenario_key(proportion, traffic_density, CAR_NUM, seed, step=STEP, engine=ENGINE,
+                           integrator=INTEGRATOR, sampling_interval=SAMPLING_INTERVAL, warm=warm)
+        pass
+    if checkpoint_every and os.path.exists(checkpoint):
+        extra = cars.restore(checkpoint)
+        first = int(extra.pop('first'))
+        k = first + int(extra['0_count']) - 1
+        position, sample = extra, None
+        message = "1.从检查点恢复.仿真时间%.2fsec,用时%.2fsec." % (cars.time, time.time() - start_tag)
+    elif key is not None and cache.get(key) is not None:
+        first = k = warm
+        position, sample = None, cars.restore(cache.get(key))['sample']
+        message = "1.从预热缓存开始.仿真时间%.2fsec,用时%.2fsec." % (cars.time, time.time() - start_tag)
+    else:
+        first = k = 0  # first为有效采样的起始序号，从预热缓存开始时跳过过渡过程
+        position, sample = None, cars.get_data_by_list()
+        message = "1.初始化完成.用时%.2fsec." % (time.time() - start_tag)
+        pass
+    # 车辆表在车队恢复后生成，车辆排列与ID在场景中不变
+    path, sinks = scene_sinks(traffic_density, permeability, dir_path, output, vehicle_table(cars))
+    recorder = ChunkRecorder(sinks, len(cars.cars), chunk_size, position=position)
+    if sample is not None:
+        recorder.append(sample)
+        pass
+    try:
+        yield (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+               traffic_density,
+               permeability,
+               'message',
+               message)
+
+        yield (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+               traffic_density,
+               permeability,
+               'message',
+               "2.仿真开始.运行目标:+%.2fsec." % (STEP * SAMPLING_INTERVAL * (num_sample - k)))
+        start_tag = time.time()
+        hook = None
+        if progress:
+            bar = ProgressBar(max_value=num_sample)
+            bar.start()
+            bar.update(k)
+            hook = lambda fleet, j: bar.update(k + j + 1)
+            pass
+        while k < num_sample:
+            n = min(checkpoint_every or num_sample, num_sample - k)
+            if key is not None and k < warm:
+                n = min(n, warm - k)
+                pass
+            recorder.advance(cars, n * SAMPLING_INTERVAL, STEP, SAMPLING_INTERVAL, hook=hook)
+            k += n
+            if key is not None and k == warm:
+                cache.put(key, cars, sample=cars.get_data_by_list())
+                pass
+            if checkpoint_every and k < num_sample:
+                cars.snapshot(checkpoint, first=first, **recorder.tell())
+                pass
+            pass
+        if progress:
+            bar.finish()
+            pass
+
+        end_tag = time.time()
+
+        yield (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+               traffic_density,
+               permeability,
+               'message',
+               ("3.仿真完成.运行目标+%.2fsec,用时:%.2fsec,数据内存使用:%.2fKB."
+                % (CYCLE_INDEX * STEP, end_tag - start_tag, recorder.nbytes / 1024)))
+
+        start_tag = time.time()
+    finally:
+        recorder.close()
+        pass
+    plot_scene(sinks[1], traffic_density, permeability, dir_path)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+        pass
     end_tag = time.time()
 
     yield (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
            traffic_density,
            permeability,
            'message',
-           ("4.数据持久化完成.生成数据文件%s.csv(%.2fMB),用时:%.2fsec."
-            % (file_name,
-               os.path.getsize(dir_path + 'data_' + file_name + '.csv') / (1024 ** 2),
-               end_tag - start_tag)))
+           ("4.数据持久化完成.生成数据文件%s(%.2fMB),用时:%.2fsec."
+            % (os.path.basename(path), data_size(path) / (1024 ** 2), end_tag - start_tag)))
 
     yield (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
            traffic_density,
            permeability,
            'data',
-           dump)
+           path)
     pass
 
 
@@ -127,6 +294,101 @@ def std_task(proportions: list, traffic_densities: list, dir_path: str):
     pass
 
 
+def std_sweep_task(proportions: list, traffic_densities: list, dir_path: str, tile_size: int = None):
+    """
+    批量场景任务，结果与std_task相同
+    车流密度×比例网格按tile_size个场景一组打包为SweepFleet同时仿真，再按场景拆分保存
+    :param proportions: 比例列表，list类型
+    :param traffic_densities: 车流密度列表，list类型
+    :param dir_path: 输出目录，str类型
+    :param tile_size: 每组场景数，int类型，默认为一个车流密度下的全部比例，越大越快，采样数据内存按组线性增长
+    """
+    cells = [(p, td) for td in traffic_densities for p in proportions]
+    if tile_size is None:
+        tile_size = len(proportions)
+        pass
+    for i in range(0, len(cells), tile_size):
+        tile = cells[i:i + tile_size]
+        print("Time:%s  Tile:%d-%d/%d"
+              % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()), i + 1, i + len(tile), len(cells)))
+
+        start_tag = time.time()
+        cars = SweepFleet(CAR_NUM, "R", [(p, 1000 * CAR_NUM / td) for p, td in tile], "L",
+                          engine=ENGINE, integrator=INTEGRATOR)
+        end_tag = time.time()
+        print("1.初始化完成.用时%.2fsec." % (end_tag - start_tag))
+
+        print("2.仿真开始.运行目标:+%.2fsec." % (STEP * CYCLE_INDEX))
+        start_tag = time.time()
+        num_sample = int(CYCLE_INDEX / SAMPLING_INTERVAL)
+        bar = ProgressBar(max_value=num_sample)
+        dump = np.empty((num_sample + 1, len(cars.cars), 11))
+        dump[0] = cars.get_data_by_list()
+        bar.start()
+        cars.advance(num_sample * SAMPLING_INTERVAL, STEP, SAMPLING_INTERVAL, out=dump[1:],
+                     hook=lambda fleet, k: bar.update(k + 1))
+        bar.finish()
+        end_tag = time.time()
+        print("3.仿真完成.运行目标+%.2fsec,用时:%.2fsec,数据内存使用:%.2fKB."
+              % (CYCLE_INDEX * STEP, end_tag - start_tag, dump.nbytes / 1024))
+
+        start_tag = time.time()
+        for (p, td), d in zip(tile, cars.split(dump)):
+            permeability = 1 - list(p.values())[0]
+            save_scene(d, td, permeability, dir_path)
+            pass
+        end_tag = time.time()
+        print("4.数据持久化完成.生成数据文件%d个,用时:%.2fsec." % (len(tile), end_tag - start_tag))
+        pass
+    pass
+
+
+def large_task_scene(proportion: dict, traffic_density: float, car_num: int, dir_path: str, record_num: int = 1000,
+                     dtype=np.float32, parallel: bool = True) -> pd.DataFrame:
+    """
+    大规模环形车队任务，适用于百万辆车的单个场景，内存占用与车辆数成正比，与仿真时长无关
+    初始位置随机分布，每次采样累计全部车辆的速度统计量，逐车采样只记录均匀选取的record_num辆车，
+    以float32直接写入输出目录下的samples_*.npy（内存映射，可用numpy.load(..., mmap_mode='r')读取），统计量写入statistics_*.csv
+    :param proportion: 车辆比例，dict类型
+    :param traffic_density: 车流密度，float类型
+    :param car_num: 车辆数，int类型
+    :param dir_path: 输出目录，str类型
+    :param record_num: 记录逐车采样的车辆数，int类型
+    :param dtype: 速度、加速度等状态数组的数据类型，见ArrayFleet
+    :param parallel: 编译内核是否按车辆并行(prange)
+    :return: 速度统计DataFrame，见ArrayFleet.advance_statistics
+    """
+    if not os.path.exists(dir_path):
+        os.makedirs(dir_path)
+        pass
+    permeability = 1 - list(proportion.values())[0]
+    file_name = 'TD_%.2f_PE_%.2f' % (traffic_density, permeability)
+
+    start_tag = time.time()
+    cars = ArrayFleet(car_num, "R", proportion, 1000 * car_num / traffic_density, "R", engine=ENGINE,
+                      parallel=parallel, integrator=INTEGRATOR, dtype=dtype)
+    index = np.unique(np.linspace(0, len(cars.cars) - 1, min(record_num, len(cars.cars))).astype(np.int64))
+    num_sample = int(CYCLE_INDEX / SAMPLING_INTERVAL)
+    dump = np.lib.format.open_memmap(dir_path + 'samples_' + file_name + '.npy', mode='w+', dtype=np.float32,
+                                     shape=(num_sample, len(index), 11))
+    print("1.初始化完成.车辆数%d,用时%.2fsec." % (len(cars.cars), time.time() - start_tag))
+
+    print("2.仿真开始.运行目标:+%.2fsec." % (STEP * CYCLE_INDEX))
+    start_tag = time.time()
+    re = cars.advance_statistics(num_sample * SAMPLING_INTERVAL, STEP, SAMPLING_INTERVAL, start_time=SAMPLING_TIME,
+                                 out=dump, index=index)
+    dump.flush()
+    end_tag = time.time()
+    print("3.仿真完成.运行目标+%.2fsec,用时:%.2fsec,%.2e车辆步/sec."
+          % (CYCLE_INDEX * STEP, end_tag - start_tag, len(cars.cars) * num_sample * SAMPLING_INTERVAL
+             / (end_tag - start_tag)))
+
+    re.to_csv(dir_path + 'statistics_' + file_name + '.csv', sep=',')
+    print("4.数据持久化完成.平均速度%.2fm/s,速度标准差%.2fm/s." % (re['mean'][0], re['std'][0]))
+    del dump
+    return re
+
+
 if __name__ == '__main__':
     y = std_task_scene({HDC: 0.6, IDC_CACC: 0.4}, 35, 'output/data_test3/')
     while True:
@@ -0,0 +1,51 @@
+import abc
+
+import numpy as np
+
+
+class TrafficDevice(metaclass=abc.ABCMeta):
+    """
+    交通设施接口类
+    设施位于某一路段的某一位置，状态只在事件时刻改变：车队推进到next_time时调用fire，
+    由fire更新状态并给出下一事件时刻，两次事件之间不逐步检查设施。
+    blocking为真时，设施前方第一辆能在停车线前停下的车辆以停车线为前车（静止的虚拟前车）
+    """
+
+    def __init__(self, segment: int, location: float):
+        """
+        构造函数
+        :param segment: 所在路段编号，int类型
+        :param location: 停车线距路段起点的距离，float类型，单位m，
+                         车辆在每次网络更新时归入路段，停车线距路段起点宜大于一个网络更新间隔内的行驶距离
+        """
+        self.segment = segment
+        self.location = location
+        self.next_time = 0.0  # 下一事件时刻，单位s
+
+    @property
+    @abc.abstractmethod
+    def blocking(self) -> bool:
+        """
+        当前是否禁止车辆通过停车线
+        """
+
+    @abc.abstractmethod
+    def fire(self, time: float, fleet) -> None:
+        """
+        事件处理虚函数，必须重载。
+        更新设施状态并把next_time设为下一事件时刻，next_time必须大于time
+        :param time: 当前时间，float类型，单位s
+        :param fleet: 车队，类型为OpenRoadFleet，可以通过fleet.get_vehicles查询检测区内的车辆
+        """
+
+    def get_state(self) -> dict:
+        """
+        设施状态，保存在车队快照中，子类有其他状态时扩充
+        """
+        return {'next_time': np.array(self.next_time)}
+
+    def set_state(self, state: dict) -> None:
+        self.next_time = state['next_time'].item()
+        pass
+
+    pass
@@ -0,0 +1,129 @@
+import numpy as np
+
+from traffic_device.traffic_device_template import TrafficDevice
+
+SET_SIGNAL_PHASE = {"G", "Y", "R"}  # 绿灯、黄灯、红灯
+
+
+class TrafficLight(TrafficDevice):
+    """
+    信号灯基类
+    相位按绿灯、黄灯、红灯循环，黄灯与红灯时禁止能够停下的车辆通过停车线，
+    黄灯时无法在停车线前停下的车辆继续通过
+    """
+
+    def __init__(self, segment: int, location: float, yellow: float = 3, red: float = 30):
+        """
+        构造函数
+        :param segment: 所在路段编号，int类型
+        :param location: 停车线距路段起点的距离，float类型，单位m
+        :param yellow: 黄灯时长，float类型，单位s
+        :param red: 红灯时长，float类型，单位s
+        """
+        super().__init__(segment, location)
+        self.yellow = yellow
+        self.red = red
+        self.phase = "G"  # 当前相位，见SET_SIGNAL_PHASE
+        self.phase_start = 0.0  # 当前相位的开始时刻，单位s
+
+    @property
+    def blocking(self) -> bool:
+        return self.phase != "G"
+
+    def _switch(self, phase: str, duration: float) -> None:
+        # 相位在预定时刻切换，不受步长影响
+        self.phase = phase
+        self.phase_start = self.next_time
+        self.next_time += duration
+        pass
+
+    def get_state(self) -> dict:
+        state = super().get_state()
+        state['phase'] = np.array(self.phase)
+        state['phase_start'] = np.array(self.phase_start)
+        return state
+
+    def set_state(self, state: dict) -> None:
+        super().set_state(state)
+        self.phase = str(state['phase'])
+        self.phase_start = state['phase_start'].item()
+        pass
+
+    pass
+
+
+class FixedTimeSignal(TrafficLight):
+    """
+    定时信号灯，相位时长固定
+    """
+
+    def __init__(self, segment: int, location: float, green: float = 30, yellow: float = 3, red: float = 30,
+                 offset: float = 0):
+        """
+        构造函数
+        :param green: 绿灯时长，float类型，单位s
+        :param offset: 相位差，float类型，单位s，为某一绿灯的开始时刻
+        """
+        super().__init__(segment, location, yellow, red)
+        self.green = green
+        # 由相位差推算0时刻所处的相位
+        durations = [("G", green), ("Y", yellow), ("R", red)]
+        self.next_time = offset - (offset // (green + yellow + red) + 1) * (green + yellow + red)
+        k = -1
+        while self.next_time <= 0:
+            k = (k + 1) % 3
+            self._switch(*durations[k])
+            pass
+        pass
+
+    def fire(self, time: float, fleet) -> None:
+        if self.phase == "G":
+            self._switch("Y", self.yellow)
+        elif self.phase == "Y":
+            self._switch("R", self.red)
+        else:
+            self._switch("G", self.green)
+        pass
+
+    pass
+
+
+class ActuatedSignal(TrafficLight):
+    """
+    感应信号灯
+    绿灯至少持续min_green；此后检测区内有车时每次延长extension，至多持续max_green，检测区无车或达到max_green时结束绿灯。
+    检测只在事件时刻进行，红灯为冲突方向的固定通行时间
+    """
+
+    def __init__(self, segment: int, location: float, min_green: float = 10, max_green: float = 60,
+                 extension: float = 3, yellow: float = 3, red: float = 30, detector: float = 50):
+        """
+        构造函数
+        :param min_green: 最短绿灯时长，float类型，单位s
+        :param max_green: 最长绿灯时长，float类型，单位s
+        :param extension: 单次延长的绿灯时长，float类型，单位s
+        :param detector: 检测区长度，float类型，单位m，检测区为停车线上游detector范围
+        """
+        super().__init__(segment, location, yellow, red)
+        self.min_green = min_green
+        self.max_green = max_green
+        self.extension = extension
+        self.detector = detector
+        self.next_time = min_green
+        pass
+
+    def fire(self, time: float, fleet) -> None:
+        if self.phase == "G":
+            end = self.phase_start + self.max_green
+            demand = len(fleet.get_vehicles(self.segment, self.location - self.detector, self.location))
+            if demand and self.next_time < end:
+                self.next_time = min(self.next_time + self.extension, end)
+            else:
+                self._switch("Y", self.yellow)
+        elif self.phase == "Y":
+            self._switch("R", self.red)
+        else:
+            self._switch("G", self.min_green)
+        pass
+
+    pass
@@ -0,0 +1,74 @@
+from typing import List
+
+import numpy as np
+
+_next_car_id = 1
+
+
+def new_car_ids(num: int) -> np.ndarray:
+    """
+    分配车辆ID，由进程内计数器依次生成，互不重复
+    :param num: 车辆数，int类型
+    :return: int64数组
+    """
+    global _next_car_id
+    re = np.arange(_next_car_id, _next_car_id + num, dtype=np.int64)
+    _next_car_id += num
+    return re
+
+
+class VehicleTypeTable:
+    """
+    车辆类型表
+    每种车辆原型（Car实例）的静态参数只保存一行，车辆以类型下标引用，
+    车队的逐车静态数组由类型下标一次取出，不再逐车读取。
+    二维变量按[类型, 分量]排列，变量名与CarInfo一致
+    """
+
+    def __init__(self, prototypes: List = ()):
+        """
+        构造函数
+        :param prototypes: 车辆原型列表，类型为Car，依次登记
+        """
+        self.prototypes = []
+        self.following_model = []  # 各类型的跟驰模型实例
+        self.car_type = np.empty(0)
+        self.car_size = np.empty((0, 2))
+        self.expecting_headway = np.empty(0)
+        self.limiting_acceleration = np.empty((0, 2))
+        self.limiting_speed = np.empty((0, 2))
+        self.stopping_distance = np.empty(0)
+        self.observation_error = np.empty(0)
+        self.operation_error = np.empty(0)
+        self.response_time_delay = np.empty(0)
+        self.init_delay = np.empty(0)  # 原型的反应延迟初始倒计时，由原型复制的车辆相同
+        for c in prototypes:
+            self.register(c)
+            pass
+
+    def __len__(self):
+        return len(self.prototypes)
+
+    def register(self, prototype) -> int:
+        """
+        登记车辆原型，同一实例只登记一次
+        :param prototype: 车辆原型，类型为Car
+        :return: 类型下标，int类型
+        """
+        for i, c in enumerate(self.prototypes):
+            if c is prototype:
+                return i
+            pass
+        self.prototypes.append(prototype)
+        self.following_model.append(prototype.following_model)
+        self.car_type = np.append(self.car_type, prototype.car_type)
+        self.car_size = np.vstack((self.car_size, prototype.car_size))
+        self.expecting_headway = np.append(self.expecting_headway, prototype.expecting_headway)
+        self.limiting_acceleration = np.vstack((self.limiting_acceleration, prototype.limiting_acceleration))
+        self.limiting_speed = np.vstack((self.limiting_speed, prototype.limiting_speed))
+        self.stopping_distance = np.append(self.stopping_distance, prototype.stopping_distance)
+        self.observation_error = np.append(self.observation_error, prototype.observation_error)
+        self.operation_error = np.append(self.operation_error, prototype.operation_error)
+        self.response_time_delay = np.append(self.response_time_delay, prototype.response_time_delay)
+        self.init_delay = np.append(self.init_delay, prototype._response_time_delay)
+        return len(self.prototypes) - 1
@@ -224,8 +224,8 @@ class LaneVis(object):
 
 
 if __name__ == '__main__':
-    import pandas as pd
     import time
+    from recorder import TrajectoryReader
 
     car_num = 50
     td = 30
@@ -243,15 +243,16 @@ if __name__ == '__main__':
     vis = Visualization(car_size=(13, 5), width=12, title=title)
     # vis = Visualization(car_size=(10, 3), width=9, title=title)
 
-    data = pd.read_csv("data_TD_30.00_PE_0.40.csv",header=0, index_col=0, low_memory=False)
+    # 列式目录或CSV文件，列式目录按内存映射逐帧读取
+    data = TrajectoryReader("data_TD_30.00_PE_0.40")
 
-    vehicle_type = np.array((data.iloc[0 * car_num: (0 + 1) * car_num]).loc[:, ['type']]).T[0] != 10
+    vehicle_type = data['type'][0] != 10
 
     fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter('data_TD_30.00_PE_0.40.csv.avi', fourcc, 10.0, (640, 640))
+    out = cv2.VideoWriter('data_TD_30.00_PE_0.40.avi', fourcc, 10.0, (640, 640))
 
-    for i in range(int(len(data)/car_num)):
-        theta = np.array((data.iloc[i*car_num: (i+1)*car_num]).loc[:, ['pos']] / radius).T[0] * 180 / np.pi
+    for i in range(data.num_samples):
+        theta = data['pos'][i] / radius * 180 / np.pi
         img = vis.refresh(theta, vehicle_type)
         # cv2.imshow("Test", img)
         img = img * 255
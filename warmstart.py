@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from std_interface import FollowingModel
+
+# 参与场景键的车辆原型变量
+LIST_PROTOTYPE_KEY = ['name', 'car_type', 'expecting_headway', 'car_size', 'limiting_acceleration', 'limiting_speed',
+                      'stopping_distance', 'observation_error', 'operation_error', 'response_time_delay']
+
+
+def _describe(obj):
+    # 可序列化的参数描述，跟驰模型展开为类名与全部参数，组合模型递归展开内层模型
+    if isinstance(obj, FollowingModel):
+        return [type(obj).__name__, {k: _describe(v) for k, v in sorted(vars(obj).items())}]
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        return [_describe(v) for v in obj]
+    if isinstance(obj, (int, float, np.number)):
+        return repr(float(obj))
+    return repr(obj)
+
+
+def scenario_key(proportion: dict, traffic_density: float, car_num: int, seed: int, **settings) -> str:
+    """
+    场景键，车辆比例、车流密度、车辆数、车辆原型与跟驰模型参数、随机数种子及其他设置均相同时键相同
+    :param proportion: 车辆比例，dict类型
+    :param traffic_density: 车流密度，float类型
+    :param car_num: 车辆数，int类型
+    :param seed: 随机数种子，int类型
+    :param settings: 其他影响仿真结果的设置，例如步长、积分器
+    :return: 十六进制字符串
+    """
+    mix = [[{k: _describe(getattr(c, k)) for k in LIST_PROTOTYPE_KEY}, _describe(c.following_model), repr(float(p))]
+           for c, p in proportion.items()]
+    desc = {'proportion': mix,
+            'traffic_density': repr(float(traffic_density)),
+            'car_num': int(car_num),
+            'seed': int(seed),
+            'settings': {k: _describe(v) for k, v in sorted(settings.items())}}
+    return hashlib.sha1(json.dumps(desc, sort_keys=True).encode()).hexdigest()
+
+
+class WarmStartCache:
+    """
+    预热缓存
+    以场景键保存越过过渡过程（SAMPLING_TIME之前）后的车队快照，相同场景再次运行（例如重新分析、延长仿真时间）时
+    从快照继续，不再重复计算过渡过程。
+    快照保存在目录中，文件总大小超过上限时按最近使用时间（LRU）删除
+    """
+
+    def __init__(self, dir_path: str, max_bytes: int = 1 << 28):
+        """
+        构造函数
+        :param dir_path: 缓存目录，str类型
+        :param max_bytes: 缓存文件总大小上限，int类型，单位字节
+        """
+        self.dir_path = dir_path
+        self.max_bytes = max_bytes
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.dir_path, key + '.npz')
+
+    def get(self, key: str) -> str:
+        """
+        查找快照，命中时更新其使用时间
+        :param key: 场景键，str类型，见scenario_key
+        :return: 快照文件路径，未命中时为None
+        """
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, fleet, **extra) -> None:
+        """
+        保存车队快照，随后按LRU清理超出上限的快照
+        :param key: 场景键，str类型，见scenario_key
+        :param fleet: 车队，类型为Fleet或其子类
+        :param extra: 附加数组，见Fleet.snapshot
+        """
+        fleet.snapshot(self._path(key), **extra)
+        self.evict()
+        pass
+
+    def evict(self) -> None:
+        """
+        按最近使用时间从旧到新删除快照，直到文件总大小不超过上限
+        """
+        files = []
+        for name in os.listdir(self.dir_path):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.dir_path, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # 其他进程已删除
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            pass
+        total = sum(f[1] for f in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            pass
+        pass
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key))